@@ -4,6 +4,7 @@ import math
 import warnings
 from sys import maxsize
 import json
+from gamelib.attack_timing import get_attack_timing, estimate_units_lost
 
 
 """
@@ -47,6 +48,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         self.attack_next_round = False
         self.opponent_missing_1_14 = False
         self.opponent_missing_26_14 = False
+        self.attack_timing = get_attack_timing(config)
 
     def on_turn(self, turn_state):
         """
@@ -82,11 +84,16 @@ class AlgoStrategy(gamelib.AlgoCore):
     def new_strategy(self, game_state):
 
         # check if we should suicide strategy
-        if game_state.get_resource(MP) >= 11 + game_state.turn_number * 0.1 and game_state.turn_number >= 21:
+        if game_state.turn_number >= 21:
             if self.detect_enemy_left_corner_unit(game_state, unit_type=TURRET, valid_x=None, valid_y=None) < self.detect_enemy_right_corner_unit(game_state, unit_type=TURRET, valid_x=None, valid_y=None):
-                self.suicide_direction = "left"
+                direction, scout_location = "left", [14, 0]
             else:
-                self.suicide_direction = "right"
+                direction, scout_location = "right", [13, 0]
+            # the scouts go out next round, so commit once the best plan attacks within a turn
+            units_lost = estimate_units_lost(game_state, SCOUT, scout_location)
+            plan = self.attack_timing.plan(game_state, SCOUT, units_lost)
+            if self.attack_next_round or (plan.wait is not None and plan.wait <= 1):
+                self.suicide_direction = direction
 
 
         self.defense_strategy(game_state, suicide_direction=self.suicide_direction)
@@ -509,9 +516,9 @@ class AlgoStrategy(gamelib.AlgoCore):
             # When parsing the frame data directly, 
             # 1 is integer for yourself, 2 is opponent (StarterKit code uses 0, 1 as player_index instead)
             if not unit_owner_self:
-                gamelib.debug_write("Got scored on at: {}".format(location))
+                gamelib.logger.info("Got scored on at: {}", location)
                 self.scored_on_locations.append(location)
-                gamelib.debug_write("All locations: {}".format(self.scored_on_locations))
+                gamelib.logger.info("All locations: {}", self.scored_on_locations)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,198 @@
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Shared memory needs python 3.8 or newer
+    shared_memory = None
+
+ARENA_SIZE = 28
+CELLS = ARENA_SIZE * ARENA_SIZE
+MOBILE_TYPES = 3
+
+# Byte offsets of each section. Wider types come first so every section is aligned.
+_HEADER = 0                                         # int64 generation, int64 turn number
+_RESOURCES = _HEADER + 2 * 8                        # float64 health, SP, MP, time for each player
+_HEALTH = _RESOURCES + 2 * 4 * 8                    # float64 structure health per cell
+_MOBILE = _HEALTH + CELLS * 8                       # int16 mobile unit counts per player, type and cell
+_TYPE = _MOBILE + 2 * MOBILE_TYPES * CELLS * 2      # int8 structure type per cell
+_OWNER = _TYPE + CELLS                              # int8 structure owner per cell
+_UPGRADED = _OWNER + CELLS                          # int8 structure upgraded flag per cell
+_REMOVING = _UPGRADED + CELLS                       # int8 structure pending removal flag per cell
+BUFFER_SIZE = _REMOVING + CELLS
+
+_attached = {}
+
+
+class BoardBuffer:
+    """A fixed layout copy of the board in shared memory
+
+    The main process writes the board into the buffer once per turn with write(),
+    and worker processes read it in place with attach(), without pickling a GameState.
+
+    Every write bumps a generation counter twice, once before and once after writing,
+    so it is odd while a write is in progress. A worker that remembers the generation it
+    started from can check is_current() to know if its snapshot went stale.
+
+    Layout of each cell, indexed by x * 28 + y:
+        * structure type: 0 if empty, otherwise 1 + the unit's index in config["unitInformation"]
+        * owner: 0 for you, 1 for your opponent
+        * health, upgraded and pending removal of the structure
+        * the number of mobile units of each type for each player
+
+    Attributes :
+        * name (str): The name workers use to attach to the buffer
+        * owner (bool): True if this process created the buffer and should unlink it
+
+    """
+    def __init__(self, name=None):
+        """Creates a new buffer, or attaches to an existing one if name is given
+
+        Args:
+            name: The name of an existing buffer. A new buffer is created if None.
+
+        """
+        if shared_memory is None:
+            raise RuntimeError("BoardBuffer requires python 3.8 or newer")
+
+        self.owner = name is None
+        if self.owner:
+            self._memory = shared_memory.SharedMemory(create=True, size=BUFFER_SIZE)
+            self._memory.buf[:BUFFER_SIZE] = bytes(BUFFER_SIZE)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self.name = self._memory.name
+
+        self._views = []
+        self._header = self._view(_HEADER, _RESOURCES, "q")
+        self._resources = self._view(_RESOURCES, _HEALTH, "d")
+        self._health = self._view(_HEALTH, _MOBILE, "d")
+        self._mobile = self._view(_MOBILE, _TYPE, "h")
+        self._type = self._view(_TYPE, _OWNER, "b")
+        self._owner = self._view(_OWNER, _UPGRADED, "b")
+        self._upgraded = self._view(_UPGRADED, _REMOVING, "b")
+        self._removing = self._view(_REMOVING, BUFFER_SIZE, "b")
+
+    def _view(self, start, end, format):
+        section = self._memory.buf[start:end]
+        typed = section.cast(format)
+        self._views.extend([typed, section])
+        return typed
+
+    @staticmethod
+    def attach(name):
+        """Attaches to the buffer with the given name, reusing the attachment on later calls
+
+        Intended to be called from worker processes, for example in the evaluate function of a WorkerPool.
+        """
+        if name not in _attached:
+            _attached[name] = BoardBuffer(name)
+        return _attached[name]
+
+    @property
+    def generation(self):
+        """Twice the number of finished writes. Odd while a write is in progress.
+        """
+        return self._header[0]
+
+    @property
+    def turn_number(self):
+        """The turn number of the last GameState written
+        """
+        return self._header[1]
+
+    def is_current(self, generation):
+        """Checks if the board has not been rewritten since generation was read
+        """
+        return generation % 2 == 0 and self._header[0] == generation
+
+    def write(self, game_state):
+        """Copies the board, resources and turn number of a GameState into the buffer
+
+        Args:
+            game_state: The GameState to copy, usually the one for the current turn
+
+        Returns:
+            The generation of the new snapshot
+
+        """
+        from .game_state import UNIT_TYPE_TO_INDEX
+
+        self._header[0] += 1
+        buf = self._memory.buf
+        buf[_RESOURCES:BUFFER_SIZE] = bytes(BUFFER_SIZE - _RESOURCES)
+
+        self._header[1] = game_state.turn_number
+        stats = [
+            [game_state.my_health, game_state.get_resource(game_state.SP, 0), game_state.get_resource(game_state.MP, 0), game_state.my_time],
+            [game_state.enemy_health, game_state.get_resource(game_state.SP, 1), game_state.get_resource(game_state.MP, 1), game_state.enemy_time]]
+        for player_index, player_stats in enumerate(stats):
+            for i, value in enumerate(player_stats):
+                self._resources[player_index * 4 + i] = value
+
+        for location in game_state.game_map:
+            cell = location[0] * ARENA_SIZE + location[1]
+            for unit in game_state.game_map[location]:
+                type_index = UNIT_TYPE_TO_INDEX[unit.unit_type]
+                if unit.stationary:
+                    self._type[cell] = type_index + 1
+                    self._owner[cell] = unit.player_index
+                    self._health[cell] = unit.health
+                    self._upgraded[cell] = unit.upgraded
+                    self._removing[cell] = unit.pending_removal
+                else:
+                    self._mobile[self._mobile_index(unit.player_index, type_index - MOBILE_TYPES, cell)] += 1
+
+        self._header[0] += 1
+        return self._header[0]
+
+    def _mobile_index(self, player_index, mobile_type, cell):
+        return (player_index * MOBILE_TYPES + mobile_type) * CELLS + cell
+
+    def structure_at(self, location):
+        """Gets the structure at a location
+
+        Returns:
+            None if there is no structure, otherwise a tuple of
+            (index in config["unitInformation"], player_index, health, upgraded, pending_removal)
+
+        """
+        cell = location[0] * ARENA_SIZE + location[1]
+        type_value = self._type[cell]
+        if type_value == 0:
+            return None
+        return (type_value - 1, self._owner[cell], self._health[cell], bool(self._upgraded[cell]), bool(self._removing[cell]))
+
+    def mobile_count(self, location, type_index, player_index):
+        """Gets the number of mobile units of one type and owner at a location
+
+        Args:
+            location: The location to check
+            type_index: The unit's index in config["unitInformation"], 3 to 5
+            player_index: 0 for you, 1 for your opponent
+
+        """
+        cell = location[0] * ARENA_SIZE + location[1]
+        return self._mobile[self._mobile_index(player_index, type_index - MOBILE_TYPES, cell)]
+
+    def get_stats(self, player_index):
+        """Gets [health, SP, MP, time] for a player
+        """
+        return list(self._resources[player_index * 4:player_index * 4 + 4])
+
+    def blocked_locations(self):
+        """Gets every location that holds a structure, as a set of (x, y) tuples
+
+        The result can be passed to ShortestPathFinder.navigate_multiple_starts.
+        """
+        structure_types = self._type
+        return set((cell // ARENA_SIZE, cell % ARENA_SIZE) for cell in range(CELLS) if structure_types[cell])
+
+    def close(self):
+        """Releases this process's view of the buffer, and frees the buffer if this process created it
+        """
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._memory.close()
+        if self.owner:
+            self._memory.unlink()
+        _attached.pop(self.name, None)
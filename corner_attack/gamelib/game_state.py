@@ -1,9 +1,12 @@
+import copy
 import math
 import json
 import sys
 
 from .navigation import ShortestPathFinder
 from .util import send_command, debug_write
+from . import turn_budget
+from .log import logger, WARNING
 from .unit import GameUnit
 from .game_map import GameMap
 
@@ -17,6 +20,44 @@ def is_stationary(unit_type):
     """
     return unit_type in STRUCTURE_TYPES
 
+# Reasons a spawn can fail, as bit flags. Counted per GameState, see GameState.get_spawn_failures
+INVALID_LOCATION = 1
+NOT_AFFORDABLE = 2
+BLOCKED = 4
+ENEMY_TERRITORY = 8
+NOT_ON_EDGE = 16
+STACKED_STRUCTURE = 32
+SPAWN_FAILURE_NAMES = {
+    INVALID_LOCATION: "invalid_location",
+    NOT_AFFORDABLE: "not_affordable",
+    BLOCKED: "blocked",
+    ENEMY_TERRITORY: "enemy_territory",
+    NOT_ON_EDGE: "not_on_edge",
+    STACKED_STRUCTURE: "stacked_structure"}
+_SPAWN_FAILURE_MESSAGES = [
+    (NOT_AFFORDABLE, " Not enough resources."),
+    (BLOCKED, " Location is blocked."),
+    (ENEMY_TERRITORY, " Location in enemy territory."),
+    (NOT_ON_EDGE, " Information units must be deployed on the edge.")]
+
+_spawn_masks = None
+
+def get_spawn_masks(game_map):
+    """
+        The board never changes shape, so the locations used to validate spawns are found once and shared. 
+
+        Returns: 
+            A tuple of three frozensets of (x, y) tuples: every location in the arena, 
+            the arena locations on your half, and your two edges.
+    """
+    global _spawn_masks
+    if _spawn_masks is None:
+        arena = frozenset((x, y) for x in range(game_map.ARENA_SIZE) for y in range(game_map.ARENA_SIZE) if game_map.in_arena_bounds([x, y]))
+        friendly_half = frozenset(location for location in arena if location[1] < game_map.HALF_ARENA)
+        friendly_edges = frozenset(tuple(location) for location in game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT))
+        _spawn_masks = (arena, friendly_half, friendly_edges)
+    return _spawn_masks
+
 class GameState:
     """Represents the entire gamestate for a given turn
     Provides methods related to resources and unit deployment
@@ -93,6 +134,7 @@ class GameState:
         self._shortest_path_finder = ShortestPathFinder()
         self._build_stack = []
         self._deploy_stack = []
+        self._spawn_failures = dict.fromkeys(SPAWN_FAILURE_NAMES, 0)
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
@@ -166,19 +208,19 @@ class GameState:
         self._player_resources[player_index][resource_key] = held_resource + amount
 
     def _invalid_player_index(self, index):
-        self.warn("Invalid player index {} passed, player index should always be 0 (yourself) or 1 (your opponent)".format(index))
+        self.warn("Invalid player index {} passed, player index should always be 0 (yourself) or 1 (your opponent)", index)
     
     def _invalid_unit(self, unit):
-        self.warn("Invalid unit {}".format(unit))
+        self.warn("Invalid unit {}", unit)
 
     def submit_turn(self):
         """Submit and end your turn.
             Must be called at the end of your turn or the algo will hang.
+            Does nothing if the turn was already submitted because it ran out of time.
+            Messages logged with gamelib.logger during the turn are written after the turn is sent.
         """
-        build_string = json.dumps(self._build_stack)
-        deploy_string = json.dumps(self._deploy_stack)
-        send_command(build_string)
-        send_command(deploy_string)
+        turn_budget.submit(self._build_stack, self._deploy_stack)
+        logger.flush()
 
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
@@ -195,7 +237,7 @@ class GameState:
             self._invalid_player_index(player_index)
             return
         if not resource_type == self.MP and not resource_type == self.SP:
-            self.warn("Invalid resource_type '{}'. Please use MP (0) or SP (1)".format(resource_type))
+            self.warn("Invalid resource_type '{}'. Please use MP (0) or SP (1)", resource_type)
             return
 
         if resource_type == self.MP:
@@ -264,11 +306,11 @@ class GameState:
         """
 
         if turns_in_future < 1 or turns_in_future > 99:
-            self.warn("Invalid turns in future used ({}). Turns in future should be between 1 and 99".format(turns_in_future))
+            self.warn("Invalid turns in future used ({}). Turns in future should be between 1 and 99", turns_in_future)
         if not player_index == 1 and not player_index == 0:
             self._invalid_player_index(player_index)
         if type(current_MP) == int and current_MP < 0:
-            self.warn("Invalid current MP ({}). Current MP cannot be negative.".format(current_MP))
+            self.warn("Invalid current MP ({}). Current MP cannot be negative.", current_MP)
 
         MP = self.get_resource(self.MP, player_index) if not current_MP else current_MP
         for increment in range(1, turns_in_future + 1):
@@ -311,6 +353,8 @@ class GameState:
         in bounds, unblocked, on our side of the map, not on top of a unit we can't stack with, 
         and on an edge if the unit is mobile.
 
+        Failed checks are counted, see get_spawn_failures.
+
         Args:
             unit_type: The type of the unit
             location: The location we want to spawn the unit
@@ -323,38 +367,70 @@ class GameState:
         if unit_type not in ALL_UNITS:
             self._invalid_unit(unit_type)
             return
-        
-        if not self.game_map.in_arena_bounds(location):
-            if self.enable_warnings:
-                self.warn("Could not spawn {} at location {}. Location invalid.".format(unit_type, location))
+
+        failure = self._spawn_failure(unit_type, location, num, self.number_affordable(unit_type))
+        if failure:
+            self._record_spawn_failure(unit_type, location, failure)
             return False
+        return True
 
-        affordable = self.number_affordable(unit_type) >= num
-        stationary = is_stationary(unit_type)
-        blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
-        correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
-
-        if self.enable_warnings:
-            fail_reason = ""
-            if not affordable:
-                fail_reason = fail_reason + " Not enough resources."
-            if blocked:
-                fail_reason = fail_reason + " Location is blocked."
-            if not correct_territory:
-                fail_reason = fail_reason + " Location in enemy territory."
-            if not (stationary or on_edge):
-                fail_reason = fail_reason + " Information units must be deployed on the edge."
-            if len(fail_reason) > 0:
-                self.warn("Could not spawn {} at location {}.{}".format(unit_type, location, fail_reason))
-
-        return (affordable and correct_territory and not blocked and
-                (stationary or on_edge) and
-                (not stationary or num == 1))
+    def _spawn_failure(self, unit_type, location, num, affordable):
+        """
+        Checks a spawn against the precomputed spawn masks. 
+        Returns 0 if the spawn is valid, otherwise the bit flags of every reason it is not.
+        """
+        arena, friendly_half, friendly_edges = get_spawn_masks(self.game_map)
+        key = (location[0], location[1])
+        if key not in arena:
+            return INVALID_LOCATION
+
+        stationary = unit_type in STRUCTURE_TYPES
+        failure = 0
+        if affordable < num:
+            failure |= NOT_AFFORDABLE
+        units = self.game_map[key]
+        if units and (stationary or any(unit.stationary for unit in units)):
+            failure |= BLOCKED
+        if key not in friendly_half:
+            failure |= ENEMY_TERRITORY
+        if stationary:
+            if num != 1:
+                failure |= STACKED_STRUCTURE
+        elif key not in friendly_edges:
+            failure |= NOT_ON_EDGE
+        return failure
+
+    def _record_spawn_failure(self, unit_type, location, failure):
+        for reason in SPAWN_FAILURE_NAMES:
+            if failure & reason:
+                self._spawn_failures[reason] += 1
+
+        if not self.enable_warnings or not logger.is_enabled(WARNING):
+            return
+        if failure & INVALID_LOCATION:
+            self.warn("Could not spawn {} at location {}. Location invalid.", unit_type, location)
+            return
+        fail_reason = "".join(message for reason, message in _SPAWN_FAILURE_MESSAGES if failure & reason)
+        if fail_reason:
+            self.warn("Could not spawn {} at location {}.{}", unit_type, location, fail_reason)
+
+    def get_spawn_failures(self):
+        """Counts why spawns failed on this GameState, for example to find out after a turn why a build did not happen
+
+        A spawn that fails for more than one reason is counted once for each reason.
+
+        Returns:
+            A dict of reason name to count, such as {"not_affordable": 3}. Reasons that never happened are left out.
+
+        """
+        return {SPAWN_FAILURE_NAMES[reason]: count for reason, count in self._spawn_failures.items() if count}
 
     def attempt_spawn(self, unit_type, locations, num=1):
         """Attempts to spawn new units with the type given in the given locations.
 
+        Each location is checked once, and the number of units that can be afforded there
+        is worked out directly, so spawning many units at once is cheap.
+
         Args:
             unit_type: The type of unit we want to spawn
             locations: A single location or list of locations to spawn units at
@@ -368,29 +444,76 @@ class GameState:
             self._invalid_unit(unit_type)
             return
         if num < 1:
-            self.warn("Attempted to spawn fewer than one units! ({})".format(num))
+            self.warn("Attempted to spawn fewer than one units! ({})", num)
             return
       
         if type(locations[0]) == int:
             locations = [locations]
+        stationary = is_stationary(unit_type)
         spawned_units = 0
         for location in locations:
-            for i in range(num):
-                if self.can_spawn(unit_type, location, 1):
-                    x, y = map(int, location)
-                    costs = self.type_cost(unit_type)
-                    self.__set_resource(SP, 0 - costs[SP])
-                    self.__set_resource(MP, 0 - costs[MP])
-                    self.game_map.add_unit(unit_type, location, 0)
-                    if is_stationary(unit_type):
-                        self._build_stack.append((unit_type, x, y))
-                    else:
-                        self._deploy_stack.append((unit_type, x, y))
-                    spawned_units += 1
-                else:
-                    break
+            affordable = self.number_affordable(unit_type)
+            failure = self._spawn_failure(unit_type, location, 1, affordable)
+            if failure:
+                self._record_spawn_failure(unit_type, location, failure)
+                continue
+
+            # A structure blocks its own location, so only one can be spawned at each location
+            count = 1 if stationary else min(num, affordable)
+            self._apply_spawn(unit_type, location, count)
+            spawned_units += count
+            if count < num:
+                self._record_spawn_failure(unit_type, location, self._spawn_failure(unit_type, location, 1, self.number_affordable(unit_type)))
         return spawned_units
 
+    def _apply_spawn(self, unit_type, location, count):
+        """
+        Spawns count units that are known to be valid and affordable, charging for them, 
+        adding them to the map and queuing them in one step each.
+        """
+        costs = self.type_cost(unit_type)
+        stack = self._build_stack if is_stationary(unit_type) else self._deploy_stack
+        x, y = map(int, location)
+        self.__set_resource(SP, 0 - costs[SP] * count)
+        self.__set_resource(MP, 0 - costs[MP] * count)
+        self.game_map.add_units(unit_type, [x, y], count, 0)
+        stack.extend([(unit_type, x, y)] * count)
+
+    def _apply_upgrade(self, location):
+        """
+        Upgrades the structure at location, which is known to be upgradable and affordable.
+        """
+        x, y = map(int, location)
+        existing_unit = self.contains_stationary_unit(location)
+        costs = self.type_cost(existing_unit.unit_type, True)
+        self.__set_resource(SP, 0 - costs[SP])
+        self.__set_resource(MP, 0 - costs[MP])
+        existing_unit.upgrade()
+        self._build_stack.append((UPGRADE, x, y))
+
+    def _apply_remove(self, location):
+        x, y = map(int, location)
+        self._build_stack.append((REMOVE, x, y))
+
+    def _checkpoint(self, locations):
+        """
+        Saves the stacks, resources and the units at locations, so that changes to them can be undone with _rollback.
+        """
+        units = {}
+        for location in locations:
+            key = (int(location[0]), int(location[1]))
+            if key not in units:
+                units[key] = [copy.copy(unit) for unit in self.game_map[key]]
+        return (len(self._build_stack), len(self._deploy_stack), copy.deepcopy(self._player_resources), units)
+
+    def _rollback(self, checkpoint):
+        build_length, deploy_length, resources, units = checkpoint
+        del self._build_stack[build_length:]
+        del self._deploy_stack[deploy_length:]
+        self._player_resources = resources
+        for key, saved_units in units.items():
+            self.game_map[key] = saved_units
+
     def attempt_remove(self, locations):
         """Attempts to remove existing friendly structures in the given locations.
 
@@ -406,11 +529,10 @@ class GameState:
         removed_units = 0
         for location in locations:
             if location[1] < self.HALF_ARENA and self.contains_stationary_unit(location):
-                x, y = map(int, location)
-                self._build_stack.append((REMOVE, x, y))
+                self._apply_remove(location)
                 removed_units += 1
             else:
-                self.warn("Could not remove a unit from {}. Location has no structures or is enemy territory.".format(location))
+                self.warn("Could not remove a unit from {}. Location has no structures or is enemy territory.", location)
         return removed_units
 
     def attempt_upgrade(self, locations):
@@ -439,13 +561,10 @@ class GameState:
                     costs = self.type_cost(existing_unit.unit_type, True)
                     resources = self.get_resources()
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
-                        self.__set_resource(SP, 0 - costs[SP])
-                        self.__set_resource(MP, 0 - costs[MP])
-                        existing_unit.upgrade()
-                        self._build_stack.append((UPGRADE, x, y))
+                        self._apply_upgrade(location)
                         spawned_units += 1
             else:
-                self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.".format(location))
+                self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.", location)
         return spawned_units
 
     def get_target_edge(self, start_location):
@@ -485,7 +604,7 @@ class GameState:
 
         """
         if self.contains_stationary_unit(start_location):
-            self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+            self.warn("Attempted to perform pathing from blocked starting location {}", start_location)
             return
 
         if target_edge is None:
@@ -513,12 +632,13 @@ class GameState:
                 return unit
         return False
 
-    def warn(self, message):
+    def warn(self, message, *args):
         """ Used internally by game_state to print warnings
+            The message is only formatted with args if warnings are logged, see BufferedLogger in log.py
         """
 
         if(self.enable_warnings):
-            debug_write(message)
+            logger.warning(message, *args)
 
     def suppress_warnings(self, suppress):
         """Suppress all warnings
@@ -547,7 +667,7 @@ class GameState:
         """
 
         if not isinstance(attacking_unit, GameUnit):
-            self.warn("Passed a {} to get_target as attacking_unit. Expected a GameUnit.".format(type(attacking_unit)))
+            self.warn("Passed a {} to get_target as attacking_unit. Expected a GameUnit.", type(attacking_unit))
             return
 
         attacker_location = [attacking_unit.x, attacking_unit.y]
@@ -625,7 +745,7 @@ class GameState:
         if not player_index == 0 and not player_index == 1:
             self._invalid_player_index(player_index)
         if not self.game_map.in_arena_bounds(location):
-            self.warn("Location {} is not in the arena bounds.".format(location))
+            self.warn("Location {} is not in the arena bounds.", location)
 
         attackers = []
         """
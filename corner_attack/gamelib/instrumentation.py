@@ -0,0 +1,183 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+from .game_state import GameState
+from .threat_map import ThreatMap
+from .util import debug_write
+
+ENVIRONMENT_VARIABLE = "GAMELIB_INSTRUMENT"
+ALGO_SETTING = "instrumentation"
+TIMED_FUNCTIONS = ["find_path_to_edge", "get_attackers", "get_target", "can_spawn", "attempt_spawn"]
+
+
+def output_path():
+    """Finds where instrumentation should be written, if it is enabled
+
+    The GAMELIB_INSTRUMENT environment variable is checked first, then the "instrumentation"
+    setting in the algo.json next to the running strategy. A relative path in algo.json is
+    relative to the algo's folder.
+
+    Returns:
+        The path of the file to write, or None if instrumentation is disabled
+
+    """
+    path = os.environ.get(ENVIRONMENT_VARIABLE)
+    if path:
+        return path
+    algo_folder = os.path.dirname(os.path.abspath(sys.argv[0]))
+    try:
+        with open(os.path.join(algo_folder, "algo.json")) as algo_file:
+            path = json.load(algo_file).get(ALGO_SETTING)
+    except (OSError, ValueError, AttributeError):
+        return None
+    if not path:
+        return None
+    return os.path.join(algo_folder, path)
+
+
+class TurnInstrumentation:
+    """Writes one JSON line per turn describing where the turn's time went
+
+    While installed, the GameState functions in TIMED_FUNCTIONS, GameState parsing, submit_turn and
+    ThreatMap.locations_in_range are wrapped to count calls and time. Nothing is wrapped until
+    install is called, so an algo that does not enable instrumentation pays nothing for it.
+    Calls are only counted between start_turn and end_turn, and only on the thread that called
+    start_turn (the one running on_turn), so GameStates built by the precompute thread or other
+    background threads are left out even while a turn is running.
+
+    Each line looks like
+    {"turn":3,"wall":0.41,"phases":{"parse":0.01,"strategy":0.39,"submit":0.0},
+    "calls":{"find_path_to_edge":[12,0.2],...},"caches":{"locations_in_range":[40,3],...}}
+    where calls are [count, seconds] and caches are [hits, misses].
+
+    Attributes :
+        * path (str): The file the lines are appended to
+        * active (bool): True between start_turn and end_turn
+
+    """
+    def __init__(self, path):
+        """Opens the output file for appending
+
+        Args:
+            path: The file to write to
+
+        """
+        self.path = path
+        self.active = False
+        self._file = open(path, "a")
+        self._originals = []
+        self._turn_number = None
+        self._start_time = None
+        self._thread = None
+        self._reset()
+
+    def _reset(self):
+        self._calls = {name: [0, 0.0] for name in TIMED_FUNCTIONS}
+        self._phases = {"parse": 0.0, "submit": 0.0}
+        self._caches = {}
+
+    def install(self):
+        """Wraps the instrumented functions
+        """
+        if self._originals:
+            return
+        for name in TIMED_FUNCTIONS:
+            self._wrap(GameState, name, self._timed(self._calls_entry, name))
+        self._wrap(GameState, "__init__", self._timed(self._phase_entry, "parse"))
+        self._wrap(GameState, "submit_turn", self._timed(self._phase_entry, "submit"))
+        self._wrap(ThreatMap, "locations_in_range", self._range_cache_counter)
+
+    def uninstall(self):
+        """Restores the functions wrapped by install
+        """
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+
+    def _wrap(self, owner, name, make_wrapper):
+        original = getattr(owner, name)
+        self._originals.append((owner, name, original))
+        setattr(owner, name, functools.wraps(original)(make_wrapper(original)))
+
+    def _calls_entry(self, name, elapsed):
+        entry = self._calls[name]
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def _phase_entry(self, name, elapsed):
+        self._phases[name] += elapsed
+
+    def _counting(self):
+        return self.active and threading.get_ident() == self._thread
+
+    def _timed(self, record, name):
+        def make_wrapper(function):
+            def wrapper(*args, **kwargs):
+                if not self._counting():
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    record(name, time.perf_counter() - start)
+            return wrapper
+        return make_wrapper
+
+    def _range_cache_counter(self, function):
+        def wrapper(threat_map, location, attack_range):
+            if self._counting():
+                self.record_cache("locations_in_range", (location[0], location[1], attack_range) in threat_map._range_cache)
+            return function(threat_map, location, attack_range)
+        return wrapper
+
+    def record_cache(self, name, hit):
+        """Counts a hit or a miss for a cache during the current turn
+        """
+        entry = self._caches.setdefault(name, [0, 0])
+        entry[0 if hit else 1] += 1
+
+    def start_turn(self, turn_number, start_time=None):
+        """Starts counting for a turn, on the calling thread
+
+        Args:
+            turn_number: The turn being measured
+            start_time: The time.perf_counter() value at which the turn message arrived. Now if None.
+
+        """
+        self._reset()
+        self._turn_number = turn_number
+        self._start_time = time.perf_counter() if start_time is None else start_time
+        self._thread = threading.get_ident()
+        self.active = True
+
+    def end_turn(self):
+        """Stops counting and writes the line for the current turn
+        """
+        if not self.active:
+            return
+        self.active = False
+        wall = time.perf_counter() - self._start_time
+        phases = dict(self._phases)
+        phases["strategy"] = max(0.0, wall - phases["parse"] - phases["submit"])
+        line = {
+            "turn": self._turn_number,
+            "wall": round(wall, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in phases.items()},
+            "calls": {name: [count, round(seconds, 6)] for name, (count, seconds) in self._calls.items()},
+            "caches": self._caches}
+        try:
+            self._file.write(json.dumps(line, separators=(",", ":")) + "\n")
+            self._file.flush()
+        except (OSError, ValueError) as e:
+            debug_write("Could not write instrumentation: {}".format(e))
+
+    def close(self):
+        """Restores the wrapped functions and closes the output file
+        """
+        self.active = False
+        self.uninstall()
+        self._file.close()
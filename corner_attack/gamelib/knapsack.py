@@ -0,0 +1,87 @@
+import math
+
+from .build_plan import BuildPlan, SPAWN, UPGRADE
+
+SP_STEP = 0.5
+
+
+def item_cost(game_state, action, unit_type, location):
+    """Gets the SP cost of a build or upgrade item
+
+    Upgrading a location that has no structure yet also pays for building unit_type there.
+
+    Returns:
+        The cost in SP, and the (action, unit_type, location) entries the item adds to a plan
+
+    """
+    if action == SPAWN:
+        return game_state.type_cost(unit_type)[game_state.SP], [(SPAWN, unit_type, location)]
+    existing = game_state.contains_stationary_unit(location)
+    if existing:
+        return game_state.type_cost(existing.unit_type, True)[game_state.SP], [(UPGRADE, existing.unit_type, location)]
+    cost = game_state.type_cost(unit_type)[game_state.SP] + game_state.type_cost(unit_type, True)[game_state.SP]
+    return cost, [(SPAWN, unit_type, location), (UPGRADE, unit_type, location)]
+
+
+def best_builds(game_state, items, sp_budget=None, next_turn_sp=0, step=SP_STEP):
+    """Chooses the builds and upgrades worth the most that fit in your SP
+
+    Spending greedily in call order lets an early, expensive upgrade starve a cheap, important wall.
+    This solves the 0/1 knapsack over SP exactly with dynamic programming. Costs in this game are
+    multiples of 0.5 SP, so the budget is split into steps of 0.5 and a few hundred items solve in milliseconds.
+
+    Args:
+        game_state: The current GameState
+        items: A list of (value, action, unit_type, location) entries, where action is SPAWN or UPGRADE from build_plan.
+            Values can come from anywhere, such as PlacementOptimizer.evaluate or ThreatMap.path_damage.
+            Items are chosen independently, so give at most one item per location.
+        sp_budget: The SP that may be spent. Your current SP if None.
+        next_turn_sp: The SP you want to have at the start of next turn. Enough is kept back that,
+            with the coresPerRound you gain, you will have it.
+        step: The SP resolution of the solver. Costs are rounded up to a multiple of it.
+
+    Returns:
+        A BuildPlan of the chosen items, in the order they were given, and the total value of the plan
+
+    """
+    if sp_budget is None:
+        sp_budget = game_state.get_resource(game_state.SP)
+    sp_per_round = game_state.config["resources"]["coresPerRound"]
+    sp_budget -= max(0, next_turn_sp - sp_per_round)
+    capacity = int(math.floor(sp_budget / step + 1e-9))
+    if capacity < 0:
+        return BuildPlan(), 0
+
+    weights = []
+    values = []
+    entries = []
+    for value, action, unit_type, location in items:
+        cost, item_entries = item_cost(game_state, action, unit_type, location)
+        weights.append(int(math.ceil(cost / step - 1e-9)))
+        values.append(value)
+        entries.append(item_entries)
+
+    # best[c] is the best value using at most c steps of SP. taken[i][c] records if item i was used to reach it.
+    best = [0] * (capacity + 1)
+    taken = []
+    for weight, value in zip(weights, values):
+        if value <= 0 or weight > capacity:
+            taken.append(None)
+            continue
+        with_item = [without + value for without in best[:capacity + 1 - weight]]
+        chosen = bytearray(weight) + bytearray(new > old for new, old in zip(with_item, best[weight:]))
+        best = best[:weight] + [new if use else old for new, old, use in zip(with_item, best[weight:], chosen[weight:])]
+        taken.append(chosen)
+
+    chosen_items = []
+    remaining = capacity
+    for index in range(len(taken) - 1, -1, -1):
+        if taken[index] is not None and taken[index][remaining]:
+            chosen_items.append(index)
+            remaining -= weights[index]
+
+    plan = BuildPlan()
+    for index in reversed(chosen_items):
+        for action, unit_type, location in entries[index]:
+            plan.add(action, unit_type, location)
+    return plan, best[capacity]
@@ -0,0 +1,168 @@
+import json
+
+_projections = {}
+
+
+def get_projection(config):
+    """Gets the ResourceProjection for a game config, building it the first time
+
+    Projections only depend on config["resources"], so every GameState in a game shares one.
+    """
+    key = json.dumps(config["resources"], sort_keys=True)
+    if key not in _projections:
+        _projections[key] = ResourceProjection(config)
+    return _projections[key]
+
+
+class ResourceProjection:
+    """Projects SP and MP for either player any number of turns ahead
+
+    The MP a player gains on each turn, and how much of a starting amount survives decay,
+    do not depend on the state of the game. Both are tabulated once per game, so projecting
+    MP from any turn over any horizon is two table lookups:
+
+        MP after h turns = MP now * keep[h] + gained[turn][h]
+
+    where keep[h] = (1 - bitDecayPerRound) ** h and gained[turn][h] is the decayed sum of the
+    bitsPerRound and bitGrowthRate ramps earned from turn + 1 to turn + h. The result is capped at
+    maxBits, which grows by bitRampBitCapGrowthRate every turnIntervalForBitCapSchedule turns.
+    Unlike GameState.project_future_MP, MP is not rounded after each turn, so results can differ
+    from it by a few tenths.
+
+    SP does not decay. Each turn adds coresPerRound, coresForPlayerDamage for each point of damage
+    dealt to the opponent, and any refunds from removed structures coming due.
+
+    Attributes :
+        * turns (int): The number of turns the tables cover. They grow when a later turn is asked for.
+
+    """
+    def __init__(self, config, turns=100, horizon=20):
+        """
+        Args:
+            config: The game config
+            turns: The number of turns to tabulate up front
+            horizon: The longest projection to tabulate up front
+
+        """
+        resources = config["resources"]
+        self.config = config
+        self._keep_rate = 1 - resources["bitDecayPerRound"]
+        self._bits_per_round = resources["bitsPerRound"]
+        self._bit_growth = resources["bitGrowthRate"]
+        self._ramp_start = resources.get("roundStartBitRamp", resources["turnIntervalForBitSchedule"])
+        self._ramp_interval = resources["turnIntervalForBitSchedule"]
+        self._max_bits = resources.get("maxBits")
+        self._cap_growth = resources.get("bitRampBitCapGrowthRate", 0)
+        self._cap_interval = resources.get("turnIntervalForBitCapSchedule", self._ramp_interval)
+        self.cores_per_round = resources["coresPerRound"]
+        self.cores_for_damage = resources.get("coresForPlayerDamage", 0)
+
+        self.turns = 0
+        self._horizon = 0
+        self._keep = []
+        self._gained = []
+        self._build(turns, horizon)
+
+    def _ramps(self, turn_number, start, interval):
+        if turn_number < start:
+            return 0
+        return (turn_number - start) // interval + 1
+
+    def mp_gain(self, turn_number):
+        """The MP each player gains at the start of turn_number
+        """
+        return self._bits_per_round + self._bit_growth * self._ramps(turn_number, self._ramp_start, self._ramp_interval)
+
+    def mp_cap(self, turn_number):
+        """The most MP a player can hold on turn_number, or None if there is no cap
+        """
+        if self._max_bits is None:
+            return None
+        return self._max_bits + self._cap_growth * self._ramps(turn_number, self._cap_interval, self._cap_interval)
+
+    def _build(self, turns, horizon):
+        self.turns = max(turns, self.turns)
+        self._horizon = max(horizon, self._horizon)
+        self._keep = [self._keep_rate ** h for h in range(self._horizon + 1)]
+        self._gained = []
+        for turn_number in range(self.turns + 1):
+            gained = [0.0]
+            for h in range(1, self._horizon + 1):
+                gained.append(gained[-1] * self._keep_rate + self.mp_gain(turn_number + h))
+            self._gained.append(gained)
+
+    def mp_after(self, turn_number, mp, turns_ahead):
+        """Projects MP turns_ahead turns after turn_number, if none of it is spent
+
+        Args:
+            turn_number: The current turn
+            mp: The MP held now
+            turns_ahead: How many turns to look ahead
+
+        """
+        if turn_number > self.turns or turns_ahead > self._horizon:
+            self._build(max(turn_number, self.turns * 2), max(turns_ahead, self._horizon))
+        projected = mp * self._keep[turns_ahead] + self._gained[turn_number][turns_ahead]
+        cap = self.mp_cap(turn_number + turns_ahead)
+        return projected if cap is None else min(projected, cap)
+
+    def sp_after(self, sp, turns_ahead, damage_per_turn=0, refunds=None):
+        """Projects SP turns_ahead turns from now, if none of it is spent
+
+        Args:
+            sp: The SP held now
+            turns_ahead: How many turns to look ahead
+            damage_per_turn: The damage the player is expected to deal to their opponent each turn
+            refunds: A list of (turns until it is paid, SP) pairs, see removal_refunds
+
+        """
+        projected = sp + turns_ahead * (self.cores_per_round + self.cores_for_damage * damage_per_turn)
+        for turns_until, amount in refunds or []:
+            if turns_until <= turns_ahead:
+                projected += amount
+        return projected
+
+    def removal_refunds(self, game_state, player_index=0):
+        """Finds the refunds owed for a player's structures that are pending removal
+
+        The refund is refundPercentage of what the structure cost, including its upgrade,
+        scaled by its remaining health, and is paid after turnsRequiredToRemove turns.
+
+        Returns:
+            A list of (turns until it is paid, SP) pairs
+
+        """
+        from .game_state import UNIT_TYPE_TO_INDEX
+
+        refunds = []
+        for location in game_state.game_map:
+            for unit in game_state.game_map[location]:
+                if not (unit.stationary and unit.pending_removal and unit.player_index == player_index):
+                    continue
+                unit_information = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit.unit_type]]
+                rules = unit_information.get("upgrade", unit_information) if unit.upgraded else unit_information
+                cost = game_state.type_cost(unit.unit_type)[game_state.SP]
+                if unit.upgraded:
+                    cost += game_state.type_cost(unit.unit_type, True)[game_state.SP]
+                health_fraction = min(1, unit.health / unit.max_health) if unit.max_health else 1
+                refund = rules.get("refundPercentage", unit_information.get("refundPercentage", 0)) * cost * health_fraction
+                turns_until = rules.get("turnsRequiredToRemove", unit_information.get("turnsRequiredToRemove", 1))
+                refunds.append((turns_until, refund))
+        return refunds
+
+    def project(self, game_state, player_index=0, turns_ahead=5, damage_per_turn=0):
+        """Projects a player's SP and MP for each of the next turns_ahead turns, if they spend nothing
+
+        Args:
+            game_state: The current GameState
+            player_index: 0 for you, 1 for your opponent
+            turns_ahead: How many turns to look ahead
+            damage_per_turn: The damage the player is expected to deal to their opponent each turn
+
+        Returns:
+            A list of [SP, MP] pairs, starting with what the player holds now
+
+        """
+        sp, mp = game_state.get_resources(player_index)
+        refunds = self.removal_refunds(game_state, player_index)
+        return [[self.sp_after(sp, h, damage_per_turn, refunds), self.mp_after(game_state.turn_number, mp, h)] for h in range(turns_ahead + 1)]
@@ -0,0 +1,81 @@
+class ThreatMap:
+    """Holds the damage per frame that structures deal to mobile units at every location
+
+    The threat at a location is the sum of the damage of every enemy structure
+    that can hit a mobile unit standing there. Summing the threat along a path
+    gives the same estimate the starter strategy uses in least_damage_spawn_location,
+    without calling get_attackers for every step.
+
+    Attributes :
+        * player_index (int): The player whose mobile units are threatened, 0 for you 1 for your opponent
+        * threat (list): threat[x][y] is the total damage per frame dealt at location [x, y]
+
+    """
+    def __init__(self, game_state, player_index=0):
+        """Builds the threat map from the structures in the current game state
+
+        Args:
+            game_state: The current GameState
+            player_index: The player whose mobile units are threatened, 0 for you 1 for your opponent
+
+        """
+        self.game_map = game_state.game_map
+        self.player_index = player_index
+        self.threat = [[0 for _ in range(self.game_map.ARENA_SIZE)] for _ in range(self.game_map.ARENA_SIZE)]
+        self._range_cache = {}
+
+        for location in self.game_map:
+            for unit in self.game_map[location]:
+                if unit.stationary and unit.player_index != player_index and unit.damage_i > 0:
+                    self.add_attacker(location, unit.damage_i, unit.attackRange)
+
+    def locations_in_range(self, location, attack_range):
+        """Gets the locations a structure at location with the given range can hit
+
+        Results are cached, so repeated queries for the same location and range are free.
+
+        Returns:
+            A list of (x, y) tuples
+
+        """
+        key = (location[0], location[1], attack_range)
+        if key not in self._range_cache:
+            self._range_cache[key] = [tuple(in_range) for in_range in self.game_map.get_locations_in_range(location, attack_range)]
+        return self._range_cache[key]
+
+    def add_attacker(self, location, damage, attack_range):
+        """Adds the threat of a hypothetical structure
+
+        Args:
+            location: The location of the structure
+            damage: The damage per frame the structure deals to mobile units
+            attack_range: The attack range of the structure
+
+        """
+        for x, y in self.locations_in_range(location, attack_range):
+            self.threat[x][y] += damage
+
+    def remove_attacker(self, location, damage, attack_range):
+        """Removes the threat of a structure that was destroyed or removed
+        """
+        self.add_attacker(location, 0 - damage, attack_range)
+
+    def damage_at(self, location):
+        """Gets the damage per frame a mobile unit would take at a location
+        """
+        return self.threat[location[0]][location[1]]
+
+    def path_damage(self, path):
+        """Gets the total damage a mobile unit would take walking along a path
+
+        Args:
+            path: A list of locations, such as the result of GameState.find_path_to_edge
+
+        Returns:
+            The sum of the threat at every location on the path
+
+        """
+        if not path:
+            return 0
+        threat = self.threat
+        return sum(threat[x][y] for x, y in path)
@@ -0,0 +1,181 @@
+import json
+import math
+
+from .projection import get_projection
+from .threat_map import ThreatMap
+
+_timings = {}
+
+
+def get_attack_timing(config):
+    """Gets the AttackTiming for a game config, building it the first time
+
+    Decision tables are kept on the AttackTiming, so every turn of a game reuses the ones built before.
+    """
+    key = json.dumps([config["resources"], config["unitInformation"]], sort_keys=True)
+    if key not in _timings:
+        _timings[key] = AttackTiming(config)
+    return _timings[key]
+
+
+def estimate_units_lost(game_state, unit_type, location, threat_map=None):
+    """Estimates how many units of a group sent from location are destroyed before they reach the enemy edge
+
+    Structures fire at one unit at a time, so the damage along the path is taken one unit after another.
+    The group loses one unit for every max_health of damage dealt on the way, however big it is.
+
+    Args:
+        game_state: The current GameState
+        unit_type: The type of mobile unit sent
+        location: The location the group is deployed from
+        threat_map: A ThreatMap of the enemy structures. One is built if None.
+
+    Returns:
+        The number of units lost, or None if the path does not reach the enemy edge
+
+    """
+    from .unit import GameUnit
+
+    path = game_state.find_path_to_edge(location)
+    if not path:
+        return None
+    target_edge = game_state.get_target_edge(location)
+    if list(path[-1]) not in game_state.game_map.get_edge_locations(target_edge):
+        return None
+    if threat_map is None:
+        threat_map = ThreatMap(game_state)
+    unit = GameUnit(unit_type, game_state.config)
+    frames_per_step = 1 / unit.speed if unit.speed else 1
+    damage = threat_map.path_damage(path) * frames_per_step
+    return int(math.ceil(damage / unit.max_health - 1e-9))
+
+
+class AttackPlan:
+    """When to attack over the next few turns, and with how many units
+
+    Attributes :
+        * wait (int): The number of turns to save MP before the first attack, or None if no attack is worth making
+        * num (int): The number of units to send in the first attack
+        * damage (float): The damage the whole schedule is expected to deal
+        * schedule (list): (turn_number, num) pairs for every attack in the schedule
+
+    """
+    def __init__(self, wait, num, damage, schedule):
+        self.wait = wait
+        self.num = num
+        self.damage = damage
+        self.schedule = schedule
+
+    @property
+    def attack_now(self):
+        """True if the best schedule attacks this turn
+        """
+        return self.wait == 0
+
+
+class AttackTiming:
+    """Chooses the turns to spend all of your MP on an attack, to deal the most damage over the next few turns
+
+    Sending every unit you can afford each turn wastes MP, because a defense destroys about the same
+    number of units from every group it faces. Saving makes bigger groups, but saved MP decays. Which
+    turns to attack on is found with dynamic programming over turns and MP, in tenths like the engine,
+    using the ResourceProjection for the MP gained each turn.
+
+    A group of num units deals (num - units_lost) * playerBreachDamage, where units_lost comes from
+    estimate_units_lost or your own simulation. Plans look turns_ahead turns ahead and assume MP
+    saved past that is worth nothing, so call plan again each turn and follow only its first step.
+
+    Decision tables are kept per (unit type, units_lost), so later turns with the same estimate
+    reuse the work done before.
+
+    Attributes :
+        * turns_ahead (int): The default number of turns a plan looks ahead
+
+    """
+    def __init__(self, config, turns_ahead=5):
+        """
+        Args:
+            config: The game config
+            turns_ahead: The default number of turns a plan looks ahead
+
+        """
+        self.config = config
+        self.turns_ahead = turns_ahead
+        self.projection = get_projection(config)
+        self._tables = {}
+        self._next_mp = {}
+
+    def _attack_model(self, unit_type):
+        from .game_state import UNIT_TYPE_TO_INDEX
+
+        unit_information = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]
+        cost = unit_information.get("cost2", 0)
+        if cost <= 0:
+            raise ValueError("{} does not cost MP".format(unit_type))
+        return int(round(cost * 10)), unit_information.get("playerBreachDamage", 1)
+
+    def _next(self, turn_number, mp_tenths):
+        key = (turn_number, mp_tenths)
+        if key not in self._next_mp:
+            self._next_mp[key] = int(round(self.projection.mp_after(turn_number, mp_tenths / 10, 1) * 10))
+        return self._next_mp[key]
+
+    def _best(self, table, model, turn_number, mp_tenths, turns_left):
+        """The most damage that can be dealt on the next turns_left turns, and the number of units to send now for it
+        """
+        key = (turn_number, mp_tenths, turns_left)
+        if key in table:
+            return table[key]
+        cost_tenths, units_lost, breach_damage = model
+        num = mp_tenths // cost_tenths
+        damage = max(0, num - units_lost) * breach_damage
+
+        waited = 0
+        attacked = damage
+        if turns_left > 1:
+            waited = self._best(table, model, turn_number + 1, self._next(turn_number, mp_tenths), turns_left - 1)[0]
+            if damage > 0:
+                attacked += self._best(table, model, turn_number + 1, self._next(turn_number, mp_tenths - num * cost_tenths), turns_left - 1)[0]
+        # Ties attack now, since the defense only gets stronger
+        table[key] = (attacked, num) if damage > 0 and attacked >= waited else (waited, 0)
+        return table[key]
+
+    def plan(self, game_state, unit_type, units_lost, turns_ahead=None, mp=None):
+        """Plans when to attack with unit_type over the next turns_ahead turns, starting with this one
+
+        Args:
+            game_state: The current GameState
+            unit_type: The type of mobile unit to attack with
+            units_lost: The number of units the enemy defense destroys from each group, see estimate_units_lost
+            turns_ahead: How many turns to plan. self.turns_ahead if None.
+            mp: The MP available this turn. Your current MP if None.
+
+        Returns:
+            An AttackPlan
+
+        """
+        if turns_ahead is None:
+            turns_ahead = self.turns_ahead
+        if mp is None:
+            mp = game_state.get_resource(game_state.MP)
+        if units_lost is None or turns_ahead < 1:
+            return AttackPlan(None, 0, 0, [])
+
+        cost_tenths, breach_damage = self._attack_model(unit_type)
+        model = (cost_tenths, units_lost, breach_damage)
+        table = self._tables.setdefault((unit_type, units_lost), {})
+
+        turn_number = game_state.turn_number
+        mp_tenths = int(round(mp * 10))
+        damage = self._best(table, model, turn_number, mp_tenths, turns_ahead)[0]
+        schedule = []
+        for turns_left in range(turns_ahead, 0, -1):
+            num = self._best(table, model, turn_number, mp_tenths, turns_left)[1]
+            if num:
+                schedule.append((turn_number, num))
+            mp_tenths = self._next(turn_number, mp_tenths - num * cost_tenths)
+            turn_number += 1
+
+        if not schedule:
+            return AttackPlan(None, 0, damage, schedule)
+        return AttackPlan(schedule[0][0] - game_state.turn_number, schedule[0][1], damage, schedule)
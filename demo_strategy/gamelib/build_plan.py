@@ -0,0 +1,217 @@
+from .game_state import SPAWN_FAILURE_NAMES, BLOCKED, get_spawn_masks
+
+SPAWN = "spawn"
+UPGRADE = "upgrade"
+REMOVE = "remove"
+
+
+class PlanResult:
+    """What happened, or would happen, when a BuildPlan is applied to a GameState
+
+    Attributes :
+        * accepted (list): The (action, unit_type, location, num) entries that can be built, in order
+        * rejected (list): (entry, reasons) pairs for the entries that cannot, where reasons is a list of names such as "not_affordable"
+        * cost (list): The [SP, MP] spent by the accepted entries
+        * remaining (list): The [SP, MP] left after the accepted entries
+        * committed (bool): True if the accepted entries were added to the GameState
+
+    """
+    def __init__(self, accepted, rejected, cost, remaining, committed=False):
+        self.accepted = accepted
+        self.rejected = rejected
+        self.cost = cost
+        self.remaining = remaining
+        self.committed = committed
+
+    @property
+    def complete(self):
+        """True if every entry in the plan can be built
+        """
+        return not self.rejected
+
+
+class BuildPlan:
+    """An ordered list of builds, upgrades, removals and deploys that is checked and applied as a whole
+
+    Calling attempt_spawn and attempt_upgrade one tier at a time changes the GameState as you go,
+    so you cannot tell how much of a plan fits before committing to it. A BuildPlan is checked in a
+    single pass against your resources and the board, with the entries before it taken into account,
+    without changing the GameState. Check as many alternative plans as you like with dry_run,
+    then commit the one you want.
+
+    Entries are (action, unit_type, location) or (action, unit_type, location, num), where action is
+    SPAWN, UPGRADE or REMOVE. unit_type is ignored for UPGRADE and REMOVE.
+
+    Attributes :
+        * entries (list): The (action, unit_type, location, num) entries, in the order they are built
+
+    """
+    def __init__(self, entries=None):
+        """
+        Args:
+            entries: A list of (action, unit_type, location) or (action, unit_type, location, num) entries
+
+        """
+        self.entries = []
+        for entry in entries or []:
+            self.add(*entry)
+
+    def add(self, action, unit_type, location, num=1):
+        """Adds an entry to the end of the plan
+
+        Returns:
+            The plan, so calls can be chained
+
+        """
+        if action not in (SPAWN, UPGRADE, REMOVE):
+            raise ValueError("Unknown build plan action {}".format(action))
+        self.entries.append((action, unit_type, [location[0], location[1]], num))
+        return self
+
+    def spawn(self, unit_type, locations, num=1):
+        """Adds a spawn of num units of unit_type at each of locations, like attempt_spawn
+        """
+        for location in self._location_list(locations):
+            self.add(SPAWN, unit_type, location, num)
+        return self
+
+    def upgrade(self, locations):
+        """Adds an upgrade of the structure at each of locations, like attempt_upgrade
+        """
+        for location in self._location_list(locations):
+            self.add(UPGRADE, None, location)
+        return self
+
+    def remove(self, locations):
+        """Adds a removal of the structure at each of locations, like attempt_remove
+        """
+        for location in self._location_list(locations):
+            self.add(REMOVE, None, location)
+        return self
+
+    def _location_list(self, locations):
+        if type(locations[0]) == int:
+            return [locations]
+        return locations
+
+    def dry_run(self, game_state):
+        """Checks the plan against a GameState without changing it
+
+        Returns:
+            A PlanResult describing what would be built
+
+        """
+        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX
+
+        sp, mp = game_state.get_resources()
+        friendly_half = get_spawn_masks(game_state.game_map)[1]
+        unit_information = game_state.config["unitInformation"]
+        # The board as the plan changes it, location: [unit_type, upgraded] for structures and a count for mobile units.
+        # Removed structures stay until the end of the turn, so they still block their location.
+        structures = {}
+        mobile = {}
+        accepted = []
+        rejected = []
+        cost = [0, 0]
+
+        for entry in self.entries:
+            action, unit_type, location, num = entry
+            key = (location[0], location[1])
+            structure = self._structure_at(game_state, key, structures)
+            reasons = []
+
+            if action == SPAWN:
+                unit_cost = game_state.type_cost(unit_type)
+                affordable = self._affordable(sp, mp, unit_cost)
+                failure = game_state._spawn_failure(unit_type, location, num, affordable)
+                stationary = unit_type in STRUCTURE_TYPES
+                if structure is not None or (stationary and mobile.get(key)):
+                    failure |= BLOCKED
+                reasons = [SPAWN_FAILURE_NAMES[reason] for reason in SPAWN_FAILURE_NAMES if failure & reason]
+                if not reasons:
+                    if stationary:
+                        structures[key] = [unit_type, False]
+                    else:
+                        mobile[key] = mobile.get(key, 0) + num
+                    entry_cost = [unit_cost[0] * num, unit_cost[1] * num]
+
+            elif action == UPGRADE:
+                if key not in friendly_half:
+                    reasons.append("enemy_territory")
+                elif structure is None:
+                    reasons.append("no_structure")
+                elif structure[1] or unit_information[UNIT_TYPE_TO_INDEX[structure[0]]].get("upgrade", None) is None:
+                    reasons.append("not_upgradable")
+                else:
+                    entry_cost = game_state.type_cost(structure[0], True)
+                    if sp < entry_cost[0] or mp < entry_cost[1]:
+                        reasons.append("not_affordable")
+                    else:
+                        structures[key] = [structure[0], True]
+
+            else:
+                if key not in friendly_half:
+                    reasons.append("enemy_territory")
+                elif structure is None:
+                    reasons.append("no_structure")
+                else:
+                    entry_cost = [0, 0]
+
+            if reasons:
+                rejected.append((entry, reasons))
+            else:
+                accepted.append(entry)
+                sp -= entry_cost[0]
+                mp -= entry_cost[1]
+                cost[0] += entry_cost[0]
+                cost[1] += entry_cost[1]
+
+        return PlanResult(accepted, rejected, cost, [sp, mp])
+
+    def _structure_at(self, game_state, key, structures):
+        if key in structures:
+            return structures[key]
+        if key not in get_spawn_masks(game_state.game_map)[0]:
+            return None
+        unit = game_state.contains_stationary_unit(key)
+        if not unit:
+            return None
+        return [unit.unit_type, unit.upgraded]
+
+    def _affordable(self, sp, mp, unit_cost):
+        counts = [resource // unit_cost[i] for i, resource in enumerate((sp, mp)) if unit_cost[i] > 0]
+        return int(min(counts)) if counts else 0
+
+    def commit(self, game_state, all_or_nothing=False):
+        """Adds the plan to the turn
+
+        The plan is checked first, then every accepted entry is added to the build and deploy stacks,
+        the map and your resources. If anything goes wrong part way, the GameState is rolled back to
+        how it was before commit was called.
+
+        Args:
+            game_state: The GameState to build on
+            all_or_nothing: If True, nothing is committed unless every entry can be built
+
+        Returns:
+            A PlanResult describing what was built
+
+        """
+        result = self.dry_run(game_state)
+        if not result.accepted or (all_or_nothing and result.rejected):
+            return result
+
+        checkpoint = game_state._checkpoint([entry[2] for entry in result.accepted])
+        try:
+            for action, unit_type, location, num in result.accepted:
+                if action == SPAWN:
+                    game_state._apply_spawn(unit_type, location, num)
+                elif action == UPGRADE:
+                    game_state._apply_upgrade(location)
+                else:
+                    game_state._apply_remove(location)
+        except Exception:
+            game_state._rollback(checkpoint)
+            raise
+        result.committed = True
+        return result
@@ -0,0 +1,130 @@
+from .build_plan import BuildPlan, SPAWN, UPGRADE
+
+STRUCTURE_INDICES = (0, 1, 2)
+
+
+class DefenseLayout:
+    """A prioritized set of structures you want on the board, rebuilt from what is missing
+
+    Calling attempt_spawn and attempt_upgrade on a whole layout every turn mostly fails, because
+    most of the layout is already built. A DefenseLayout keeps track of which targets are missing
+    instead. Targets are marked as done when they are built, and missing again when a death event
+    in an action frame shows they were destroyed or removed. So the work done each turn depends on
+    what changed on the board, not on the size of the layout.
+
+    Pass each action frame to record_deaths, for example from on_action_frame. If you do not,
+    call sync at the start of each turn instead, which checks every target.
+
+    Attributes :
+        * targets (list): (unit_type, (x, y), upgrade) tuples, most important first
+
+    """
+    def __init__(self, targets):
+        """
+        Args:
+            targets: A list of (unit_type, location) or (unit_type, location, upgrade) entries, most important first.
+                A location listed twice keeps its first entry.
+
+        """
+        self.targets = []
+        self._priority = {}
+        for target in targets:
+            unit_type, location = target[0], target[1]
+            upgrade = target[2] if len(target) > 2 else False
+            key = (int(location[0]), int(location[1]))
+            if key in self._priority:
+                continue
+            self._priority[key] = len(self.targets)
+            self.targets.append((unit_type, key, upgrade))
+        self._pending = None
+
+    def sync(self, game_state):
+        """Checks every target against the board and marks the ones that are not built as missing
+        """
+        self._pending = set(priority for priority in range(len(self.targets)) if not self._is_done(game_state, priority))
+
+    def _is_done(self, game_state, priority):
+        unit_type, key, upgrade = self.targets[priority]
+        unit = game_state.contains_stationary_unit(key)
+        return bool(unit) and unit.player_index == 0 and unit.unit_type == unit_type and (unit.upgraded or not upgrade)
+
+    def record_deaths(self, frame_state):
+        """Marks the targets destroyed or removed during an action frame as missing
+
+        Args:
+            frame_state: The action frame, parsed with json.loads
+
+        """
+        if self._pending is None:
+            return
+        for death in frame_state["events"]["death"]:
+            location, type_index, owner = death[0], death[1], death[3]
+            if owner == 1 and type_index in STRUCTURE_INDICES:
+                priority = self._priority.get((location[0], location[1]))
+                if priority is not None:
+                    self._pending.add(priority)
+
+    def missing(self, game_state):
+        """Gets the targets that are not built, most important first
+        """
+        if self._pending is None:
+            self.sync(game_state)
+        return [self.targets[priority] for priority in sorted(self._pending)]
+
+    def plan(self, game_state, sp_budget=None):
+        """Plans the missing builds and upgrades in priority order, stopping at the first one that does not fit
+
+        A target whose location holds a different structure is skipped until that structure is gone.
+
+        Args:
+            game_state: The current GameState
+            sp_budget: The SP that may be spent. Your current SP if None.
+
+        Returns:
+            A BuildPlan. Commit it with commit or build.
+
+        """
+        if self._pending is None:
+            self.sync(game_state)
+        if sp_budget is None:
+            sp_budget = game_state.get_resource(game_state.SP)
+
+        plan = BuildPlan()
+        for priority in sorted(self._pending):
+            unit_type, key, upgrade = self.targets[priority]
+            unit = game_state.contains_stationary_unit(key)
+            if unit and (unit.player_index != 0 or unit.unit_type != unit_type):
+                continue
+            if unit and (unit.upgraded or not upgrade):
+                # Built by something else since it went missing
+                self._pending.discard(priority)
+                continue
+
+            cost = 0
+            if not unit:
+                cost += game_state.type_cost(unit_type)[game_state.SP]
+            if upgrade:
+                cost += game_state.type_cost(unit_type, True)[game_state.SP]
+            if cost > sp_budget:
+                break
+            sp_budget -= cost
+            if not unit:
+                plan.add(SPAWN, unit_type, key)
+            if upgrade:
+                plan.add(UPGRADE, unit_type, key)
+        return plan
+
+    def build(self, game_state, sp_budget=None):
+        """Plans the missing targets and adds them to your turn
+
+        Returns:
+            The PlanResult of the commit
+
+        """
+        result = self.plan(game_state, sp_budget).commit(game_state)
+        if result.committed:
+            for action, unit_type, location, num in result.accepted:
+                priority = self._priority[(location[0], location[1])]
+                if self._is_done(game_state, priority):
+                    self._pending.discard(priority)
+        return result
@@ -0,0 +1,123 @@
+import multiprocessing
+import os
+import sys
+import time
+
+from .util import debug_write
+
+_worker_evaluate = None
+_worker_config = None
+_worker_generation = None
+
+
+def _init_worker(evaluate, config, generation):
+    """Runs once in each worker process when the pool is created
+    """
+    global _worker_evaluate, _worker_config, _worker_generation
+    _worker_evaluate = evaluate
+    _worker_config = config
+    _worker_generation = generation
+    # stdout is how we talk to the engine, a stray print in a worker would corrupt our turn
+    sys.stdout = sys.stderr
+
+
+def _run_chunk(generation, snapshot, chunk):
+    """Evaluates a chunk of candidates, stopping early if the batch it belongs to was cancelled
+    """
+    results = []
+    for index, candidate in chunk:
+        if _worker_generation.value != generation:
+            break
+        results.append((index, _worker_evaluate(_worker_config, snapshot, candidate)))
+    return results
+
+
+class WorkerPool:
+    """A pool of worker processes that evaluate candidates in parallel
+
+    The pool should be created once, at the start of the game, so the cost of
+    starting processes is paid during the engine's start of game wait time.
+    Use AlgoCore.start_worker_pool to create one from on_game_start.
+
+    The evaluate function is called in the workers as evaluate(config, snapshot, candidate).
+    It must be defined at module level so that it can be sent to the workers,
+    and should not print to stdout.
+
+    Attributes :
+        * processes (int): The number of worker processes
+
+    """
+    def __init__(self, evaluate, config, processes=None):
+        """Starts the worker processes
+
+        Args:
+            evaluate: The function the workers call for each candidate
+            config: The game config, sent to each worker once
+            processes: The number of workers. One less than the number of cores if None.
+
+        """
+        if processes is None:
+            processes = max(1, (os.cpu_count() or 2) - 1)
+        self.processes = processes
+
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        self._generation = context.Value("i", 0)
+        self._pool = context.Pool(processes, initializer=_init_worker, initargs=(evaluate, config, self._generation))
+
+    def evaluate(self, snapshot, candidates, timeout=None, chunk_size=None):
+        """Evaluates every candidate against the same board snapshot
+
+        Args:
+            snapshot: Anything picklable describing the board, such as GameState.serialized_string
+            candidates: A list of picklable candidates
+            timeout: Seconds to wait for results. Candidates that are not done by then are cancelled.
+            chunk_size: The number of candidates sent to a worker at a time
+
+        Returns:
+            A list with one result per candidate, in order. Cancelled candidates have a result of None.
+
+        """
+        results = [None] * len(candidates)
+        if not candidates:
+            return results
+        if chunk_size is None:
+            chunk_size = max(1, len(candidates) // (self.processes * 4))
+
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        generation = self._generation.value
+        pending = []
+        for start in range(0, len(candidates), chunk_size):
+            chunk = [(index, candidates[index]) for index in range(start, min(start + chunk_size, len(candidates)))]
+            pending.append(self._pool.apply_async(_run_chunk, (generation, snapshot, chunk)))
+
+        for job in pending:
+            job.wait(None if deadline is None else max(0, deadline - time.perf_counter()))
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        self.cancel()
+
+        for job in pending:
+            if not job.ready():
+                continue
+            try:
+                for index, result in job.get():
+                    results[index] = result
+            except Exception as e:
+                debug_write("Worker failed to evaluate a candidate: {}".format(e))
+        return results
+
+    def cancel(self):
+        """Cancels every candidate that has not been evaluated yet
+
+        Workers finish the candidate they are on and skip the rest.
+        """
+        with self._generation.get_lock():
+            self._generation.value += 1
+
+    def close(self):
+        """Stops the worker processes
+        """
+        self.cancel()
+        self._pool.terminate()
+        self._pool.join()
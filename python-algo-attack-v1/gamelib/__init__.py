@@ -16,14 +16,62 @@ Investigating it is useful for advanced players interested in getting data from
 The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
+The BuildPlan class in build_plan.py checks an ordered list of builds, upgrades and deploys against your resources in one pass. 
+Use dry_run to compare alternative plans, and commit to add the one you choose to your turn. \n
+
+best_builds in knapsack.py chooses the builds and upgrades worth the most that fit in your SP, instead of spending in call order. \n
+
+The DefenseLayout class in layout.py is a prioritized list of structures you want on the board. 
+Each turn it plans only the ones that are missing or were destroyed, up to your SP. \n
+
+The ThreatMap class in threat_map.py holds the damage structures deal to mobile units at every location. 
+It is a fast replacement for calling get_attackers along every step of a path. \n
+
+The PlacementOptimizer class in placement.py searches wall and turret placements that make enemy paths longer and more dangerous, 
+and returns an ordered build list. \n
+
+The WorkerPool class in workers.py evaluates candidates in parallel worker processes, so searches can use more than one core. 
+Start one with AlgoCore.start_worker_pool in on_game_start. \n
+
+The BoardBuffer class in board_buffer.py is a copy of the board in shared memory. Workers read it in place instead of receiving a pickled GameState. \n
+
+The ResourceProjection class in projection.py projects SP and MP for either player over any number of turns, from tables built once per game. 
+Get the shared one with get_projection(config). \n
+
+The AttackTiming class in attack_timing.py uses the resource projection to choose which turns to save MP on and which to attack on, 
+given how many units the enemy defense destroys from each group. Get the shared one with get_attack_timing(config). \n
+
+The TurnBudget class in turn_budget.py times each turn and submits a fallback if on_turn runs out of time. 
+Use AlgoCore.remaining_time and AlgoCore.record_plan to work with it. \n
+
+The Precomputer class in precompute.py runs AlgoCore.precompute on a background thread during the action phase, 
+so work for the next turn is done while we wait on the engine. Start it with AlgoCore.start_precompute. \n
+
+The CommandReader class in command_reader.py reads engine messages on a background thread into a bounded queue. 
+Set AlgoCore.threaded_input to use it. \n
+
+The TurnInstrumentation class in instrumentation.py writes one JSON line per turn with phase timings, call counts and cache hit rates. 
+Enable it by setting the GAMELIB_INSTRUMENT environment variable, or "instrumentation" in algo.json, to the file to write. \n
+
+The TurnProfiler class in profiling.py runs cProfile on sampled and slow turns and saves .pstats files next to the replays. 
+Enable it with AlgoCore.profile_every or AlgoCore.profile_threshold. \n
+
+The BufferedLogger in log.py is a leveled logger that keeps messages in memory and writes them once per turn, when the turn is submitted. 
+Use gamelib.logger instead of debug_write inside loops. \n
+
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
 """
 
 from .algocore import AlgoCore
 from .util import debug_write
+from .log import logger
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .threat_map import ThreatMap
+from .placement import PlacementOptimizer
+from .build_plan import BuildPlan
+from .layout import DefenseLayout
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "attack_timing", "board_buffer", "build_plan", "command_reader", "game_state", "game_map", "instrumentation", "knapsack", "layout", "log", "navigation", "placement", "precompute", "profiling", "projection", "threat_map", "turn_budget", "unit", "util", "workers"]
  
\ No newline at end of file
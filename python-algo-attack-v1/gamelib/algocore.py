@@ -1,7 +1,16 @@
 import json
+import time
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .util import debug_write, BANNER_TEXT, send_command
+from .log import logger
+from .workers import WorkerPool
+from .board_buffer import BoardBuffer
+from .turn_budget import TurnBudget, submit
+from .precompute import Precomputer
+from .instrumentation import TurnInstrumentation, output_path
+from .profiling import TurnProfiler
+from .command_reader import CommandReader, read_command, CONFIG, TURN, ACTION_FRAME, END
 
 class AlgoCore(object):
     """
@@ -10,10 +19,38 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * worker_pool (:obj: WorkerPool): Worker processes started by start_worker_pool, or None
+        * board_buffer (:obj: BoardBuffer): Shared memory board created by create_board_buffer, or None
+        * turn_time_limit (float): Seconds the engine waits for a turn. Read from waitTimeBotMax if None.
+        * turn_hard_margin (float): Seconds before turn_time_limit at which the turn is submitted for you
+        * turn_budget (:obj: TurnBudget): Times the current turn, created when the first turn arrives
+        * precomputer (:obj: Precomputer): Runs precompute during the action phase, started by start_precompute, or None
+        * precomputed: The result of precompute for this turn's board, or None if there is none
+        * precompute_wait (float): Seconds a new turn waits for a precompute that is still running
+        * threaded_input (bool): If True, stdin is read on a background thread so the engine never waits on us. Set it before start.
+        * input_queue_size (int): The number of messages the background reader holds before it merges old action frames into newer ones
+        * instrumentation (:obj: TurnInstrumentation): Writes per turn timings if enabled with GAMELIB_INSTRUMENT or algo.json, or None
+        * profile_every (int): Run cProfile on every Nth turn and save it next to the replays. Off if 0.
+        * profile_threshold (float): Run cProfile after a turn that took longer than this many seconds, and save it if that turn is slow too. Off if None.
+        * turn_profiler (:obj: TurnProfiler): Created when the first turn arrives if profile_every or profile_threshold is set
 
     """
     def __init__(self):
         self.config = None
+        self.worker_pool = None
+        self.board_buffer = None
+        self.turn_time_limit = None
+        self.turn_hard_margin = 2.0
+        self.turn_budget = None
+        self.precomputer = None
+        self.precomputed = None
+        self.precompute_wait = 0.5
+        self.threaded_input = False
+        self.input_queue_size = 256
+        self.instrumentation = None
+        self.profile_every = 0
+        self.profile_threshold = None
+        self.turn_profiler = None
 
     def on_game_start(self, config):
         """
@@ -31,8 +68,7 @@ class AlgoCore(object):
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
         """
-        send_command("[]")
-        send_command("[]")
+        submit([], [])
     
     def on_action_frame(self, action_frame_game_state):
         """
@@ -43,6 +79,97 @@ class AlgoCore(object):
         """
         pass
 
+    def on_action_frames(self, action_frame_game_states):
+        """
+        Called with a list of action frames, oldest first. With threaded_input, this is every frame that 
+        queued up while the algo was busy, otherwise it is a single frame. \n
+        By default it calls on_action_frame for each frame. Override it to batch your frame bookkeeping.
+        """
+        for action_frame_game_state in action_frame_game_states:
+            self.on_action_frame(action_frame_game_state)
+
+    def on_turn_timeout(self, game_state):
+        """
+        Called from a background thread when on_turn runs out of time and no plan was recorded with record_plan. 
+        It is passed the same game state string as on_turn, and returns a (build_stack, deploy_stack) pair to submit. 
+        By default nothing is built. \n
+        Override it with something cheap, such as rebuilding your base layout. 
+        """
+        return [], []
+
+    def remaining_time(self):
+        """
+        Seconds left in the current turn before it is submitted for you.
+        """
+        if self.turn_budget is None:
+            return float("inf")
+        return self.turn_budget.remaining_time()
+
+    def record_plan(self, game_state):
+        """
+        Records the builds and deploys queued on game_state as the best plan so far. 
+        If on_turn runs out of time, this plan is submitted instead of calling on_turn_timeout.
+        """
+        if self.turn_budget is not None:
+            self.turn_budget.record_plan(game_state._build_stack, game_state._deploy_stack)
+
+    def _start_turn_budget(self, turn_number, start_time, game_state_string):
+        if self.turn_budget is None:
+            time_limit = self.turn_time_limit
+            if time_limit is None:
+                time_limit = self.config["timingAndReplay"]["waitTimeBotMax"] / 1000
+            self.turn_budget = TurnBudget(time_limit, self.turn_hard_margin)
+        self.turn_budget.start(turn_number, start_time, lambda: self.on_turn_timeout(game_state_string))
+
+    def precompute(self, game_state):
+        """
+        Called on a background thread with the latest action frame while the engine plays out the action phase. 
+        Whatever it returns is available as self.precomputed in the next on_turn, if the structures on the board 
+        did not change in between. Use it to warm up threat maps, paths or candidate plans. \n
+        Only runs after start_precompute is called. It must not print to stdout.
+        """
+        return None
+
+    def start_precompute(self):
+        """
+        Starts the background thread that runs precompute on action frames. Call it from on_game_start, after self.config is set. \n
+        The thread is stopped automatically when the game ends. See Precomputer in precompute.py.
+        """
+        if self.precomputer is not None:
+            self.precomputer.close()
+        self.precomputer = Precomputer(self.precompute, self.config)
+        return self.precomputer
+
+    def start_worker_pool(self, evaluate, processes=None):
+        """
+        Starts worker processes that can evaluate candidates in parallel. 
+        Call it from on_game_start, after self.config is set, so the startup cost is paid 
+        while the engine waits for the game to start. \n
+        The pool is stopped automatically when the game ends. See WorkerPool in workers.py.
+        """
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+        self.worker_pool = WorkerPool(evaluate, self.config, processes)
+        return self.worker_pool
+
+    def stop_worker_pool(self):
+        """
+        Stops the worker processes started by start_worker_pool, if any.
+        """
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+            self.worker_pool = None
+
+    def create_board_buffer(self):
+        """
+        Creates a shared memory copy of the board that worker processes can read without pickling. 
+        Write each turn's GameState into it with self.board_buffer.write(game_state), and pass 
+        self.board_buffer.name to the workers so they can BoardBuffer.attach to it. \n
+        The buffer is freed automatically when the game ends. See BoardBuffer in board_buffer.py.
+        """
+        if self.board_buffer is None:
+            self.board_buffer = BoardBuffer()
+        return self.board_buffer
 
     def start(self):
         """ 
@@ -53,31 +180,65 @@ class AlgoCore(object):
         """
         debug_write(BANNER_TEXT)
 
-        while True:
-            # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
-            # manually kill this Python program.
-            game_state_string = get_command()
-            if "replaySave" in game_state_string:
-                """
-                This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
-                """
-                parsed_config = json.loads(game_state_string)
-                self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
-                if stateType == 0:
+        path = output_path()
+        if path is not None:
+            self.instrumentation = TurnInstrumentation(path)
+            self.instrumentation.install()
+
+        reader = None
+        read = read_command
+        if self.threaded_input:
+            reader = CommandReader(self.input_queue_size)
+            reader.start()
+            read = reader.get
+
+        try:
+            while True:
+                # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
+                # manually kill this Python program.
+                kind, game_state_string = read()
+                received_time = time.perf_counter() if reader is None else reader.received_time
+                if kind == CONFIG:
+                    """
+                    This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
+                    """
+                    parsed_config = json.loads(game_state_string)
+                    self.on_game_start(parsed_config)
+                elif kind == TURN:
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
                     """
-                    self.on_turn(game_state_string)
-                elif stateType == 1:
+                    state = json.loads(game_state_string)
+                    turn_number = int(state.get("turnInfo")[1])
+                    self._start_turn_budget(turn_number, received_time, game_state_string)
+                    if self.instrumentation is not None:
+                        self.instrumentation.start_turn(turn_number, received_time)
+                    if self.precomputer is not None:
+                        self.precomputed = self.precomputer.take(state, self.precompute_wait)
+                    if self.turn_profiler is None and (self.profile_every or self.profile_threshold is not None):
+                        self.turn_profiler = TurnProfiler(every=self.profile_every, threshold=self.profile_threshold)
+                    if self.turn_profiler is not None:
+                        self.turn_profiler.run(turn_number, self.on_turn, game_state_string)
+                    else:
+                        self.on_turn(game_state_string)
+                    self.turn_budget.stop()
+                    if self.instrumentation is not None:
+                        if self.precomputer is not None:
+                            self.instrumentation.record_cache("precompute", self.precomputed is not None)
+                        self.instrumentation.end_turn()
+                elif kind == ACTION_FRAME:
                     """
-                    If stateType == 1, this game_state_string string represents a single frame of an action phase
+                    This game_state_string string represents a single frame of an action phase. 
+                    With threaded_input, frames that queued up while we were busy are handled together.
                     """
-                    self.on_action_frame(game_state_string)
-                elif stateType == 2:
+                    frames = [game_state_string]
+                    if reader is not None:
+                        frames.extend(reader.drain_frames())
+                    if self.precomputer is not None:
+                        self.precomputer.feed(frames[-1])
+                    self.on_action_frames(frames)
+                elif kind == END:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
                     """
@@ -87,9 +248,19 @@ class AlgoCore(object):
                     """
                     Something is wrong? Received an incorrect or improperly formatted string.
                     """
-                    debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
-            else:
-                """
-                Something is wrong? Received an incorrect or improperly formatted string.
-                """
-                debug_write("Got unexpected string : {}".format(game_state_string))
+                    debug_write("Got unexpected string : {}".format(game_state_string))
+        finally:
+            # Runs on the end game message and when get_command exits on EOF
+            logger.flush()
+            if self.turn_budget is not None:
+                self.turn_budget.stop()
+            if self.precomputer is not None:
+                self.precomputer.close()
+                self.precomputer = None
+            if self.instrumentation is not None:
+                self.instrumentation.close()
+                self.instrumentation = None
+            self.stop_worker_pool()
+            if self.board_buffer is not None:
+                self.board_buffer.close()
+                self.board_buffer = None
@@ -0,0 +1,170 @@
+import collections
+import json
+import re
+import sys
+import threading
+import time
+
+from .util import get_command, debug_write
+
+CONFIG = "config"
+TURN = "turn"
+ACTION_FRAME = "action_frame"
+END = "end"
+UNKNOWN = "unknown"
+END_OF_INPUT = "end_of_input"
+
+_STATE_TYPE = re.compile(r'"turnInfo"\s*:\s*\[\s*(\d+)')
+_STATE_TYPE_KINDS = {"0": TURN, "1": ACTION_FRAME, "2": END}
+
+
+def classify(message):
+    """Finds what kind of message the engine sent without parsing all of it
+
+    Returns:
+        CONFIG, TURN, ACTION_FRAME, END or UNKNOWN
+
+    """
+    if "replaySave" in message:
+        return CONFIG
+    match = _STATE_TYPE.search(message)
+    if match is None:
+        return UNKNOWN
+    return _STATE_TYPE_KINDS.get(match.group(1), UNKNOWN)
+
+
+def merge_frames(older, newer):
+    """Adds the events of an action frame that is dropped to the frame after it
+
+    The newer frame's state is kept, with the older frame's events in front of its own,
+    so breaches and deaths are not lost when the queue is full.
+
+    Returns:
+        The merged action frame message
+
+    """
+    older_events = json.loads(older).get("events", {})
+    if not any(older_events.values()):
+        return newer
+    state = json.loads(newer)
+    events = state.setdefault("events", {})
+    for name, event_list in older_events.items():
+        events[name] = event_list + events.get(name, [])
+    return json.dumps(state)
+
+
+def read_command():
+    """Reads the next message from stdin on the calling thread
+
+    Returns:
+        A (kind, message) pair, see classify
+
+    """
+    message = get_command()
+    return classify(message), message
+
+
+class CommandReader:
+    """Reads stdin on a background thread so the engine never waits on our pipe
+
+    Messages are classified as they arrive and kept in order in a bounded queue.
+    When the queue is full, the oldest action frame that is followed by another one is dropped
+    to make room, and its events are merged into that next frame (see merge_frames).
+    Config, turn and end messages are never dropped. The number of frames dropped is written
+    to the debug output by get.
+
+    Attributes :
+        * max_size (int): The number of messages the queue holds before action frames are dropped
+        * dropped (int): The number of action frames merged into the next one because the queue was full
+        * received_time (float): The time.perf_counter() value at which the last message returned by get arrived
+
+    """
+    def __init__(self, max_size=256, stream=None):
+        """
+        Args:
+            max_size: The number of messages the queue holds before action frames are dropped
+            stream: The stream to read from, sys.stdin if None
+
+        """
+        self.max_size = max_size
+        self.dropped = 0
+        self.received_time = None
+        self._reported = 0
+        self._stream = sys.stdin if stream is None else stream
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """Starts the reader thread
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="command reader", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                message = self._stream.readline()
+            except (EOFError, ValueError):
+                message = ""
+            if message == "":
+                self._put(END_OF_INPUT, message)
+                return
+            self._put(classify(message), message)
+
+    def _put(self, kind, message):
+        received_time = time.perf_counter()
+        with self._condition:
+            if len(self._queue) >= self.max_size:
+                for i in range(len(self._queue) - 1):
+                    if self._queue[i][0] == ACTION_FRAME and self._queue[i + 1][0] == ACTION_FRAME:
+                        older = self._queue[i][1]
+                        del self._queue[i]
+                        _, newer, newer_time = self._queue[i]
+                        self._queue[i] = (ACTION_FRAME, merge_frames(older, newer), newer_time)
+                        self.dropped += 1
+                        break
+            self._queue.append((kind, message, received_time))
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Gets the next message, waiting for one if the queue is empty
+
+        Exits the program if the engine closed stdin, like get_command.
+
+        Returns:
+            A (kind, message) pair, see classify. None if timeout ran out.
+
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._queue, timeout):
+                return None
+            kind, message, self.received_time = self._queue.popleft()
+            dropped = self.dropped
+        if dropped > self._reported:
+            debug_write("Input queue was full, merged {} action frames into the next one".format(dropped - self._reported))
+            self._reported = dropped
+        if kind == END_OF_INPUT:
+            debug_write("Got EOF, parent game process must have died, exiting for cleanup")
+            exit()
+        return kind, message
+
+    def drain_frames(self):
+        """Takes every action frame at the front of the queue without waiting
+
+        Returns:
+            A list of action frame messages, oldest first
+
+        """
+        frames = []
+        with self._condition:
+            while self._queue and self._queue[0][0] == ACTION_FRAME:
+                frames.append(self._queue.popleft()[1])
+        return frames
+
+    def pending(self):
+        """The number of messages waiting in the queue
+        """
+        with self._condition:
+            return len(self._queue)
@@ -1,7 +1,7 @@
 import heapq
 import math
 import sys
-import queue
+from collections import deque
 from .util import debug_write
 
 class Node:
@@ -40,6 +40,7 @@ class ShortestPathFinder:
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.initialized = False
+        self._in_bounds_neighbors = None
 
     def initialize_map(self, game_state):
         """Initializes the map
@@ -51,6 +52,12 @@ class ShortestPathFinder:
         self.initialized = True
         self.game_state = game_state
         self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        if self._in_bounds_neighbors is None:
+            # Neighbors never change, so bounds are only checked once per finder
+            size = self.game_state.ARENA_SIZE
+            in_arena_bounds = self.game_state.game_map.in_arena_bounds
+            self._in_bounds_neighbors = [[[neighbor for neighbor in self._get_neighbors([x, y]) if in_arena_bounds(neighbor)]
+                for y in range(size)] for x in range(size)]
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -68,32 +75,95 @@ class ShortestPathFinder:
         if game_state.contains_stationary_unit(start_point):
             return
 
+        return self._navigate(start_point, end_points, game_state, self.get_blocked_locations(game_state))
+
+    def navigate_multiple_starts(self, start_points, end_points, game_state, blocked=None):
+        """Finds the paths units at several start points would take to reach the same set of endpoints
+
+        Every start point that can reach end_points shares a single validation pass, so this is
+        much cheaper than calling navigate_multiple_endpoints once per start point.
+
+        Args:
+            * start_points: The starting locations of the units
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+            * blocked: A set of (x, y) tuples to treat as structures. Read from game_state if None.
+
+        Returns:
+            A dict mapping each start point, as an (x, y) tuple, to the path a unit there would take.
+            Start points that are blocked map to None.
+
+        """
+        if blocked is None:
+            blocked = self.get_blocked_locations(game_state)
+
+        self.initialize_map(game_state)
+        self._fill_blocked(blocked)
+        self._validate(end_points[0], end_points)
+
+        paths = {}
+        self_destructing = []
+        for start_point in start_points:
+            x, y = start_point
+            if (x, y) in blocked:
+                paths[(x, y)] = None
+            elif self.game_map[x][y].pathlength == -1:
+                # This unit can not reach the edge, so its target depends on its own pocket
+                self_destructing.append(start_point)
+            else:
+                paths[(x, y)] = self._get_path([x, y], end_points)
+
+        for start_point in self_destructing:
+            paths[tuple(start_point)] = self._navigate(start_point, end_points, game_state, blocked)
+        return paths
+
+    def get_blocked_locations(self, game_state):
+        """Gets every location that currently holds a structure
+
+        Args:
+            game_state: The current game state
+
+        Returns:
+            A set of (x, y) tuples
+
+        """
+        blocked = set()
+        for location in game_state.game_map:
+            if game_state.contains_stationary_unit(location):
+                blocked.add((location[0], location[1]))
+        return blocked
+
+    def _navigate(self, start_point, end_points, game_state, blocked):
+        """Runs a full search from a single start point, treating the locations in blocked as structures
+        """
         #Initialize map 
         self.initialize_map(game_state)
         #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
+        self._fill_blocked(blocked)
         #Do pathfinding
         ideal_endpoints = self._idealness_search(start_point, end_points)
         self._validate(ideal_endpoints, end_points)
         return self._get_path(start_point, end_points)
 
+    def _fill_blocked(self, blocked):
+        for x, y in blocked:
+            self.game_map[x][y].blocked = True
+
     def _idealness_search(self, start, end_points):
         """
         Finds the most ideal tile in our 'pocket' of pathable space. 
         The edge if it is available, or the best self destruct location otherwise
         """
-        current = queue.Queue()
-        current.put(start)
+        current = deque()
+        current.append(start)
         best_idealness = self._get_idealness(start, end_points)
         self.game_map[start[0]][start[1]].visited_idealness = True
         most_ideal = start
 
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        while current:
+            search_location = current.popleft()
+            for neighbor in self._in_bounds_neighbors[search_location[0]][search_location[1]]:
+                if self.game_map[neighbor[0]][neighbor[1]].blocked:
                     continue
 
                 x, y = neighbor
@@ -105,7 +175,7 @@ class ShortestPathFinder:
 
                 if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
                     self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
+                    current.append(neighbor)
 
         return most_ideal
 
@@ -164,31 +234,31 @@ class ShortestPathFinder:
         """
         #VALDIATION
         #Add our most ideal tiles to current
-        current = queue.Queue()
+        current = deque()
         if ideal_tile in end_points:
             for location in end_points:
-               current.put(location)
+               current.append(location)
                #Set current pathlength to 0
                self.game_map[location[0]][location[1]].pathlength = 0
                self.game_map[location[0]][location[1]].visited_validate = True
         else:
-            current.put(ideal_tile)
+            current.append(ideal_tile)
             self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
             self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
 
         #While current is not empty
-        while not current.empty():
-            current_location = current.get()
+        while current:
+            current_location = current.popleft()
             current_node = self.game_map[current_location[0]][current_location[1]]
-            for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+            for neighbor in self._in_bounds_neighbors[current_location[0]][current_location[1]]:
+                if self.game_map[neighbor[0]][neighbor[1]].blocked:
                     continue
 
                 neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
                 if not neighbor_node.visited_validate and not current_node.blocked:
                     neighbor_node.pathlength = current_node.pathlength + 1
                     neighbor_node.visited_validate = True
-                    current.put(neighbor)
+                    current.append(neighbor)
 
         #debug_write("Print after validate")
         #self.print_map()
@@ -221,14 +291,14 @@ class ShortestPathFinder:
     def _choose_next_move(self, current_point, previous_move_direction, end_points):
         """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
         """
-        neighbors = self._get_neighbors(current_point)
+        neighbors = self._in_bounds_neighbors[current_point[0]][current_point[1]]
         #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, neighbors))
 
         ideal_neighbor = current_point
         best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
         for neighbor in neighbors:
             #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+            if self.game_map[neighbor[0]][neighbor[1]].blocked:
                 continue
 
             new_best = False
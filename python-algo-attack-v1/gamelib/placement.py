@@ -0,0 +1,210 @@
+import heapq
+
+from .navigation import ShortestPathFinder
+from .threat_map import ThreatMap
+from .unit import GameUnit
+
+
+class PlacementOptimizer:
+    """Chooses structure placements that make the enemy's paths long and dangerous
+
+    Every enemy spawn location is pathed once when the optimizer is created.
+    A structure only changes the path of a unit if it is placed on that path,
+    so scoring a candidate only re-paths the spawn locations whose path runs through it.
+    Turret damage is scored with a ThreatMap, so candidates off every path cost a few set lookups.
+
+    Attributes :
+        * game_state (:obj: GameState): The game state placements are planned for
+        * spawn_locations (list): The enemy spawn locations that are scored
+        * threat_map (:obj: ThreatMap): The threat to enemy mobile units, including planned placements
+        * damage_weight (float): How much one point of damage along an enemy path is worth
+        * length_weight (float): How much one extra step of enemy path length is worth
+        * evaluations (int): The number of candidate placements scored so far
+
+    """
+    def __init__(self, game_state, spawn_locations=None, damage_weight=1.0, length_weight=1.0):
+        """Paths every enemy spawn location on the current board
+
+        Args:
+            game_state: The current GameState
+            spawn_locations: The locations the enemy is likely to spawn from. Every unblocked location on the enemy's edges if None.
+            damage_weight: How much one point of damage along an enemy path is worth
+            length_weight: How much one extra step of enemy path length is worth
+
+        """
+        self.game_state = game_state
+        self.damage_weight = damage_weight
+        self.length_weight = length_weight
+        self.evaluations = 0
+
+        game_map = game_state.game_map
+        if spawn_locations is None:
+            spawn_locations = game_map.get_edge_locations(game_map.TOP_LEFT) + game_map.get_edge_locations(game_map.TOP_RIGHT)
+
+        self._path_finder = ShortestPathFinder()
+        self._blocked = self._path_finder.get_blocked_locations(game_state)
+        self.spawn_locations = [location for location in spawn_locations if tuple(location) not in self._blocked]
+        self.threat_map = ThreatMap(game_state, 1)
+
+        self._paths = {}
+        self._path_sets = {}
+        self._path_scores = {}
+        for edge, starts in self._starts_by_target_edge(self.spawn_locations).items():
+            paths = self._path_finder.navigate_multiple_starts(starts, game_map.get_edge_locations(edge), game_state, self._blocked)
+            for start, path in paths.items():
+                self._set_path(start, path)
+
+    def _starts_by_target_edge(self, starts):
+        grouped = {}
+        for start in starts:
+            grouped.setdefault(self.game_state.get_target_edge(start), []).append(start)
+        return grouped
+
+    def _set_path(self, start, path):
+        self._paths[start] = path
+        self._path_sets[start] = set(tuple(location) for location in path) if path else set()
+        self._path_scores[start] = self._path_score(path)
+
+    def _path_score(self, path):
+        if not path:
+            return 0
+        return self.damage_weight * self.threat_map.path_damage(path) + self.length_weight * len(path)
+
+    def _attack_stats(self, unit_type):
+        unit = GameUnit(unit_type, self.game_state.config)
+        return unit.damage_i, unit.attackRange
+
+    def _repath(self, location):
+        """Finds the new paths of every spawn location whose path runs through location, if it were blocked
+        """
+        key = tuple(location)
+        affected = [start for start, path_set in self._path_sets.items() if key in path_set]
+        if not affected:
+            return {}
+
+        blocked = self._blocked | {key}
+        game_map = self.game_state.game_map
+        new_paths = {}
+        for edge, starts in self._starts_by_target_edge(affected).items():
+            new_paths.update(self._path_finder.navigate_multiple_starts(starts, game_map.get_edge_locations(edge), self.game_state, blocked))
+        return new_paths
+
+    def _turret_bonus(self, path_set, in_range, damage):
+        return self.damage_weight * damage * len(path_set.intersection(in_range))
+
+    def evaluate(self, unit_type, location):
+        """Scores placing a single structure on top of the placements committed so far
+
+        Args:
+            unit_type: The type of structure, such as WALL or TURRET
+            location: The location of the structure
+
+        Returns:
+            How much the total score of all enemy paths would increase, or None if the location is already taken
+
+        """
+        key = tuple(location)
+        if key in self._blocked:
+            return None
+        self.evaluations += 1
+
+        new_paths = self._repath(location)
+        damage, attack_range = self._attack_stats(unit_type)
+        in_range = self.threat_map.locations_in_range(location, attack_range) if damage > 0 else []
+
+        gain = 0
+        for start, path in new_paths.items():
+            gain += self._path_score(path) - self._path_scores[start]
+        if in_range:
+            for start, path_set in self._path_sets.items():
+                if start in new_paths:
+                    path = new_paths[start]
+                    path_set = set(tuple(step) for step in path) if path else set()
+                gain += self._turret_bonus(path_set, in_range, damage)
+        return gain
+
+    def commit(self, unit_type, location):
+        """Adds a structure to the board the optimizer is planning on
+
+        This does not affect your turn, use GameState.attempt_spawn to actually build it.
+        """
+        new_paths = self._repath(location)
+        self._blocked.add(tuple(location))
+        damage, attack_range = self._attack_stats(unit_type)
+        if damage > 0:
+            self.threat_map.add_attacker(location, damage, attack_range)
+            for start in self._paths:
+                if start not in new_paths:
+                    self._path_scores[start] = self._path_score(self._paths[start])
+        for start, path in new_paths.items():
+            self._set_path(start, path)
+
+    def default_candidates(self, unit_types):
+        """Every free location in your half of the map that is not on your own spawn edges, for each of unit_types
+
+        Returns:
+            A list of (unit_type, [x, y]) entries
+
+        """
+        game_map = self.game_state.game_map
+        own_edges = set(tuple(location) for location in game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT))
+        candidates = []
+        for location in game_map:
+            key = (location[0], location[1])
+            if location[1] < game_map.HALF_ARENA and key not in self._blocked and key not in own_edges:
+                for unit_type in unit_types:
+                    candidates.append((unit_type, [location[0], location[1]]))
+        return candidates
+
+    def optimize(self, candidates, sp_budget=None, max_placements=None):
+        """Greedily picks the placement with the best score per SP until the budget runs out
+
+        Candidates are kept in a heap keyed by their last known score. Only the top candidate is
+        re-scored after each placement, and it is accepted if it still beats the stale score of
+        the next one. Candidates that scored nothing when first seen are not revisited.
+
+        Args:
+            candidates: A list of (unit_type, location) entries the optimizer may choose from. See default_candidates.
+            sp_budget: The SP that may be spent. Your current SP if None.
+            max_placements: Stop after this many placements if set
+
+        Returns:
+            An ordered build list of (unit_type, [x, y]) entries. Build it in order with GameState.attempt_spawn.
+
+        """
+        if sp_budget is None:
+            sp_budget = self.game_state.get_resource(self.game_state.SP)
+
+        heap = []
+        for order, (unit_type, location) in enumerate(candidates):
+            cost = self.game_state.type_cost(unit_type)[self.game_state.SP]
+            if cost > sp_budget:
+                continue
+            value = self._value(unit_type, location, cost)
+            if value is not None and value > 0:
+                heapq.heappush(heap, (0 - value, order, unit_type, location, cost, 0))
+
+        build_list = []
+        placements = 0
+        while heap and (max_placements is None or len(build_list) < max_placements):
+            _, order, unit_type, location, cost, scored_at = heapq.heappop(heap)
+            if cost > sp_budget:
+                continue
+            if scored_at != placements:
+                # Score is stale, re-score it and put it back in line
+                value = self._value(unit_type, location, cost)
+                if value is not None and value > 0:
+                    heapq.heappush(heap, (0 - value, order, unit_type, location, cost, placements))
+                continue
+
+            self.commit(unit_type, location)
+            sp_budget -= cost
+            placements += 1
+            build_list.append((unit_type, [location[0], location[1]]))
+        return build_list
+
+    def _value(self, unit_type, location, cost):
+        gain = self.evaluate(unit_type, location)
+        if gain is None:
+            return None
+        return gain / cost if cost > 0 else gain
@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+
+from .util import send_command, debug_write
+
+_active = None
+
+
+def submit(build_stack, deploy_stack):
+    """Sends a turn to the engine, unless the turn in progress was already submitted
+
+    Used by GameState.submit_turn. When no TurnBudget is running the turn is always sent.
+
+    Returns:
+        True if the turn was sent
+
+    """
+    if _active is None:
+        send_command(json.dumps(build_stack))
+        send_command(json.dumps(deploy_stack))
+        return True
+    return _active.submit(build_stack, deploy_stack)
+
+
+class TurnBudget:
+    """Watches the time spent on a turn and submits a fallback before the engine gives up on us
+
+    The engine stops waiting for a turn after waitTimeBotMax. A TurnBudget starts timing when the
+    turn message arrives. If the turn has not been submitted hard_margin seconds before the limit,
+    it submits the best plan recorded with record_plan, or the plan returned by fallback if nothing
+    was recorded. After that, submitting the same turn again does nothing. The watchdog of a turn
+    never submits once the next turn has started.
+
+    Attributes :
+        * time_limit (float): Seconds the engine waits for a turn
+        * hard_margin (float): Seconds before time_limit at which the fallback is submitted
+        * turn_number (int): The turn being timed
+        * submitted (bool): True if this turn has been sent to the engine
+        * timed_out (bool): True if this turn was submitted by the watchdog
+
+    """
+    def __init__(self, time_limit, hard_margin=2.0, fallback=None):
+        """
+        Args:
+            time_limit: Seconds the engine waits for a turn, usually waitTimeBotMax / 1000
+            hard_margin: Seconds before time_limit at which the fallback is submitted
+            fallback: Called with no arguments when the deadline hits and no plan was recorded.
+                Returns a (build_stack, deploy_stack) pair. Nothing is built if None.
+
+        """
+        self.time_limit = time_limit
+        self.hard_margin = hard_margin
+        self.fallback = fallback
+        self.turn_number = None
+        self.submitted = False
+        self.timed_out = False
+        self._start_time = None
+        self._best_plan = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def start(self, turn_number, start_time=None, fallback=None):
+        """Starts timing a turn and arms the watchdog
+
+        Args:
+            turn_number: The turn being timed
+            start_time: The time.perf_counter() value at which the turn message arrived. Now if None.
+            fallback: Used instead of the fallback given to __init__ for this turn only, 
+                so it can be bound to the data of this turn
+
+        """
+        global _active
+        self.stop()
+        with self._lock:
+            self.turn_number = turn_number
+            self.submitted = False
+            self.timed_out = False
+            self._best_plan = None
+            self._start_time = time.perf_counter() if start_time is None else start_time
+            self._timer = threading.Timer(max(0, self.remaining_time()), self._expire, (turn_number, fallback or self.fallback))
+            self._timer.daemon = True
+            self._timer.start()
+        _active = self
+
+    def stop(self):
+        """Disarms the watchdog for the current turn
+        """
+        global _active
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if _active is self:
+            _active = None
+
+    def elapsed_time(self):
+        """Seconds since the turn message arrived
+        """
+        if self._start_time is None:
+            return 0
+        return time.perf_counter() - self._start_time
+
+    def remaining_time(self):
+        """Seconds left before the watchdog submits on your behalf
+        """
+        return self.time_limit - self.hard_margin - self.elapsed_time()
+
+    def record_plan(self, build_stack, deploy_stack):
+        """Records the best plan found so far, which the watchdog submits if the turn runs out of time
+
+        The stacks are copied, so the caller can keep changing them.
+        """
+        with self._lock:
+            self._best_plan = (list(build_stack), list(deploy_stack))
+
+    def submit(self, build_stack, deploy_stack):
+        """Sends the turn to the engine if it has not been sent yet
+
+        Returns:
+            True if the turn was sent, False if it was already submitted
+
+        """
+        if not self._send(build_stack, deploy_stack, self.turn_number):
+            debug_write("Turn {} was already submitted, ignoring late submit_turn".format(self.turn_number))
+            return False
+        if self._timer is not None:
+            self._timer.cancel()
+        return True
+
+    def _send(self, build_stack, deploy_stack, turn_number, timed_out=False):
+        with self._lock:
+            if self.submitted or self.turn_number != turn_number:
+                return False
+            self.submitted = True
+            self.timed_out = timed_out
+            send_command(json.dumps(build_stack))
+            send_command(json.dumps(deploy_stack))
+            return True
+
+    def _expire(self, turn_number, fallback):
+        with self._lock:
+            if self.submitted or self.turn_number != turn_number:
+                return
+            plan = self._best_plan
+        description = "best recorded plan"
+        if plan is None:
+            description = "fallback plan"
+            plan = ([], [])
+            if fallback is not None:
+                try:
+                    plan = fallback()
+                except Exception as e:
+                    debug_write("Turn fallback failed: {}".format(e))
+        if self._send(plan[0], plan[1], turn_number, True):
+            debug_write("Turn {} ran out of time, submitted the {}".format(turn_number, description))
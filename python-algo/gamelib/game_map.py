@@ -1,6 +1,8 @@
 import math
+import copy
 from .unit import GameUnit
 from .util import debug_write
+from .log import logger
 
 class GameMap:
     """Holds data about the current game map and provides functions
@@ -76,7 +78,7 @@ class GameMap:
         return grid
 
     def _invalid_coordinates(self, location):
-        self.warn("{} is out of bounds.".format(str(location)))
+        self.warn("{} is out of bounds.", str(location))
 
     def in_arena_bounds(self, location):
         """Checks if the given location is inside the diamond shaped game board.
@@ -114,7 +116,7 @@ class GameMap:
 
         """
         if not quadrant_description in [self.TOP_LEFT, self.TOP_RIGHT, self.BOTTOM_LEFT, self.BOTTOM_RIGHT]:
-            self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
+            self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.", quadrant_description)
             return
 
         edges = self.get_edges()
@@ -164,7 +166,7 @@ class GameMap:
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
         if player_index < 0 or player_index > 1:
-            self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
+            self.warn("Player index {} is invalid. Player index should be 0 or 1.", player_index)
 
         x, y = location
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
@@ -173,6 +175,24 @@ class GameMap:
         else:
             self.__map[x][y] = [new_unit]
 
+    def add_units(self, unit_type, location, count, player_index=0):
+        """Add count GameUnits of the same type to the map at the given location.
+
+        The unit is built once, and the rest are shallow copies added to the location in one step. 
+        A structure replaces whatever is at the location, so only one is added. See add_unit.
+        """
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+        if player_index < 0 or player_index > 1:
+            self.warn("Player index {} is invalid. Player index should be 0 or 1.", player_index)
+
+        x, y = location
+        new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        if not new_unit.stationary:
+            self.__map[x][y].extend([new_unit] + [copy.copy(new_unit) for i in range(count - 1)])
+        else:
+            self.__map[x][y] = [new_unit]
+
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
 
@@ -200,7 +220,7 @@ class GameMap:
 
         """
         if radius < 0 or radius > self.ARENA_SIZE:
-            self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}".format(radius, self.ARENA_SIZE))
+            self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}", radius, self.ARENA_SIZE)
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
 
@@ -232,9 +252,10 @@ class GameMap:
 
         return math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
 
-    def warn(self, message):
+    def warn(self, message, *args):
         """
-        Used internally by game_map to print out default messaging
+        Used internally by game_map to print out default messaging. 
+        The message is only formatted with args if warnings are logged, see BufferedLogger in log.py
         """
         if(self.enable_warnings):
-            debug_write(message)
+            logger.warning(message, *args)
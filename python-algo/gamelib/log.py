@@ -0,0 +1,100 @@
+import sys
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class BufferedLogger:
+    """A leveled logger that holds messages in memory and writes them to the game's debug output once per turn
+
+    debug_write makes a system call for every message, which adds up when it is called in a loop.
+    Messages logged here are kept in a buffer that is written in one go when the turn is submitted,
+    after the engine already has our turn.
+
+    Messages are only formatted if their level is enabled, so pass the arguments separately:
+    logger.debug("All locations: {}", locations) costs almost nothing when DEBUG is off.
+
+    Each message template is logged at most repeat_limit times per turn. Repeats after that are
+    counted, and a single line saying how many were suppressed is written instead.
+
+    Attributes :
+        * level (int): Messages below this level are ignored. One of DEBUG, INFO, WARNING or ERROR.
+        * buffered (bool): If False, every message is written immediately like debug_write
+        * repeat_limit (int): The number of times a message template is logged per turn, unlimited if None
+        * max_buffered (int): The buffer is written early once it holds this many messages
+
+    """
+    def __init__(self, level=INFO, buffered=True, repeat_limit=5, max_buffered=1000, stream=None):
+        self.level = level
+        self.buffered = buffered
+        self.repeat_limit = repeat_limit
+        self.max_buffered = max_buffered
+        self._stream = stream
+        self._buffer = []
+        self._counts = {}
+
+    def is_enabled(self, level):
+        """Checks if messages at level would be logged, to skip expensive work done only for logging
+        """
+        return level >= self.level
+
+    def log(self, level, message, *args):
+        """Logs message.format(*args) if level is enabled
+
+        Args:
+            level: DEBUG, INFO, WARNING or ERROR
+            message: The message, or a format string if args are given
+            args: Arguments for message.format, only used if the level is enabled
+
+        """
+        if level < self.level:
+            return
+        if self.repeat_limit is not None:
+            count = self._counts.get(message, 0) + 1
+            self._counts[message] = count
+            if count > self.repeat_limit:
+                return
+        if args:
+            message = message.format(*args)
+        self._buffer.append("{}: {}".format(LEVEL_NAMES.get(level, level), message))
+        if not self.buffered or len(self._buffer) >= self.max_buffered:
+            self._write()
+
+    def debug(self, message, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message, *args):
+        self.log(ERROR, message, *args)
+
+    def flush(self):
+        """Writes every buffered message and resets the repeat counts for the next turn
+
+        Called by GameState.submit_turn, and when the algo stops.
+        """
+        if self.repeat_limit is not None:
+            for message, count in self._counts.items():
+                if count > self.repeat_limit:
+                    self._buffer.append("Suppressed {} more like: {}".format(count - self.repeat_limit, message))
+        self._counts = {}
+        self._write()
+
+    def _write(self):
+        if not self._buffer:
+            return
+        stream = sys.stderr if self._stream is None else self._stream
+        stream.write("\n".join(self._buffer) + "\n")
+        stream.flush()
+        self._buffer = []
+
+
+logger = BufferedLogger()
@@ -0,0 +1,152 @@
+import json
+import threading
+
+from .game_state import GameState
+from .util import debug_write
+
+STRUCTURE_INDICES = (0, 1, 2)
+REMOVE_INDEX = 6
+UPGRADE_INDEX = 7
+
+
+def board_signature(state):
+    """Summarizes the structures on the board of a parsed turn or action frame message
+
+    Two states with the same signature have the same structures, with the same owners and upgrades,
+    so anything computed from the structures of one is valid for the other. Structures pending
+    removal are left out, since they are gone by the time the next turn starts.
+
+    Args:
+        state: The game state message, parsed with json.loads
+
+    Returns:
+        A frozenset of (player_index, unit type index, x, y, upgraded) tuples
+
+    """
+    signature = set()
+    for player_index, units in enumerate((state["p1Units"], state["p2Units"])):
+        removing = _locations(units, REMOVE_INDEX)
+        upgraded = _locations(units, UPGRADE_INDEX)
+        for type_index in STRUCTURE_INDICES:
+            for unit in units[type_index]:
+                location = (int(unit[0]), int(unit[1]))
+                if location not in removing:
+                    signature.add((player_index, type_index, location[0], location[1], location in upgraded))
+    return frozenset(signature)
+
+
+def _locations(units, type_index):
+    if len(units) <= type_index:
+        return set()
+    return set((int(unit[0]), int(unit[1])) for unit in units[type_index])
+
+
+class Precomputer:
+    """Runs a computation on a background thread while the engine streams the action phase
+
+    Our process mostly waits on the engine during the action phase. A Precomputer is fed each
+    action frame as it arrives and runs compute(game_state) on the most recent one, skipping frames
+    that arrived while it was busy. The board at the end of the action phase is usually the board
+    of the next turn, so the last result is ready when on_turn starts.
+
+    A result is only handed out by take() if the board it was computed from has the same
+    board_signature as the turn that actually arrived. Otherwise it is thrown away.
+
+    Attributes :
+        * compute (function): Called as compute(game_state) on the background thread. Must not print to stdout.
+        * config (JSON): The game config, used to build each GameState
+        * computed (int): The number of frames compute was run on
+        * used (int): The number of results handed out by take
+        * discarded (int): The number of results thrown away because the board diverged
+
+    """
+    def __init__(self, compute, config):
+        """Starts the background thread, which sleeps until a frame is fed
+
+        Args:
+            compute: The function to run on each frame, called as compute(game_state)
+            config: The game config
+
+        """
+        self.compute = compute
+        self.config = config
+        self.computed = 0
+        self.used = 0
+        self.discarded = 0
+        self._condition = threading.Condition()
+        self._pending = None
+        self._busy = False
+        self._result = None
+        self._generation = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="precompute", daemon=True)
+        self._thread.start()
+
+    def feed(self, frame_string):
+        """Queues an action frame, replacing any frame that was not started yet
+        """
+        with self._condition:
+            self._pending = frame_string
+            self._condition.notify_all()
+
+    def take(self, state, timeout=0):
+        """Gets the result computed for the board of a new turn, and clears it
+
+        Args:
+            state: The turn message, parsed with json.loads
+            timeout: Seconds to wait for a computation that is still running or queued
+
+        Returns:
+            The result of compute, or None if nothing was computed for this board
+
+        """
+        signature = board_signature(state)
+        with self._condition:
+            if timeout > 0:
+                self._condition.wait_for(lambda: not self._busy and self._pending is None, timeout)
+            result = self._result
+            self._result = None
+            self._pending = None
+            # Anything still running was started from an older frame, so its result is dropped
+            self._generation += 1
+
+        if result is None:
+            return None
+        if result[0] != signature:
+            self.discarded += 1
+            return None
+        self.used += 1
+        return result[1]
+
+    def close(self):
+        """Stops the background thread after its current computation
+        """
+        with self._condition:
+            self._closed = True
+            self._pending = None
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closed or self._pending is not None)
+                if self._closed:
+                    return
+                frame_string = self._pending
+                self._pending = None
+                self._busy = True
+                generation = self._generation
+
+            result = None
+            try:
+                state = json.loads(frame_string)
+                result = (board_signature(state), self.compute(GameState(self.config, frame_string)))
+            except Exception as e:
+                debug_write("Precompute failed: {}".format(e))
+
+            with self._condition:
+                self._busy = False
+                if result is not None and generation == self._generation:
+                    self._result = result
+                    self.computed += 1
+                self._condition.notify_all()
@@ -0,0 +1,95 @@
+import cProfile
+import os
+import sys
+import time
+
+from .util import debug_write
+
+
+def default_folder():
+    """The replays folder the engine saves replays to, next to the folder of the running strategy (<algo folder>/../replays)
+    """
+    algo_folder = os.path.dirname(os.path.abspath(sys.argv[0]))
+    return os.path.join(algo_folder, "..", "replays")
+
+
+class TurnProfiler:
+    """Runs cProfile on a sample of turns and saves the slow ones as .pstats files
+
+    Profiling every turn slows every turn down, so only some turns are profiled:
+        * every Nth turn, if every is set. These are always saved.
+        * the turn after one that took longer than threshold seconds, if threshold is set.
+          Slow turns come in runs once the board fills up, so this catches most of them.
+          These are only saved if the profiled turn was slow too.
+
+    Files are named <prefix>-turn-<turn number>.pstats, and can be read with pstats or snakeviz.
+
+    Attributes :
+        * folder (str): Where the .pstats files are saved
+        * every (int): Profile every Nth turn, never if 0
+        * threshold (float): Seconds after which a turn counts as slow, never if None
+        * prefix (str): Start of every file name, the algo's folder name and the time the game started by default
+        * saved (list): The paths of the files saved so far
+
+    """
+    def __init__(self, folder=None, every=0, threshold=None, prefix=None):
+        """
+        Args:
+            folder: Where the .pstats files are saved. The replays folder if None.
+            every: Profile every Nth turn, never if 0
+            threshold: Seconds after which a turn counts as slow, never if None
+            prefix: Start of every file name
+
+        """
+        if prefix is None:
+            algo_name = os.path.basename(os.path.dirname(os.path.abspath(sys.argv[0])))
+            prefix = "{}-{}".format(algo_name, time.strftime("%d-%m-%Y-%H-%M-%S"))
+        self.folder = default_folder() if folder is None else folder
+        self.every = every
+        self.threshold = threshold
+        self.prefix = prefix
+        self.saved = []
+        self._after_slow = False
+
+    def _sampled(self, turn_number):
+        return self.every > 0 and turn_number % self.every == 0
+
+    def run(self, turn_number, function, *args):
+        """Calls function(*args), profiling it if this turn is sampled
+
+        Returns:
+            What function returned
+
+        """
+        sampled = self._sampled(turn_number)
+        profiler = None
+        if sampled or self._after_slow:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already running, such as when the whole algo is run under cProfile
+                profiler = None
+
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            slow = self.threshold is not None and elapsed > self.threshold
+            if profiler is not None:
+                profiler.disable()
+                if sampled or slow:
+                    self._save(profiler, turn_number, elapsed)
+            self._after_slow = slow
+
+    def _save(self, profiler, turn_number, elapsed):
+        path = os.path.join(self.folder, "{}-turn-{}.pstats".format(self.prefix, turn_number))
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            profiler.dump_stats(path)
+        except OSError as e:
+            debug_write("Could not save turn profile: {}".format(e))
+            return
+        self.saved.append(path)
+        debug_write("Saved profile of turn {} ({:.2f}s) to {}".format(turn_number, elapsed, path))
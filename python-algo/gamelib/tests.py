@@ -1,7 +1,35 @@
 import unittest
+import os
+import tempfile
 import json
+import io
+import sys
+import time
+import threading
 from .game_state import GameState
 from .unit import GameUnit
+from .threat_map import ThreatMap
+from .placement import PlacementOptimizer
+from .workers import WorkerPool
+from .board_buffer import BoardBuffer
+from .turn_budget import TurnBudget
+from .precompute import Precomputer
+from .instrumentation import TurnInstrumentation
+from .profiling import TurnProfiler
+from .log import BufferedLogger, DEBUG, WARNING
+from .build_plan import BuildPlan, SPAWN, UPGRADE
+from .layout import DefenseLayout
+from .knapsack import best_builds
+from .projection import get_projection
+from .attack_timing import get_attack_timing, estimate_units_lost
+from .command_reader import CommandReader, CONFIG, TURN, ACTION_FRAME, END, UNKNOWN
+
+def scale_candidate(config, snapshot, candidate):
+    return snapshot * candidate
+
+def read_structure(config, snapshot, candidate):
+    board = BoardBuffer.attach(snapshot)
+    return board.structure_at(candidate)
 
 class BasicTests(unittest.TestCase):
 
@@ -275,3 +303,322 @@ class BasicTests(unittest.TestCase):
         actual = game.project_future_MP(turns)
         self.assertAlmostEqual(actual, expected, 0, "Expected {} MP {} turns from now, got {}".format(expected, turns, actual))
 
+
+    def test_navigate_multiple_starts(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("FF", [13, 10], 0)
+        game.game_map.add_unit("FF", [14, 10], 0)
+        starts = [[0, 14], [13, 27], [20, 21]]
+        for start in starts:
+            target_edge = game.game_map.get_edge_locations(game.get_target_edge(start))
+            paths = game._shortest_path_finder.navigate_multiple_starts([start], target_edge, game)
+            self.assertEqual(game.find_path_to_edge(start), paths[tuple(start)], "Shared pathing disagrees with single start pathing")
+
+    def test_threat_map(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 12], 0)
+        threat_map = ThreatMap(game, 1)
+        self.assertEqual(5, threat_map.damage_at([13, 13]), "Turret in range should threaten enemy units")
+        self.assertEqual(0, threat_map.damage_at([13, 2]), "Turret out of range should not threaten enemy units")
+        self.assertEqual(0, ThreatMap(game, 0).damage_at([13, 13]), "Our turret should not threaten our own units")
+        self.assertEqual(10, threat_map.path_damage([[13, 13], [13, 14]]), "Path damage should sum the threat along the path")
+
+    def test_placement_optimizer(self):
+        game = self.make_turn_0_map()
+        optimizer = PlacementOptimizer(game)
+        build_list = optimizer.optimize(optimizer.default_candidates(["FF", "DF"]), sp_budget=6)
+        self.assertTrue(len(build_list) > 0, "Optimizer should place something on an empty board")
+        self.assertTrue(sum(game.type_cost(unit_type)[game.SP] for unit_type, _ in build_list) <= 6, "Optimizer went over budget")
+        for unit_type, location in build_list:
+            self.assertEqual(1, game.attempt_spawn(unit_type, location), "Build list entry could not be spawned")
+
+    def test_worker_pool(self):
+        pool = WorkerPool(scale_candidate, {}, processes=2)
+        try:
+            self.assertEqual([3, 6, 9], pool.evaluate(3, [1, 2, 3]), "Workers returned the wrong results")
+            self.assertEqual([], pool.evaluate(3, []), "No candidates should give no results")
+        finally:
+            pool.close()
+
+    def test_board_buffer(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 12], 0)
+        game.game_map.add_unit("FF", [14, 14], 1)
+        game.game_map.add_unit("PI", [13, 0], 0)
+        game.game_map.add_unit("PI", [13, 0], 0)
+        board = BoardBuffer()
+        pool = WorkerPool(read_structure, {}, processes=1)
+        try:
+            generation = board.write(game)
+            self.assertTrue(board.is_current(generation), "Snapshot should be current right after writing")
+            self.assertEqual((2, 0, 90.0, False, False), board.structure_at([13, 12]), "Wrong structure read back")
+            self.assertEqual(None, board.structure_at([13, 13]), "Empty location should have no structure")
+            self.assertEqual(2, board.mobile_count([13, 0], 3, 0), "Mobile units were not counted")
+            self.assertEqual([30.0, 25.0, 5.0, 0.0], board.get_stats(0), "Wrong stats read back")
+            self.assertEqual({(13, 12), (14, 14)}, board.blocked_locations(), "Wrong blocked locations")
+            self.assertEqual([(0, 1, 75.0, False, False), None], pool.evaluate(board.name, [[14, 14], [13, 13]]), "Workers read the wrong board")
+
+            board.write(game)
+            self.assertFalse(board.is_current(generation), "Snapshot should be stale after another write")
+        finally:
+            pool.close()
+            board.close()
+
+    def test_turn_budget(self):
+        game = self.make_turn_0_map()
+        output = io.StringIO()
+        stdout = sys.stdout
+        sys.stdout = output
+        budget = TurnBudget(0.2, 0.1, fallback=lambda: ([["FF", 0, 13]], []))
+        try:
+            budget.start(0)
+            self.assertTrue(0 < budget.remaining_time() <= 0.1, "Remaining time should count the hard margin")
+            game.attempt_spawn("FF", [13, 13])
+            budget.record_plan(game._build_stack, game._deploy_stack)
+            game.attempt_spawn("FF", [14, 13])
+            time.sleep(0.3)
+            self.assertTrue(budget.timed_out, "Watchdog should have submitted the turn")
+            game.submit_turn()
+
+            budget.start(1)
+            time.sleep(0.3)
+            budget.start(2)
+            game.submit_turn()
+            self.assertFalse(budget.timed_out, "Turn submitted in time should not time out")
+
+            # A watchdog that fires after its turn is over must not submit the next turn
+            budget.start(3, fallback=lambda: ([["FF", 1, 12]], []))
+            budget._expire(2, lambda: ([["FF", 27, 13]], []))
+            self.assertFalse(budget.submitted, "Watchdog of turn 2 should not submit turn 3")
+            time.sleep(0.3)
+            self.assertTrue(budget.timed_out, "Watchdog of turn 3 should have submitted it")
+        finally:
+            budget.stop()
+            sys.stdout = stdout
+        self.assertEqual(['[["FF", 13, 13]]', '[]', '[["FF", 0, 13]]', '[]', '[["FF", 13, 13], ["FF", 14, 13]]', '[]', '[["FF", 1, 12]]', '[]'],
+            output.getvalue().splitlines(), "Wrong turns sent to the engine")
+
+    def test_precomputer(self):
+        config = self.make_turn_0_map().config
+        frame = {"p2Units":[[[13,14,60.0,"2"]],[],[],[],[],[],[],[]],"turnInfo":[1,0,5],"p1Stats":[30.0,25.0,5.0,0],
+            "p1Units":[[[13,13,60.0,"1"]],[],[],[],[],[],[[13,13,60.0,"3"]],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{}}
+        precomputer = Precomputer(lambda game_state: game_state.contains_stationary_unit([13, 14]).player_index, config)
+        try:
+            # The wall pending removal at [13, 13] is gone by the next turn
+            next_turn = dict(frame, turnInfo=[0, 1, -1], p1Units=[[],[],[],[],[],[],[],[]])
+            precomputer.feed(json.dumps(frame))
+            self.assertEqual(1, precomputer.take(next_turn, 5), "Result should be used when the board matches")
+            self.assertEqual(None, precomputer.take(next_turn, 5), "Result should only be used once")
+
+            precomputer.feed(json.dumps(frame))
+            diverged = dict(next_turn, p2Units=[[[13,14,60.0,"2"]],[],[],[],[],[],[],[[13,14,60.0,"4"]]])
+            self.assertEqual(None, precomputer.take(diverged, 5), "Result should be discarded when the board diverged")
+            self.assertEqual((2, 1, 1), (precomputer.computed, precomputer.used, precomputer.discarded), "Wrong counts")
+        finally:
+            precomputer.close()
+
+    def test_command_reader(self):
+        frame = '{"turnInfo":[1,0,3]}\n'
+        messages = ['{"replaySave":1}\n', '{"turnInfo":[0,0,-1]}\n', frame, frame, frame, frame, '{"turnInfo":[2,0,9]}\n', 'hello\n']
+        reader = CommandReader(max_size=7, stream=io.StringIO("".join(messages)))
+        reader.start()
+        reader._thread.join(5)
+        self.assertEqual(2, reader.dropped, "Oldest frames should be dropped when the queue is full")
+        self.assertEqual((CONFIG, messages[0]), reader.get(), "Config should never be dropped")
+        self.assertEqual(TURN, reader.get()[0], "Turn should never be dropped")
+        self.assertEqual(ACTION_FRAME, reader.get()[0], "Wrong kind for an action frame")
+        self.assertEqual([frame], reader.drain_frames(), "Queued frames should be drained together")
+        self.assertEqual([], reader.drain_frames(), "Draining should stop at the next non frame message")
+        self.assertEqual(END, reader.get()[0], "Wrong kind for the end message")
+        self.assertEqual(UNKNOWN, reader.get()[0], "Wrong kind for an unexpected message")
+        with self.assertRaises(SystemExit):
+            reader.get()
+
+        # Events of dropped frames are kept in the next frame
+        breach = '{{"turnInfo":[1,0,{}],"events":{{"breach":[[[14,27],1.0,3,"{}",1]],"death":[]}}}}\n'
+        messages = ['{"turnInfo":[0,0,-1]}\n'] + [breach.format(i, i) for i in range(4)] + ['{"turnInfo":[0,1,-1]}\n']
+        reader = CommandReader(max_size=3, stream=io.StringIO("".join(messages)))
+        reader.start()
+        reader._thread.join(5)
+        self.assertEqual(3, reader.dropped, "Frames should be merged while the queue is full")
+        self.assertEqual(TURN, reader.get()[0], "Turn should never be dropped")
+        frames = reader.drain_frames()
+        self.assertEqual(1, len(frames), "Frames should have been merged into the last one")
+        merged = json.loads(frames[0])
+        self.assertEqual([1, 0, 3], merged["turnInfo"], "Merged frame should keep the state of the newest frame")
+        self.assertEqual(["0", "1", "2", "3"], [event[3] for event in merged["events"]["breach"]], "Breaches of merged frames were lost")
+        self.assertEqual([], merged["events"]["death"], "Wrong merged deaths")
+        self.assertEqual(TURN, reader.get()[0], "Wrong kind for the next turn")
+
+    def test_instrumentation(self):
+        game = self.make_turn_0_map()
+        path = os.path.join(tempfile.mkdtemp(), "turns.jsonl")
+        instrumentation = TurnInstrumentation(path)
+        instrumentation.install()
+        try:
+            game.find_path_to_edge([13, 0])
+            instrumentation.start_turn(5)
+            game = GameState(game.config, game.serialized_string)
+            game.attempt_spawn("FF", [[13, 13], [14, 13]])
+            game.can_spawn("FF", [15, 13])
+            ThreatMap(game, 1).locations_in_range([13, 13], 3.5)
+            threat_map = ThreatMap(game, 1)
+            threat_map.locations_in_range([13, 13], 3.5)
+            threat_map.locations_in_range([13, 13], 3.5)
+            background = threading.Thread(target=lambda: GameState(game.config, game.serialized_string).can_spawn("FF", [15, 13]))
+            background.start()
+            background.join()
+            instrumentation.end_turn()
+        finally:
+            instrumentation.close()
+        self.assertFalse(hasattr(GameState.can_spawn, "__wrapped__"), "Functions should be restored on close")
+
+        with open(path) as turns:
+            lines = [json.loads(line) for line in turns]
+        self.assertEqual(1, len(lines), "One line should be written per turn")
+        self.assertEqual(5, lines[0]["turn"], "Wrong turn number")
+        self.assertEqual(0, lines[0]["calls"]["find_path_to_edge"][0], "Calls outside a turn should not be counted")
+        self.assertEqual(1, lines[0]["calls"]["attempt_spawn"][0], "Wrong attempt_spawn count")
+        self.assertEqual(1, lines[0]["calls"]["can_spawn"][0], "Calls on other threads should not be counted")
+        self.assertEqual([1, 2], lines[0]["caches"]["locations_in_range"], "Wrong cache hits and misses")
+        self.assertEqual({"parse", "strategy", "submit"}, set(lines[0]["phases"]), "Wrong phases")
+
+    def test_turn_profiler(self):
+        folder = tempfile.mkdtemp()
+        profiler = TurnProfiler(folder, every=3, threshold=0.05, prefix="test")
+        for turn_number, seconds in enumerate([0, 0.1, 0.1, 0, 0, 0.1, 0]):
+            self.assertEqual(turn_number, profiler.run(turn_number, lambda: time.sleep(seconds) or turn_number), "Turn result should be returned")
+        # 0, 3 and 6 are sampled, 2 is profiled because 1 was slow and saved because it was slow too
+        self.assertEqual(["test-turn-{}.pstats".format(n) for n in [0, 2, 3, 6]], [os.path.basename(path) for path in profiler.saved], "Wrong turns saved")
+        self.assertEqual(sorted(os.path.basename(path) for path in profiler.saved), sorted(os.listdir(folder)), "Files were not written")
+
+    def test_buffered_logger(self):
+        output = io.StringIO()
+        logger = BufferedLogger(level=WARNING, repeat_limit=2, stream=output)
+        logger.debug("Never formatted {}", None)
+        logger.info("Below the level")
+        for location in [[0, 13], [1, 12], [2, 11]]:
+            logger.warning("Could not spawn at {}", location)
+        self.assertEqual("", output.getvalue(), "Messages should be buffered until flush")
+        self.assertFalse(logger.is_enabled(DEBUG), "DEBUG should be disabled")
+
+        logger.flush()
+        self.assertEqual(["WARNING: Could not spawn at [0, 13]", "WARNING: Could not spawn at [1, 12]", "Suppressed 1 more like: Could not spawn at {}"],
+            output.getvalue().splitlines(), "Wrong messages written")
+        logger.warning("Could not spawn at {}", [3, 10])
+        logger.flush()
+        self.assertEqual("WARNING: Could not spawn at [3, 10]", output.getvalue().splitlines()[-1], "Repeat counts should reset every turn")
+
+    def test_spawn_failures(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        self.assertEqual(5, game.attempt_spawn("PI", [13, 0], 1000), "Should spawn every affordable unit")
+        self.assertEqual(0, game.get_resource(game.MP), "MP should be spent")
+        self.assertEqual(5, len(game._deploy_stack), "Each unit should be on the deploy stack")
+        self.assertEqual(5, len(game.game_map[13, 0]), "Each unit should be on the map")
+        self.assertEqual(5, len(set(map(id, game.game_map[13, 0]))), "Each unit should be its own GameUnit")
+        self.assertEqual(1, game.attempt_spawn("FF", [13, 13], 2), "Only one structure fits at a location")
+        self.assertFalse(game.can_spawn("FF", [13, 20]), "Should not spawn in enemy territory")
+        self.assertFalse(game.can_spawn("PI", [13, 5]), "Should not spawn mobile units off the edge")
+        self.assertFalse(game.can_spawn("FF", [0, 0]), "Should not spawn outside the arena")
+        self.assertEqual({"not_affordable": 2, "blocked": 1, "enemy_territory": 1, "not_on_edge": 1, "invalid_location": 1}, game.get_spawn_failures(), "Wrong failure counts")
+
+    def test_build_plan(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [3, 12], 0)
+        plan = BuildPlan([(SPAWN, "DF", [13, 13]), (UPGRADE, None, [13, 13]), (UPGRADE, None, [3, 12]), (SPAWN, "FF", [13, 13])])
+        plan.spawn("FF", [[13, 20], [12, 13]]).spawn("PI", [13, 0], 6)
+
+        result = plan.dry_run(game)
+        self.assertEqual([["blocked"], ["enemy_territory"], ["not_affordable"]], [reasons for _, reasons in result.rejected], "Wrong rejections")
+        self.assertEqual([[13, 13], [13, 13], [3, 12], [12, 13]], [entry[2] for entry in result.accepted], "Wrong entries accepted")
+        self.assertEqual(25, game.get_resource(game.SP), "Dry run should not spend resources")
+        self.assertEqual([], game._build_stack, "Dry run should not build")
+
+        self.assertFalse(plan.commit(game, all_or_nothing=True).committed, "Incomplete plan should not commit when all_or_nothing")
+        result = plan.commit(game)
+        self.assertTrue(result.committed, "Plan should commit")
+        self.assertEqual([("DF", 13, 13), ("UP", 13, 13), ("UP", 3, 12), ("FF", 12, 13)], game._build_stack, "Wrong build stack")
+        self.assertEqual(result.remaining[0], game.get_resource(game.SP), "Committed cost should match the dry run")
+        self.assertTrue(game.contains_stationary_unit([13, 13]).upgraded, "Upgrade should be applied to the map")
+
+        checkpoint = game._checkpoint([[13, 13]])
+        game.attempt_spawn("PI", [13, 0])
+        game.game_map.remove_unit([13, 13])
+        game._rollback(checkpoint)
+        self.assertEqual(([], result.remaining[1]), (game._deploy_stack, game.get_resource(game.MP)), "Rollback should restore the stacks and resources")
+        self.assertTrue(game.contains_stationary_unit([13, 13]), "Rollback should restore the map")
+
+    def test_defense_layout(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("FF", [12, 13], 0)
+        game.game_map.add_unit("FF", [14, 13], 0)
+        layout = DefenseLayout([("DF", [13, 12], True), ("FF", [12, 13]), ("FF", [14, 13], True), ("FF", [15, 13]), ("FF", [16, 13])])
+        self.assertEqual(4, len(layout.missing(game)), "Built targets should not be missing")
+
+        # Turret 2 and its upgrade 4, then a wall upgrade and a wall at 1 each
+        layout.build(game, sp_budget=8.5)
+        self.assertEqual([("DF", 13, 12), ("UP", 13, 12), ("UP", 14, 13), ("FF", 15, 13)], game._build_stack, "Wrong structures built")
+        self.assertEqual([(("FF", (16, 13), False))], layout.missing(game), "Built targets should be done")
+
+        game.game_map.remove_unit([13, 12])
+        layout.record_deaths({"events": {"death": [[[13, 12], 2, "7", 1, False], [[12, 13], 0, "8", 2, False], [[20, 20], 0, "9", 1, False]]}})
+        self.assertEqual(["DF", "FF"], [target[0] for target in layout.missing(game)], "Destroyed target should be missing again")
+
+    def test_best_builds(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [3, 12], 0)
+        items = [(5, UPGRADE, "DF", [3, 12]), (3, SPAWN, "FF", [5, 13]), (3, SPAWN, "FF", [6, 13]), (4, SPAWN, "DF", [7, 12]), (1, SPAWN, "FF", [8, 13])]
+        plan, value = best_builds(game, items, sp_budget=4.5)
+        # Greedy by value would take the upgrade and be left with 0.5 SP
+        self.assertEqual(10, value, "Wrong best value")
+        self.assertEqual([(SPAWN, "FF", [5, 13], 1), (SPAWN, "FF", [6, 13], 1), (SPAWN, "DF", [7, 12], 1)], plan.entries, "Wrong items chosen")
+
+        # 9 SP, keeping 4 so that with 5 more next turn there will be 9
+        plan, value = best_builds(game, items, sp_budget=9, next_turn_sp=9)
+        self.assertEqual(11, value, "SP should be kept for next turn")
+        plan, value = best_builds(game, [(6, UPGRADE, "DF", [9, 12])], sp_budget=6)
+        self.assertEqual([(SPAWN, "DF", [9, 12], 1), (UPGRADE, "DF", [9, 12], 1)], plan.entries, "Upgrading an empty location should build it first")
+
+        items = [(i % 7 + 1, SPAWN, "FF", [i % 28, 13]) for i in range(300)]
+        start = time.perf_counter()
+        best_builds(game, items, sp_budget=100)
+        self.assertLess(time.perf_counter() - start, 0.1, "Solver is too slow")
+
+    def test_resource_projection(self):
+        game = self.make_turn_0_map()
+        projection = get_projection(game.config)
+        self.assertIs(projection, get_projection(json.loads(json.dumps(game.config))), "Projection should be shared by equal configs")
+        for turn_number, turns_ahead in [(0, 1), (3, 5), (8, 4), (95, 12)]:
+            game.turn_number = turn_number
+            self.assertAlmostEqual(game.project_future_MP(turns_ahead), projection.mp_after(turn_number, 5, turns_ahead), delta=0.3,
+                msg="MP should match project_future_MP up to rounding")
+        self.assertEqual(150, projection.mp_after(0, 1000, 1), "MP should be capped")
+
+        game.turn_number = 0
+        game.game_map.add_unit("DF", [13, 12], 0)
+        game.game_map.add_unit("FF", [14, 12], 0)
+        game.game_map[13, 12][0].pending_removal = True
+        game.game_map[13, 12][0].health = game.game_map[13, 12][0].max_health * 0.75
+        self.assertEqual([(1, 0.75 * 2 * 0.75)], projection.removal_refunds(game), "Wrong refund")
+        trajectory = projection.project(game, 0, 2, damage_per_turn=2)
+        self.assertEqual([25, 25 + 7 + 1.125, 25 + 14 + 1.125], [sp for sp, mp in trajectory], "Wrong SP trajectory")
+
+    def test_attack_timing(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [25, 15], 1)
+        self.assertEqual(2, estimate_units_lost(game, "PI", [13, 0]), "20 damage should destroy 2 scouts with 15 health")
+        self.assertEqual(2, estimate_units_lost(game, "SI", [13, 0]), "Slow units should take damage for longer")
+
+        timing = get_attack_timing(game.config)
+        self.assertIs(timing, get_attack_timing(json.loads(json.dumps(game.config))), "Timing should be shared by equal configs")
+        plan = timing.plan(game, "PI", 0)
+        self.assertTrue(plan.attack_now, "With no losses every turn should attack")
+        self.assertEqual(5 * 5, plan.damage, "Every scout should score")
+
+        plan = timing.plan(game, "PI", 3)
+        self.assertEqual(2, plan.wait, "Should save 2 turns before attacking")
+        self.assertEqual(11, plan.num, "5 MP decays and grows to 11.6 MP after 2 turns")
+        self.assertEqual([(2, 11), (4, 9)], plan.schedule, "Wrong schedule")
+        self.assertEqual(14, plan.damage, "Wrong expected damage")
+        self.assertIsNone(timing.plan(game, "PI", 20).wait, "No attack should be worth making")
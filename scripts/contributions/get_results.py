@@ -83,6 +83,7 @@ The only (currently) accepted parameters for -avg are:
 	- cores_spent
 	- bits_spent
 	- cores_on_board
+	- time
 
 You can include 1, 2, or all in your output. For example:
 >py scripts/contributions/get_results.py -avg health bits cores
@@ -100,6 +101,7 @@ If you install matplotlib you can graph the following for individual matches:
 	- cores_spent
 	- bits_spent
 	- cores_on_board
+	- time
 
 Simply do:
 >py scripts/contributions/get_results.py -g [PARAMETERS]
@@ -117,6 +119,40 @@ would show 2 graphs. The first would show health and the second would plot bits
 
 (I recommend just trying a bunch of combinations with ':' to get familiar with this).
 
+----------------------------------------------------------------------------------------
+-j: Jobs
+
+Replays are read in parallel, using one process per core by default. Each process reads whole
+replays and only sends back the per turn numbers this program keeps, so reading many replays
+with -a gets faster with every core you have.
+You can choose the number of processes with:
+>py scripts/contributions/get_results.py -a -j 4
+
+Use -j 1 to read everything in this process, one replay at a time.
+
+----------------------------------------------------------------------------------------
+-nc: No cache
+
+The first time a finished replay is read it is converted to a [REPLAY_FILE].replay.cache file
+next to it, and that is read instead from then on, which is much faster (see replay_cache.py).
+The cache is rebuilt automatically if the replay changes. To ignore the cache files, run:
+>py scripts/contributions/get_results.py -nc
+
+----------------------------------------------------------------------------------------
+-db: Results database
+
+You can keep the results of every replay you read in a SQLite database (see results_db.py):
+>py scripts/contributions/get_results.py -a -db
+
+Replays already in the database are not read again, only new ones are, so running this after every
+few games stays fast however many replays you have. The database is replays/results.db unless you
+give another path:
+>py scripts/contributions/get_results.py -a -db my_results.db
+
+With -db, wins, -avg and -g are answered by SQL queries on the database instead of rebuilding every
+turn in python. Matches are counted by the contents of their replay, so the same replay given twice
+under different names counts once.
+
 ----------------------------------------------------------------------------------------
 
 All of the commands above can be combined in any order. For example, if I wanted to run the
@@ -175,15 +211,23 @@ try:
 	import glob
 	import math
 	import argparse
+	import multiprocessing as mp
 except ImportError as e:
 	sys.stderr.write("WARNING: Module not found, full error:\n\n")
 	sys.stderr.write(e)
 
+import replay_cache		# in the same folder as this file, converts replays to a faster format (see replay_cache.py)
+import replay_stream	# in the same folder as this file, reads replays one frame at a time (see replay_stream.py)
+import results_db		# in the same folder as this file, stores the results of replays already read (see results_db.py)
+
 try:
 	import matplotlib.pyplot as plt
 	plt_installed = True
 except ImportError:
 	try:
+		# worker processes (see FileHandler.load_files) import this file again and must not ask
+		if __name__ != '__main__':
+			raise ImportError('matplotlib not found')
 		usr_in = input('Matplotlib not found.\nWould you like this program to try and install matplotlib? (y/n) ')
 		if usr_in.lower() == 'y' or usr_in.lower() == 'yes':
 			import subprocess
@@ -220,7 +264,7 @@ def parse_args():
 		"-avg", "--averages",
 		nargs="*",
 		default=[],
-		help="data you would like the average of (not very useful right now)\nValid Options:\n\t- health\n\t- bits\n\t- cores\n\t- cores_spent\n\t- bits_spent\n\t- cores_on_board\n\n")
+		help="data you would like the average of (not very useful right now)\nValid Options:\n\t- health\n\t- bits\n\t- cores\n\t- cores_spent\n\t- bits_spent\n\t- cores_on_board\n\t- time\n\n")
 	ap.add_argument(
 		"-f", "--file",
 		nargs="*",
@@ -230,7 +274,22 @@ def parse_args():
 		"-g", "--graph",
 		nargs="*",
 		default=[],
-		help="specify what data you would like to be graphed - you must have matplotlib installed\n\nValid Options For Single Game:\n\t- health\n\t- bits\n\t- cores\n\t- cores_spent\n\t- bits_spent\n\t- cores_on_board\n\nValid Options For Multiple Games:\n\t- wins\n\n")
+		help="specify what data you would like to be graphed - you must have matplotlib installed\n\nValid Options For Single Game:\n\t- health\n\t- bits\n\t- cores\n\t- cores_spent\n\t- bits_spent\n\t- cores_on_board\n\t- time\n\nValid Options For Multiple Games:\n\t- wins\n\n")
+	ap.add_argument(
+		"-j", "--jobs",
+		type=int,
+		default=os.cpu_count() or 1,
+		help="number of processes used to read replays (default is the number of cores)\n\n")
+	ap.add_argument(
+		"-nc", "--no_cache",
+		action='store_true',
+		help="read the replay files directly instead of their .cache files, and do not create any\n\n")
+	ap.add_argument(
+		"-db", "--database",
+		nargs="?",
+		const=results_db.DEFAULT_PATH,
+		default=None,
+		help="keep the results of every replay read in a SQLite database, and only read replays that are not in it yet (default is replays/results.db)\n\n")
 	return vars(ap.parse_args())
 
 
@@ -239,7 +298,7 @@ class Graph:
 	pos = (0,0)
 	empty_plots = []
 
-	verbose_options = ['health', 'bits', 'cores', 'cores_spent', 'bits_spent', 'cores_on_board']
+	verbose_options = ['health', 'bits', 'cores', 'cores_spent', 'bits_spent', 'cores_on_board', 'time']
 	summary_options = ['wins']
 
 	@staticmethod
@@ -333,6 +392,8 @@ class Algo:
 		self.wins = 0
 		self.cores_on_board = {}
 		self.replays = {} 	# this effectively holds all raw json information
+		self.db = None		# the ResultsDB per turn data is read from, if the replays came from one
+		self.matches = {}	# replay -> (match id, player) in self.db
 
 	# NOTE: eq will return true when comparing to strings of the same name - this is intentional to be able to use: str in listOfAlgos syntax.
 	def __eq__(self, other):
@@ -346,14 +407,22 @@ class Algo:
 	def __repr__(self):
 		return self.__string()
 
+	# the average of a per turn value over every turn of every replay of this algo
 	def get_average(self, arg, replay):
+		if self.db is not None:
+			avg = self.db.average(self.name, arg, [match_id for match_id, player in self.matches.values()])
+			if avg is None:
+				sys.stderr.write("Error: Dividing by zero")
+				return -1
+			return avg
+
 		avg = 0.0
 		div = 0.0
 
 		for replay in self.replays:
-			div += len(self.replays[replay])
 			for turn in self.replays[replay]:
 				if turn == 'endStats': continue
+				div += 1
 				avg += float(self.replays[replay][turn][arg])
 
 		try:
@@ -391,6 +460,12 @@ class Algo:
 	def add_end_stats(self, replay, endStats):
 		self.replays[replay]['endStats'] = endStats;
 
+	# drops every turn but the last one, which is all recored_final_data needs
+	def forget_turns(self, replay):
+		turns = [turn for turn in self.replays[replay] if turn != 'endStats']
+		for turn in turns[:-1]:
+			del self.replays[replay][turn]
+
 	def print_block(self, header, data):
 		hLen = 7
 
@@ -426,6 +501,12 @@ class Algo:
 				self.print_end_stats(replay)
 		sys.stderr.write('\n')
 
+	# a per turn value for every turn of a replay, in turn order
+	def get_series(self, arg, replay):
+		if replay in self.matches:
+			return self.db.series(*self.matches[replay], arg)
+		return [self.replays[replay][turn][arg] for turn in self.replays[replay] if turn != 'endStats']
+
 	def add_plot(self, options, replay, xlabel='Turn #', y_label='Value'):
 		disp = False
 		for lbl in options:
@@ -433,8 +514,7 @@ class Algo:
 				Graph.advance()
 			else:
 				disp = True
-				data = [self.replays[replay][turn][lbl] for turn in self.replays[replay] if turn != 'endStats']
-				Graph.add_to_plot(data, '{}\'s {}'.format(self, lbl), xlabel, y_label)
+				Graph.add_to_plot(self.get_series(lbl, replay), '{}\'s {}'.format(self, lbl), xlabel, y_label)
 		Graph.reset_pos()
 
 		return disp
@@ -442,11 +522,20 @@ class Algo:
 
 # Stores data from a single replay and creates the Algo classes
 class Replay:
-	def __init__(self, f_name, algos):
+	def __init__(self, f_name, algos, use_cache=True, summary=None, keep_turns=True, quiet=False):
 		self.fname = f_name;
 		self.ref = None
-		self.turns = {}
 		self.valid_turns = []
+		self.error = None				# why the replay could not be read, None if it was read
+		self.quiet = quiet				# if True, the error is only kept in self.error instead of printed
+		self.columns = None				# the replay as columns (see replay_cache.py), None if it is streamed instead
+		self.use_cache = use_cache		# whether to read and write the .cache file of the replay
+		self.keep_turns = keep_turns	# if False, the algos only keep the last turn of this replay (enough to count wins)
+
+		# a summary means the replay was already read by a worker process (see summarize_replay)
+		if summary is not None:
+			self.unpack_summary(algos, summary)
+			return
 
 		self.load_data()				# handles loading all the data from file into python variables
 		self.unpack_data(algos)		# stores relevant data after it has been loaded
@@ -460,27 +549,16 @@ class Replay:
 	def __repr__(self):
 		return self.__string()
 
+	# frames are not kept in memory, get_frames reads them from the columns or streams them from the file
 	def load_data(self):
-		with open(self.fname) as f:
-			for line in f:
-				line = line.replace("\n", "")
-				line = line.replace("\t", "")
-
-				if (line != ''):
-					data = json.loads(line)
-
-					try:
-						data['debug']
-						self.ref = data
-					except:
-						turn_num = data['turnInfo'][1]
-						frame_num = data['turnInfo'][2]
-						self.turns[(turn_num, frame_num)] = data
-						if (turn_num, frame_num) not in self.valid_turns:
-							self.valid_turns.append((turn_num, frame_num))
+		self.columns = replay_cache.open_replay(self.fname, self.use_cache)
+		if self.columns is not None:
+			self.ref = self.columns.config
+		else:
+			self.ref = replay_stream.read_config(self.fname)
 
 	def get_cores_on_board(self, filters, encryptors, destructors):
-		return len(filters) + len(encryptors) * 4 + len(destructors) * 3
+		return filters + encryptors * 4 + destructors * 3
 
 	def get_bits_spent(self, algo, spawn):
 		p_index = 1 if algo == self.algo1 else 2
@@ -501,7 +579,7 @@ class Replay:
 		algo.add_data(self.fname, t, 'cores', stats[1])
 		algo.add_data(self.fname, t, 'bits', stats[2])
 
-		filters, encryptors, destructors, pings, emps, scramblers, removes = units
+		filters, encryptors, destructors = units[:3]
 
 		algo.add_data(self.fname, t, 'cores_on_board', self.get_cores_on_board(filters, encryptors, destructors))
 
@@ -509,38 +587,64 @@ class Replay:
 			algo.add_data(self.fname, t, 'cores_spent', self.get_cores_spent(algo, spawn), True)
 			algo.add_data(self.fname, t, 'bits_spent', self.get_bits_spent(algo, spawn), True)
 
+		if len(stats) > 3:
+			algo.add_data(self.fname, t, 'time', stats[3])
+
 	def unpack_data(self, algos):
 		try:
 			self.algo1, self.algo2 = self.create_algos(algos)
 
-			for t, f in self.get_valid_turns():
-				turn = self.get_turn(t, f)
+			seen = set()
+			for t, f, p1_stats, p2_stats, p1_units, p2_units, spawn in self.get_frames():
+				if (t, f) not in seen:
+					seen.add((t, f))
+					self.valid_turns.append((t, f))
 
-				turn_info = turn['turnInfo']
-				events = turn['events']
-				spawn = events['spawn']
+				self.add_data_to_algo(self.algo1, t, f, p1_stats, p1_units, spawn)
+				self.add_data_to_algo(self.algo2, t, f, p2_stats, p2_units, spawn)
 
-				p1_stats = turn['p1Stats']
-				p1_units = turn['p1Units']
+			self.algo1.recored_final_data(self.fname, self.algo2)
+			self.algo2.recored_final_data(self.fname, self.algo1)
+			end_stats = self.get_end_stats()
+			self.algo1.add_end_stats(self.fname, end_stats['player1'])
+			self.algo2.add_end_stats(self.fname, end_stats['player2'])
 
-				p2_stats = turn['p2Stats']
-				p2_units = turn['p2Units']
+			if not self.keep_turns:
+				self.algo1.forget_turns(self.fname)
+				self.algo2.forget_turns(self.fname)
+		except Exception as e:
+			self.error = e
+			if not self.quiet:
+				sys.stderr.write(str(e))
 
-				self.add_data_to_algo(self.algo1, t, f, p1_stats, p1_units, spawn)
-				self.add_data_to_algo(self.algo2, t, f, p2_stats, p2_units, spawn)
+		# everything needed is in the algos now, so the columns can be freed
+		self.columns = None
+
+	# adds the data a worker process collected for each algo, then records the winner
+	def unpack_summary(self, algos, summary):
+		try:
+			(p1_algo, p1_data), (p2_algo, p2_data) = summary
+			self.algo1, self.algo2 = self.create_algos(algos, p1_algo, p2_algo)
+
+			# endStats is added last, like unpack_data, since recored_final_data reads the last turn
+			p1_end_stats = p1_data.pop('endStats')
+			p2_end_stats = p2_data.pop('endStats', p1_end_stats)
+			self.algo1.replays[self.fname] = p1_data
+			self.algo2.replays[self.fname] = p2_data
 
 			self.algo1.recored_final_data(self.fname, self.algo2)
 			self.algo2.recored_final_data(self.fname, self.algo1)
-			self.algo1.add_end_stats(self.fname, self.turns[self.valid_turns[-1]]['endStats']['player1'])
-			self.algo2.add_end_stats(self.fname, self.turns[self.valid_turns[-1]]['endStats']['player2'])
+			self.algo1.add_end_stats(self.fname, p1_end_stats)
+			self.algo2.add_end_stats(self.fname, p2_end_stats)
 		except Exception as e:
 			sys.stderr.write(str(e))
 
 	# only creates a new algo class if that algo does not already exist. Otherwise data is added to the existing one
-	def create_algos(self, algos):
-		end_stats = self.turns[self.valid_turns[-1]]['endStats']
-		p1_algo = end_stats['player1']['name']
-		p2_algo = end_stats['player2']['name']
+	def create_algos(self, algos, p1_algo=None, p2_algo=None):
+		if p1_algo is None:
+			end_stats = self.get_end_stats()
+			p1_algo = end_stats['player1']['name']
+			p2_algo = end_stats['player2']['name']
 
 		if p1_algo not in algos:
 			algo1 = Algo(p1_algo)
@@ -561,16 +665,72 @@ class Replay:
 
 	def get_valid_turns(self):
 		return self.valid_turns
-	def get_turns(self):
-		return self.turns
+	# reads a single frame from the file (slow, frames are not kept in memory)
 	def get_turn(self, turn, frame=-1):
-		return self.turns[(turn, frame)]
+		if self.columns is not None:
+			return self.columns.get(turn, frame)
+		found = None
+		for t, f, data in replay_stream.read_frames(self.fname):
+			if (t, f) == (turn, frame):
+				found = data
+		if found is None:
+			raise KeyError((turn, frame))
+		return found
+
+	# the endStats of the game, from the last frame
+	def get_end_stats(self):
+		if self.columns is not None:
+			return self.columns.extra(len(self.columns) - 1)['endStats']
+		return replay_stream.read_last_frame(self.fname)['endStats']
+
+	# yields the turn, frame, stats, the number of units in each unit list and the spawn events of every frame for both players
+	# only one frame is decoded at a time, and when the replay is stored as columns the full frame is never built
+	def get_frames(self):
+		if self.columns is not None:
+			columns = self.columns
+			for (t, f), i in columns.index.items():
+				spawn = columns.events('spawn', i) if f == 0 else []
+				yield t, f, columns.stats(1, i), columns.stats(2, i), columns.unit_counts(1, i), columns.unit_counts(2, i), spawn
+			return
+
+		for t, f, data in replay_stream.read_frames(self.fname, ['p1Stats', 'p2Stats', 'p1Units', 'p2Units', 'events.spawn']):
+			p1_units = [len(unit_list) for unit_list in data['p1Units']]
+			p2_units = [len(unit_list) for unit_list in data['p2Units']]
+			yield t, f, data['p1Stats'], data['p2Stats'], p1_units, p2_units, data['events.spawn']
+
+# runs in a worker process: reads a replay and returns only the per turn data the Algo class keeps for it
+def summarize_replay(job):
+	f_name, use_cache, keep_turns = job
+	replay = Replay(f_name, [], use_cache, keep_turns=keep_turns, quiet=True)
+	try:
+		return f_name, [(algo.name, algo.replays[f_name]) for algo in replay.get_algos()], None
+	except (AttributeError, KeyError) as e:
+		return f_name, [], repr(replay.error if replay.error is not None else e)		# the replay could not be read
+
+# prints why a replay is left out of the results
+def skip_replay(f_name, error):
+	sys.stderr.write('\nSkipping {}, it could not be read: {}\n'.format(f_name, error))
+
+# prints how many replays have been read so far
+def show_progress(done, total):
+	if total > 1:
+		sys.stderr.write('\rReading replays: {}/{}'.format(done, total))
+		if done == total:
+			sys.stderr.write('\n')
+		sys.stderr.flush()
 
 # handles opening multiple games (replays)
 class FileHandler:
 	def __init__(self):
 		self.replays = []
 		self.algos = []
+		self.match_ids = None		# the matches in the ResultsDB that were asked for, if the replays came from one
+
+	# the number of matches read, the same replay under two names counts once in a ResultsDB
+	def num_matches(self):
+		if self.match_ids is not None:
+			return len(set(self.match_ids))
+		return len(self.replays)
 
 	def get_algo_win_summary(self):
 		fill_len = len(max(self.algos, key=lambda e:len(e.name)).name) + 9
@@ -600,16 +760,76 @@ class FileHandler:
 			return files
 		return files[:num]
 
-	def load_files(self, num=1, a=False, f_names=[]):
+	# keep_turns=False keeps only what is needed to count wins, so memory does not grow with the number of replays
+	# with a ResultsDB, replays already in it are not read at all (see load_from_db)
+	def load_files(self, num=1, a=False, f_names=[], use_cache=True, workers=1, keep_turns=True, db=None):
 		if len(f_names) > 0:
-			for f_name in f_names:
-				if f_name.find('replays') == -1:
-					self.replays.append(Replay('replays/'+f_name, self.algos))
-				else:
-					self.replays.append(Replay(f_name, self.algos))
+			f_names = [f_name if f_name.find('replays') != -1 else 'replays/'+f_name for f_name in f_names]
+		else:
+			f_names = self.__latest_replays(num, a)
+
+		if db is not None:
+			self.load_from_db(f_names, use_cache, workers, keep_turns, db)
+		elif workers > 1 and len(f_names) > 1:
+			for f_name, summary, error in self.read_summaries(f_names, use_cache, workers, keep_turns):
+				if error is not None:
+					skip_replay(f_name, error)
+					continue
+				self.replays.append(Replay(f_name, self.algos, use_cache, summary))
 		else:
-			for f_name in self.__latest_replays(num, a):
-				self.replays.append(Replay(f_name, self.algos))
+			for i, f_name in enumerate(f_names):
+				self.replays.append(Replay(f_name, self.algos, use_cache, keep_turns=keep_turns))
+				show_progress(i+1, len(f_names))
+
+	# yields (f_name, summary, error) for every replay, see summarize_replay
+	# with more than one worker, replays are read in other processes and only their summaries are sent back
+	# imap keeps the order of f_names, so the results are the same as reading them one at a time
+	def read_summaries(self, f_names, use_cache=True, workers=1, keep_turns=True):
+		jobs = [(f_name, use_cache, keep_turns) for f_name in f_names]
+		if workers > 1 and len(f_names) > 1:
+			with mp.Pool(min(workers, len(f_names))) as pool:
+				for i, result in enumerate(pool.imap(summarize_replay, jobs)):
+					yield result
+					show_progress(i+1, len(f_names))
+		else:
+			for i, job in enumerate(jobs):
+				yield summarize_replay(job)
+				show_progress(i+1, len(f_names))
+
+	# adds the replays that are not in the database yet (with every turn), then counts wins with SQL
+	# replays that could not be read are recorded too, so they are skipped until the file changes
+	# if keep_turns (the replays are shown one at a time), a Replay is made from the last turn and endStats of each,
+	# and its algos read averages and graphs from the database (see Algo.get_average and Algo.get_series)
+	def load_from_db(self, f_names, use_cache, workers, keep_turns, db):
+		match_ids = {f_name: db.find(f_name) for f_name in f_names}
+		new_replays = [f_name for f_name in f_names if match_ids[f_name] is None]
+
+		for f_name, summary, error in self.read_summaries(new_replays, use_cache, workers):
+			if error is None:
+				match_ids[f_name] = db.add(f_name, summary)
+			else:
+				match_ids[f_name] = db.add_error(f_name, error)
+
+		self.match_ids = []
+		for f_name in f_names:
+			match_id = match_ids[f_name]
+			error = db.error(match_id)
+			if error is not None:
+				skip_replay(f_name, error)
+				continue
+			self.match_ids.append(match_id)
+
+			if keep_turns:
+				replay = Replay(f_name, self.algos, use_cache, db.summary(match_id, False))
+				for player, algo in enumerate(replay.get_algos(), 1):
+					algo.db = db
+					algo.matches[f_name] = (match_id, player)
+				self.replays.append(replay)
+
+		for name, wins, played in db.wins(self.match_ids):
+			if name not in self.algos:
+				self.algos.append(Algo(name))
+			self.algos[self.algos.index(name)].wins = wins
 
 	def add_plot(self, lbl):
 		if lbl == 'wins':
@@ -662,7 +882,7 @@ def run_every_replay_verbose(fh, graphing_enabled, options):
 # displayed aggregate data over many matches and replay files
 def run_every_replay_agg(fh, graphing_enabled, options):
 	sys.stderr.write('{:->75}\n'.format(''))
-	sys.stderr.write('Summary of {} matches:\n'.format(len(fh.get_replays())))
+	sys.stderr.write('Summary of {} matches:\n'.format(fh.num_matches()))
 	sys.stderr.write('{:->75}\n'.format(''))
 	sys.stderr.write(fh.get_algo_win_summary())
 
@@ -710,8 +930,13 @@ def get_graph_options(options):
 def main(args):
 	verbose_options, summary_options = get_graph_options(args['graph'])
 
+	# per turn data is only shown for individual replays, a summary only needs to count wins
+	show_each = args['verbose'] or (not args['all'] and int(args['num']) == 1)
+
+	db = results_db.ResultsDB(args['database']) if args['database'] else None
+
 	fh = FileHandler()
-	fh.load_files(int(args['num']), args['all'], args['file']) #loads the files - all JSON reading is here
+	fh.load_files(int(args['num']), args['all'], args['file'], not args['no_cache'], args['jobs'], show_each, db) #loads the files - all JSON reading is here
 
 	# check to see if matplotlib is installed
 	graphing_enabled = True if len(verbose_options) > 0 or len(summary_options) > 0 else False
@@ -737,6 +962,9 @@ def main(args):
 		run_every_replay_verbose(fh, graphing_enabled, options) if args['verbose'] else ''
 		run_every_replay_agg(fh, graphing_enabled, options['graph_summary'])
 
+	if db is not None:
+		db.close()
+
 	sys.stderr.write('\n\n')
 
 
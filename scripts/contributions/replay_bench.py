@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Short Description:
+This is a python script to time how long algos take to play their turns, by replaying the turns
+of saved games to them without the game engine.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the contributions/scripts directory
+
+Every .replay file starts with the config the engine sent to both algos (the line with 'debug'),
+followed by every frame of the game. The first frame of each turn is exactly the game state the
+engine sends as the turn message, except that player2 is sent everything flipped so it always
+plays from the bottom of the board. This script rebuilds those messages and plays them to an
+algo's AlgoStrategy in this process, timing each on_turn:
+
+	on_game_start is called with the config from the replay
+	on_turn is called with the first frame of every turn, and timed
+	on_action_frame is called with every action frame in between, as the engine would (not timed)
+
+Whatever the algo submits is thrown away, so every turn it sees is the one from the replay, not
+the one its own moves would have led to. The times are still realistic, since the boards are from
+real games, and the same replays can be used to compare every version of an algo.
+
+To time the default algos (python-algo, corner_attack, python-algo-attack-v1 and python-algo-v)
+over every replay in the replays folder, playing both sides of each game:
+>py scripts/contributions/replay_bench.py -a
+
+or specific algos (folders with an algo_strategy.py) over specific replays, as player1 only:
+>py scripts/contributions/replay_bench.py -s python-algo my-algo -p 1 -f [REPLAY_FILE].replay
+
+Algos without their own gamelib folder (such as python-algo-v) use the one in python-algo. Use -v to
+see what the algos print, it is hidden by default.
+
+To look at a single turn the way an algo sees it, load_game_state returns the gamelib.GameState:
+	game_state = load_game_state('replays/my.replay', turn=12, player=2)
+'''
+
+import os
+import sys
+import glob
+import json
+import math
+import argparse
+import importlib
+import contextlib
+import time
+
+import replay_stream	# in the same folder as this file, reads replays one frame at a time (see replay_stream.py)
+
+ROOT_DIR = os.path.realpath('{}/../../'.format(os.path.dirname(os.path.realpath(__file__))))
+DEFAULT_ALGOS = ['python-algo', 'corner_attack', 'python-algo-attack-v1', 'python-algo-v']
+DEFAULT_GAMELIB = 'python-algo'	# the algo folder whose gamelib is used by algos that do not have one
+
+ARENA_SIZE = 28
+TURN_START = 0			# turnInfo[0] of the first frame of a turn, the frame sent as the turn message
+ACTION_FRAME = 1		# turnInfo[0] of the frames of the action phase
+
+# the position of the owner in each kind of event (see json-docs.html)
+EVENT_OWNER = {'selfDestruct': 5, 'breach': 4, 'damage': 4, 'shield': 6, 'move': 5, 'spawn': 3, 'death': 3, 'attack': 6}
+
+
+# handles all the arguments
+def parse_args():
+	ap = argparse.ArgumentParser(add_help=False, formatter_class=argparse.RawTextHelpFormatter)
+	ap.add_argument('-h', '--help', action='help', help='show this help message and exit\n\n')
+	ap.add_argument(
+		"-a", "--all",
+		action='store_true',
+		help="plays every replay file in replay folder\n\n")
+	ap.add_argument(
+		"-f", "--file",
+		nargs="*",
+		default=[],
+		help="specify a replay file (or multiple) you'd like to play\n\n")
+	ap.add_argument(
+		"-s", "--strategies",
+		nargs="*",
+		default=DEFAULT_ALGOS,
+		help="the algo folders to time (default is {})\n\n".format(' '.join(DEFAULT_ALGOS)))
+	ap.add_argument(
+		"-p", "--player",
+		type=int,
+		choices=[1, 2],
+		help="only play the turns of player1 or player2 (default is both)\n\n")
+	ap.add_argument(
+		"-v", "--verbose",
+		action='store_true',
+		help="show what the algos print while they play\n\n")
+	return vars(ap.parse_args())
+
+
+# returns a location seen from the other side of the board
+def flip_location(location):
+	x, y = location[:2]
+	if x < 0 or y < 0:
+		return location					# not a location on the board, such as the deprecated field of move events
+	return [ARENA_SIZE - 1 - x, ARENA_SIZE - 1 - y] + list(location[2:])
+
+# returns a frame as player2 is sent it: the board turned around and the players swapped, so it plays from the bottom
+def flip_frame(frame):
+	flipped = dict(frame)
+	flipped['p1Stats'], flipped['p2Stats'] = frame['p2Stats'], frame['p1Stats']
+	flipped['p1Units'] = [[flip_location(unit) for unit in units] for units in frame['p2Units']]
+	flipped['p2Units'] = [[flip_location(unit) for unit in units] for units in frame['p1Units']]
+
+	events = {}
+	for name, event_list in frame.get('events', {}).items():
+		events[name] = []
+		for event in event_list:
+			event = list(event)
+			for i, field in enumerate(event):
+				if type(field) == list and len(field) > 0:
+					event[i] = [flip_location(location) for location in field] if type(field[0]) == list else flip_location(field)
+			owner = EVENT_OWNER.get(name)
+			if owner is not None and owner < len(event) and event[owner] in (1, 2):
+				event[owner] = 3 - event[owner]
+			events[name].append(event)
+	flipped['events'] = events
+	return flipped
+
+# yields (turn, kind, message) for every message the engine sends player during a replay, kind is TURN_START or ACTION_FRAME
+def engine_messages(fname, player=1):
+	for turn, frame, data in replay_stream.read_frames(fname):
+		kind = data['turnInfo'][0]
+		if kind not in (TURN_START, ACTION_FRAME):
+			continue						# the end of the game is not sent as a frame
+		if player == 2:
+			data = flip_frame(data)
+		yield turn, kind, json.dumps(data)
+
+# returns the turn message player was sent on a turn of a replay, None if the replay does not have that turn
+def turn_message(fname, turn, player=1):
+	for frame_turn, frame, data in replay_stream.read_frames(fname):
+		if frame_turn == turn and data['turnInfo'][0] == TURN_START:
+			return json.dumps(flip_frame(data) if player == 2 else data)
+	return None
+
+# imports the gamelib of an algo folder, or of python-algo if the folder does not have one
+def import_gamelib(algo_dir=None):
+	if algo_dir is None or not os.path.isdir(os.path.join(algo_dir, 'gamelib')):
+		algo_dir = os.path.join(ROOT_DIR, DEFAULT_GAMELIB)
+	forget_modules()
+	sys.path.insert(0, algo_dir)
+	try:
+		return importlib.import_module('gamelib')
+	finally:
+		sys.path.remove(algo_dir)
+
+# returns the gamelib.GameState player saw at the start of a turn of a replay, using the config the replay was played with
+def load_game_state(fname, turn, player=1, gamelib=None):
+	message = turn_message(fname, turn, player)
+	if message is None:
+		raise KeyError('{} has no turn {}'.format(fname, turn))
+	if gamelib is None:
+		gamelib = import_gamelib()
+	return gamelib.GameState(replay_stream.read_config(fname), message)
+
+
+# drops the gamelib and algo_strategy of the last algo imported, every algo folder has its own
+def forget_modules():
+	for name in list(sys.modules):
+		if name in ('gamelib', 'algo_strategy') or name.startswith('gamelib.'):
+			del sys.modules[name]
+
+# returns the AlgoStrategy class of an algo folder
+def load_strategy(algo_dir):
+	import_gamelib(algo_dir)				# algo_strategy's "import gamelib" finds the one just imported
+	sys.path.insert(0, algo_dir)
+	try:
+		return importlib.import_module('algo_strategy').AlgoStrategy
+	finally:
+		sys.path.remove(algo_dir)
+
+# hides everything the algo prints (unless verbose) and the turns it submits, which are written to stdout
+@contextlib.contextmanager
+def quiet(verbose):
+	with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null), contextlib.redirect_stderr(sys.stderr if verbose else null):
+		yield
+
+# plays one side of a replay to a new instance of strategy, returns {turn: seconds on_turn took}
+def play_replay(strategy, fname, player, config):
+	algo = strategy()
+	algo.on_game_start(config)
+	times = {}
+	for turn, kind, message in engine_messages(fname, player):
+		if kind == TURN_START:
+			start = time.perf_counter()
+			algo.on_turn(message)
+			times[turn] = time.perf_counter() - start
+		else:
+			algo.on_action_frames([message])
+	return times
+
+# returns the given fraction of the way through sorted values
+def percentile(values, fraction):
+	return values[min(len(values) - 1, int(math.ceil(fraction * len(values))) - 1)]
+
+# times every algo over every replay, returns {algo: [seconds of every turn]}
+def benchmark(algo_dirs, f_names, players=(1, 2), verbose=False):
+	configs = {f_name: replay_stream.read_config(f_name) for f_name in f_names}
+	results = {}
+	for algo_dir in algo_dirs:
+		algo = os.path.basename(os.path.normpath(algo_dir))
+		results[algo] = []
+		try:
+			with quiet(verbose):
+				strategy = load_strategy(algo_dir)
+		except Exception as e:
+			sys.stderr.write('\nCould not load {}: {}\n'.format(algo, e))
+			continue
+
+		for i, f_name in enumerate(f_names):
+			sys.stderr.write('\rTiming {}: {}/{}'.format(algo, i + 1, len(f_names)))
+			for player in players:
+				try:
+					with quiet(verbose):
+						times = play_replay(strategy, f_name, player, configs[f_name])
+				except Exception as e:
+					sys.stderr.write('\n{} failed on {} as player{}: {!r}\n'.format(algo, f_name, player, e))
+					continue
+				results[algo] += times.values()
+		sys.stderr.write('\n')
+	forget_modules()
+	return results
+
+def print_results(results):
+	fill_len = max([len(algo) for algo in results] + [0]) + 9
+	sys.stderr.write('\nMilliseconds per turn:\n|\n')
+	sys.stderr.write('|{: >{fill}} : {: >6} {: >9} {: >9} {: >9} {: >9}\n'.format('', 'turns', 'mean', 'median', '95th', 'max', fill=fill_len))
+	for algo, times in results.items():
+		if len(times) == 0:
+			sys.stderr.write('|{: >{fill}} : no turns played\n'.format(algo, fill=fill_len))
+			continue
+		times = sorted(t * 1000 for t in times)
+		sys.stderr.write('|{: >{fill}} : {: >6} {: >9.2f} {: >9.2f} {: >9.2f} {: >9.2f}\n'.format(
+			algo, len(times), sum(times) / len(times), percentile(times, .5), percentile(times, .95), times[-1], fill=fill_len))
+
+def main(args):
+	f_names = args['file']
+	if args['all']:
+		f_names = f_names + glob.glob('{}/replays/*.replay'.format(ROOT_DIR))
+	if len(f_names) == 0:
+		sys.stderr.write('No replays given, use -a or -f\n')
+		return
+
+	algo_dirs = [algo if os.path.isdir(algo) else os.path.join(ROOT_DIR, algo) for algo in args['strategies']]
+	players = (1, 2) if args['player'] is None else (args['player'],)
+	print_results(benchmark(algo_dirs, f_names, players, args['verbose']))
+
+
+if __name__ == '__main__':
+	args = parse_args() # get command line arguments
+	main(args)			# run program
@@ -0,0 +1,453 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Short Description:
+This is a helper for get_results.py and watch_replay.py that converts replay files into a
+compact columnar cache, so a replay is only parsed as JSON once.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the contributions/scripts directory
+
+A .replay file is one JSON document per line, and reading it means calling json.loads on every
+frame every time. The first time a finished replay is read by get_results.py or watch_replay.py
+it is converted into a sidecar file next to it ([REPLAY_FILE].replay.cache). Every time after,
+the sidecar is read instead, which is mostly a copy of raw bytes into python arrays.
+
+The sidecar stores every frame as columns:
+	- turnInfo, p1Stats and p2Stats as flat int/float arrays
+	- p1Units and p2Units as one table per player (x, y, health, id) with an offset per unit list
+	- every event type as one table per field, with an offset per frame (events the engine always
+	  sends empty, such as the deprecated melee, take no space at all)
+	- anything else (endStats, unknown keys) as JSON
+
+The sidecar remembers the size and modification time of its replay. If the replay changes, the
+sidecar is ignored and rebuilt. Replays that do not match the layout above are simply not cached,
+and the scripts read them the old way.
+
+You can also convert replays ahead of time:
+>py scripts/contributions/replay_cache.py [REPLAY_FILE].replay [REPLAY_FILE].replay
+
+or every replay in the replays folder:
+>py scripts/contributions/replay_cache.py -a
+
+Nothing is lost by deleting the sidecars, they are rebuilt when needed.
+'''
+
+import os
+import sys
+import json
+import glob
+import struct
+from array import array
+
+MAGIC = b'TRC3'
+EXTENSION = '.cache'
+
+# the fields of every event type in order, see json-docs.html
+#	loc:	[x, y]
+#	locs:	[[x, y], ...]
+#	float:	a float (damage, shield amount)
+#	int:	an int (unit type, player number)
+#	id:		a unique string identifier for a unit
+#	bool:	a boolean
+EVENT_FIELDS = {
+	'selfDestruct':	('loc', 'locs', 'float', 'int', 'id', 'int'),
+	'breach':		('loc', 'float', 'int', 'id', 'int'),
+	'damage':		('loc', 'float', 'int', 'id', 'int'),
+	'shield':		('loc', 'loc', 'float', 'int', 'id', 'id', 'int'),
+	'move':			('loc', 'loc', 'loc', 'int', 'id', 'int'),
+	'spawn':		('loc', 'int', 'id', 'int'),
+	'death':		('loc', 'int', 'id', 'int', 'bool'),
+	'attack':		('loc', 'loc', 'float', 'int', 'id', 'id', 'int'),
+}
+
+# the array typecode used to store each kind of value
+TYPECODES = {'offset': 'I', 'coord': 'h', 'float': 'd', 'int': 'i', 'bool': 'b'}
+
+# keys of a frame that are stored as columns, everything else goes into the 'extra' JSON column
+COLUMN_KEYS = ('turnInfo', 'p1Stats', 'p2Stats', 'p1Units', 'p2Units', 'events')
+
+
+# returns the path of the sidecar for a replay
+def cache_name(fname):
+	return fname + EXTENSION
+
+# returns the (size, mtime) a sidecar is keyed by
+def source_key(fname):
+	stat = os.stat(fname)
+	return stat.st_size, stat.st_mtime_ns
+
+
+# collects the columns of a replay one frame at a time
+class ColumnBuilder:
+	def __init__(self):
+		self.columns = {}				# column name -> array (or list of strings)
+		self.layout = None				# widths of turnInfo, stats and unit lists, taken from the first frame
+		self.config = None				# the config line at the top of the replay
+		self.event_kinds = []			# event types seen in the replay, in order
+		self.other_event_kinds = []		# event types without columns (not in EVENT_FIELDS), their events go into 'extra'
+		self.num_frames = 0
+
+	def column(self, name, kind):
+		if name not in self.columns:
+			self.columns[name] = [] if kind == 'id' else array(TYPECODES[kind])
+			if kind == 'offset':
+				self.columns[name].append(0)
+		return self.columns[name]
+
+	def add_line(self, line):
+		line = line.replace("\n", "").replace("\t", "")
+		if line == '':
+			return
+		data = json.loads(line)
+		if 'debug' in data:
+			self.config = data
+		else:
+			self.add_frame(data)
+
+	def add_frame(self, data):
+		if self.layout is None:
+			self.layout = {
+				'turn_info':	len(data['turnInfo']),
+				'stats':		len(data['p1Stats']),
+				'stats_int':	[type(value) == int for value in data['p1Stats']],
+				'unit_lists':	len(data['p1Units']),
+			}
+		layout = self.layout
+
+		# turnInfo and stats are fixed width, so they are stored flat with a stride
+		if len(data['turnInfo']) != layout['turn_info']:
+			raise ValueError('turnInfo changes length')
+		self.column('turn_info', 'int').extend(data['turnInfo'])
+		for player in ('p1', 'p2'):
+			if len(data[player + 'Stats']) != layout['stats']:
+				raise ValueError('stats change length')
+			self.column(player + '_stats', 'float').extend(data[player + 'Stats'])
+
+		# units are one table per player, with an offset after every unit list of every frame
+		for player in ('p1', 'p2'):
+			units = data[player + 'Units']
+			if len(units) != layout['unit_lists']:
+				raise ValueError('number of unit lists changes')
+			offsets = self.column(player + '_units.off', 'offset')
+			xs = self.column(player + '_units.x', 'coord')
+			ys = self.column(player + '_units.y', 'coord')
+			hps = self.column(player + '_units.hp', 'float')
+			ids = self.column(player + '_units.id', 'id')
+			for unit_list in units:
+				for x, y, hp, unit_id in unit_list:
+					xs.append(x)
+					ys.append(y)
+					hps.append(hp)
+					ids.append(str(unit_id))
+				offsets.append(len(xs))
+
+		# events are one table per field of each known event type, with an offset after every frame
+		extra_events = {}
+		for kind, events in data.get('events', {}).items():
+			if kind not in EVENT_FIELDS:
+				if kind not in self.other_event_kinds:
+					self.other_event_kinds.append(kind)
+				if len(events) > 0:
+					extra_events[kind] = events		# empty lists are rebuilt from other_event_kinds, so most frames have no extra
+				continue
+			if kind not in self.event_kinds:
+				self.add_event_kind(kind)
+			self.add_events(kind, events)
+		for kind in self.event_kinds:
+			if kind not in data.get('events', {}):
+				self.add_events(kind, [])
+
+		extra = {key: value for key, value in data.items() if key not in COLUMN_KEYS}
+		if extra_events:
+			extra['events'] = extra_events
+		self.column('extra', 'id').append(json.dumps(extra) if extra else '')
+		self.num_frames += 1
+
+	# a new event type appeared, give it an empty entry for every earlier frame
+	def add_event_kind(self, kind):
+		self.event_kinds.append(kind)
+		offsets = self.column('events.{}.off'.format(kind), 'offset')
+		offsets.extend([0] * self.num_frames)
+		for j, field in enumerate(EVENT_FIELDS[kind]):
+			name = 'events.{}.{}'.format(kind, j)
+			if field in ('loc', 'locs'):
+				self.column(name + '.x', 'coord')
+				self.column(name + '.y', 'coord')
+				if field == 'locs':
+					self.column(name + '.off', 'offset')
+			else:
+				self.column(name, field)
+
+	def add_events(self, kind, events):
+		fields = EVENT_FIELDS[kind]
+		prefix = 'events.{}'.format(kind)
+		for event in events:
+			if len(event) != len(fields):
+				raise ValueError('unexpected {} event {}'.format(kind, event))
+			for j, (field, value) in enumerate(zip(fields, event)):
+				name = '{}.{}'.format(prefix, j)
+				if field == 'loc':
+					self.column(name + '.x', 'coord').append(value[0])
+					self.column(name + '.y', 'coord').append(value[1])
+				elif field == 'locs':
+					xs = self.column(name + '.x', 'coord')
+					ys = self.column(name + '.y', 'coord')
+					for x, y in value:
+						xs.append(x)
+						ys.append(y)
+					self.column(name + '.off', 'offset').append(len(xs))
+				elif field == 'id':
+					self.column(name, 'id').append(str(value))
+				else:
+					self.column(name, field).append(value)
+		offsets = self.column(prefix + '.off', 'offset')
+		offsets.append(offsets[-1] + len(events))
+
+	def finish(self, fname):
+		if self.layout is None:
+			raise ValueError('no frames')
+		size, mtime = source_key(fname)
+		header = {
+			'source_size':	size,
+			'source_mtime':	mtime,
+			'frames':		self.num_frames,
+			'layout':		self.layout,
+			'config':		self.config,
+			'event_kinds':	self.event_kinds,
+			'other_event_kinds':	self.other_event_kinds,
+		}
+		return ReplayColumns(fname, header, self.columns)
+
+
+# a replay stored as columns, with accessors for the parts the scripts use
+class ReplayColumns:
+	def __init__(self, fname, header, columns):
+		self.fname = fname
+		self.header = header
+		self.columns = columns
+		self.layout = header['layout']
+		self.config = header['config']
+		self.num_frames = header['frames']
+		self.event_kinds = header['event_kinds']
+		self.other_event_kinds = header['other_event_kinds']
+		self._last_frame = (None, None)		# (index, frame dict) of the last frame built, see frame
+		self._event_columns = {}			# kind -> the columns of that event type, see event_columns
+		self.unit_columns = [[self.columns['p{}_units.{}'.format(player, name)] for name in ('off', 'x', 'y', 'hp', 'id')] for player in (1, 2)]
+
+		# index of the last frame with each (turn, frame), in the order they first appear (like the JSON loaders)
+		self.index = {}
+		width = self.layout['turn_info']
+		turn_info = self.columns['turn_info']
+		for i in range(self.num_frames):
+			self.index[(turn_info[i * width + 1], turn_info[i * width + 2])] = i
+
+	def __len__(self):
+		return self.num_frames
+
+	# all (turn, frame) pairs in order
+	def keys(self):
+		return list(self.index.keys())
+
+	def turn_info(self, i):
+		width = self.layout['turn_info']
+		return list(self.columns['turn_info'][i * width:(i + 1) * width])
+
+	# player is 1 or 2
+	def stats(self, player, i):
+		width = self.layout['stats']
+		stats = self.columns['p{}_stats'.format(player)][i * width:(i + 1) * width]
+		return [int(value) if is_int else value for value, is_int in zip(stats, self.layout['stats_int'])]
+
+	# a single stat (0 health, 1 cores, 2 bits, 3 time) for every frame, as an array
+	def stat_column(self, player, stat):
+		return self.columns['p{}_stats'.format(player)][stat::self.layout['stats']]
+
+	# the number of units in each unit list of a frame, without building the units
+	def unit_counts(self, player, i):
+		offsets = self.columns['p{}_units.off'.format(player)]
+		start = i * self.layout['unit_lists']
+		return [offsets[start + j + 1] - offsets[start + j] for j in range(self.layout['unit_lists'])]
+
+	# the unit lists of a frame, formatted like p1Units and p2Units
+	def units(self, player, i):
+		offsets, xs, ys, hps, ids = self.unit_columns[player - 1]
+		start = i * self.layout['unit_lists']
+		unit_lists = []
+		for j in range(self.layout['unit_lists']):
+			a, b = offsets[start + j], offsets[start + j + 1]
+			unit_lists.append([list(unit) for unit in zip(xs[a:b], ys[a:b], hps[a:b], ids[a:b])])
+		return unit_lists
+
+	# the events of one type in a frame, formatted like the replay
+	def events(self, kind, i):
+		if kind not in EVENT_FIELDS:
+			return self.extra(i).get('events', {}).get(kind, [])
+		if kind not in self.event_kinds:
+			return []
+		offsets, fields = self.event_columns(kind)
+		rows = range(offsets[i], offsets[i + 1])
+		if len(rows) == 0:
+			return []
+		events = [[] for k in rows]
+		for field, columns in fields:
+			if field == 'loc':
+				xs, ys = columns
+				for event, k in zip(events, rows):
+					event.append([xs[k], ys[k]])
+			elif field == 'locs':
+				xs, ys, locs_off = columns
+				for event, k in zip(events, rows):
+					event.append([[xs[n], ys[n]] for n in range(locs_off[k], locs_off[k + 1])])
+			elif field == 'bool':
+				for event, k in zip(events, rows):
+					event.append(bool(columns[k]))
+			else:
+				for event, k in zip(events, rows):
+					event.append(columns[k])
+		return events
+
+	# the offsets of an event type and (field, columns) for each of its fields, looked up once per type
+	def event_columns(self, kind):
+		if kind not in self._event_columns:
+			prefix = 'events.{}'.format(kind)
+			fields = []
+			for j, field in enumerate(EVENT_FIELDS[kind]):
+				name = '{}.{}'.format(prefix, j)
+				if field == 'loc':
+					fields.append((field, (self.columns[name + '.x'], self.columns[name + '.y'])))
+				elif field == 'locs':
+					fields.append((field, (self.columns[name + '.x'], self.columns[name + '.y'], self.columns[name + '.off'])))
+				else:
+					fields.append((field, self.columns[name]))
+			self._event_columns[kind] = (self.columns[prefix + '.off'], fields)
+		return self._event_columns[kind]
+
+	# keys of a frame that are not stored as columns, such as endStats
+	def extra(self, i):
+		extra = self.columns['extra'][i]
+		return json.loads(extra) if extra else {}
+
+	# rebuilds the full frame dict, like json.loads of the original line
+	# the last frame built is remembered, so asking for the same frame again is free (do not change it)
+	def frame(self, i):
+		if self._last_frame[0] == i:
+			return self._last_frame[1]
+		data = self.extra(i)
+		extra_events = data.pop('events', {})
+		data['turnInfo'] = self.turn_info(i)
+		data['p1Stats'] = self.stats(1, i)
+		data['p2Stats'] = self.stats(2, i)
+		data['p1Units'] = self.units(1, i)
+		data['p2Units'] = self.units(2, i)
+		data['events'] = {kind: self.events(kind, i) for kind in self.event_kinds}
+		data['events'].update((kind, extra_events.get(kind, [])) for kind in self.other_event_kinds)
+		self._last_frame = (i, data)
+		return data
+
+	# the frame dict for a (turn, frame) pair
+	def get(self, turn, frame):
+		return self.frame(self.index[(turn, frame)])
+
+	def save(self):
+		body = []
+		column_info = []
+		for name, values in self.columns.items():
+			if type(values) == list:
+				raw = '\n'.join(values).encode('utf-8')
+				column_info.append([name, 's', len(raw), len(values)])
+			else:
+				raw = values.tobytes()
+				column_info.append([name, values.typecode, len(raw), len(values)])
+			body.append(raw)
+
+		header = dict(self.header, columns=column_info, byteorder=sys.byteorder)
+		header = json.dumps(header).encode('utf-8')
+
+		# write to a temporary file first so a half written sidecar is never read
+		tmp_name = cache_name(self.fname) + '.tmp'
+		with open(tmp_name, 'wb') as f:
+			f.write(MAGIC)
+			f.write(struct.pack('<I', len(header)))
+			f.write(header)
+			for raw in body:
+				f.write(raw)
+		os.replace(tmp_name, cache_name(self.fname))
+
+
+# reads the sidecar of a replay, returns None if there is none or it is out of date
+def load(fname):
+	try:
+		with open(cache_name(fname), 'rb') as f:
+			raw = f.read()
+		if raw[:4] != MAGIC:
+			return None
+		header_len, = struct.unpack('<I', raw[4:8])
+		header = json.loads(raw[8:8 + header_len].decode('utf-8'))
+		if (header['source_size'], header['source_mtime']) != source_key(fname):
+			return None
+	except (OSError, ValueError, KeyError, struct.error):
+		return None
+
+	columns = {}
+	pos = 8 + header_len
+	for name, typecode, length, count in header.pop('columns'):
+		chunk = raw[pos:pos + length]
+		pos += length
+		if typecode == 's':
+			columns[name] = chunk.decode('utf-8').split('\n') if count > 0 else []
+		else:
+			values = array(typecode)
+			values.frombytes(chunk)
+			if header['byteorder'] != sys.byteorder:
+				values.byteswap()
+			columns[name] = values
+	return ReplayColumns(fname, header, columns)
+
+# parses a replay into columns, and saves the sidecar if the game is over
+# returns None if the replay cannot be stored as columns
+def convert(fname, write=True):
+	builder = ColumnBuilder()
+	try:
+		with open(fname) as f:
+			for line in f:
+				builder.add_line(line)
+		columns = builder.finish(fname)
+	except (ValueError, KeyError, TypeError):
+		return None
+
+	# a replay still being written by the engine would be out of date straight away
+	if write and 'endStats' in columns.extra(columns.num_frames - 1):
+		try:
+			columns.save()
+		except OSError:
+			pass
+	return columns
+
+# reads a replay as columns, from the sidecar if it is up to date
+def open_replay(fname, use_cache=True):
+	columns = load(fname) if use_cache else None
+	if columns is None:
+		columns = convert(fname, use_cache)
+	return columns
+
+
+def main(f_names):
+	if f_names == ['-a']:
+		replay_dir = '{}/../../replays/'.format(os.path.dirname(os.path.realpath(__file__)))
+		f_names = glob.glob('{}*.replay'.format(replay_dir))
+
+	for f_name in f_names:
+		if load(f_name) is not None:
+			sys.stderr.write('Up to date: {}\n'.format(f_name))
+		elif convert(f_name) is not None:
+			sys.stderr.write('Converted:  {}\n'.format(f_name))
+		else:
+			sys.stderr.write('Skipped:    {}\n'.format(f_name))
+
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
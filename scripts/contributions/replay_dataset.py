@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Short Description:
+This is a python script to turn replay files into NumPy arrays for training and evaluating
+models offline.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the contributions/scripts directory
+
+This script requires numpy:
+>pip3 install numpy
+
+Every turn of a replay becomes one sample, taken from the first frame of the turn (before either
+player acts). Each sample has:
+	board:		6 planes on the 28x28 grid, indexed [plane, x, y]
+					0-2:	1 where there is a filter, encryptor or destructor
+					3:		the owner of the structure, 1 for player1 and -1 for player2
+					4:		the health of the structure
+					5:		1 if the structure is upgraded
+	resources:	health, cores and bits of player1, then the same for player2
+	turn:		the turn number
+	damage:		the health player1 and player2 lost during the action phase of the turn (the labels)
+	breaches:	the number of breaches player1 and player2 scored during the turn (the labels)
+
+Each replay is written to its own shard, a .npy file holding one record per sample, so every shard
+can be opened without reading it into memory:
+	samples = numpy.load('dataset/[SHARD].npy', mmap_mode='r')
+	samples['board'].shape		# (number of turns, 6, 28, 28)
+
+dataset/manifest.json lists every shard with the replay it came from. load_dataset(folder) returns
+all shards opened this way.
+
+To convert every replay in the replays folder into the dataset folder:
+>py scripts/contributions/replay_dataset.py -a
+
+or specific replays into another folder:
+>py scripts/contributions/replay_dataset.py -o my_dataset -f [REPLAY_FILE].replay [REPLAY_FILE].replay
+
+Replays are converted in parallel, one process per core unless you give -j. Shards are named by
+a hash of their replay, so running it again only converts replays that are not in the dataset yet.
+'''
+
+import os
+import sys
+import json
+import glob
+import argparse
+import multiprocessing as mp
+
+import replay_stream	# in the same folder as this file, reads replays one frame at a time (see replay_stream.py)
+import results_db		# in the same folder as this file, file_hash keys each shard (see results_db.py)
+
+try:
+	import numpy as np
+except ImportError:
+	sys.stderr.write('numpy not found, install it with:\n>pip3 install numpy\n')
+	sys.exit()
+
+ARENA_SIZE = 28
+STRUCTURES = 3			# filters, encryptors and destructors are the first three unit lists
+UPGRADES = 7			# the unit list of upgraded structures, in replays that have one
+PLANES = ('filter', 'encryptor', 'destructor', 'owner', 'health', 'upgraded')
+
+SAMPLE = np.dtype([
+	('board',		np.float32, (len(PLANES), ARENA_SIZE, ARENA_SIZE)),
+	('resources',	np.float32, (6,)),
+	('turn',		np.int32),
+	('damage',		np.float32, (2,)),
+	('breaches',	np.int32, (2,)),
+])
+
+MANIFEST = 'manifest.json'
+FIELDS = ['turnInfo', 'p1Stats', 'p2Stats', 'p1Units', 'p2Units', 'events.breach']
+
+
+# handles all the arguments
+def parse_args():
+	ap = argparse.ArgumentParser(add_help=False, formatter_class=argparse.RawTextHelpFormatter)
+	ap.add_argument('-h', '--help', action='help', help='show this help message and exit\n\n')
+	ap.add_argument(
+		"-a", "--all",
+		action='store_true',
+		help="converts every replay file in replay folder\n\n")
+	ap.add_argument(
+		"-f", "--file",
+		nargs="*",
+		default=[],
+		help="specify a replay file (or multiple) you'd like to convert\n\n")
+	ap.add_argument(
+		"-o", "--out",
+		default='dataset',
+		help="the folder to write the shards to (default is dataset)\n\n")
+	ap.add_argument(
+		"-j", "--jobs",
+		type=int,
+		default=os.cpu_count() or 1,
+		help="number of processes used to convert replays (default is the number of cores)\n\n")
+	return vars(ap.parse_args())
+
+# fills the board planes of a sample with the structures of one player
+def add_structures(board, units, owner):
+	for unit_type in range(STRUCTURES):
+		for unit in units[unit_type]:
+			x, y = int(unit[0]), int(unit[1])
+			board[unit_type, x, y] = 1
+			board[3, x, y] = owner
+			board[4, x, y] = unit[2]
+	if len(units) > UPGRADES:
+		for unit in units[UPGRADES]:
+			board[5, int(unit[0]), int(unit[1])] = 1
+
+# returns the samples of a replay, one for every turn that has a first frame
+# the damage of a turn is the health lost from its first frame to the first frame of the next turn (or the end of the game)
+def replay_samples(fname):
+	samples = []
+	start = None		# (turn, player1 health, player2 health) at the start of the turn being read
+	healths = None		# the health of both players in the last frame read
+	for turn, frame, data in replay_stream.read_frames(fname, FIELDS):
+		p1_stats, p2_stats = data['p1Stats'], data['p2Stats']
+		healths = (p1_stats[0], p2_stats[0])
+		if frame == -1:
+			if start is not None:
+				samples[-1]['damage'] = (start[1] - healths[0], start[2] - healths[1])
+
+			sample = np.zeros((), dtype=SAMPLE)
+			add_structures(sample['board'], data['p1Units'], 1)
+			add_structures(sample['board'], data['p2Units'], -1)
+			sample['resources'] = p1_stats[:3] + p2_stats[:3]
+			sample['turn'] = turn
+			samples.append(sample)
+			start = (turn, healths[0], healths[1])
+
+		if start is not None and start[0] == turn:
+			for breach in data['events.breach'] or []:
+				samples[-1]['breaches'][breach[4] - 1] += 1
+
+	if start is not None:
+		samples[-1]['damage'] = (start[1] - healths[0], start[2] - healths[1])
+	return np.array(samples, dtype=SAMPLE)
+
+# runs in a worker process: converts a replay and saves its shard, returns (hash, manifest entry)
+def convert_replay(job):
+	f_name, digest, out_dir = job
+	try:
+		samples = replay_samples(f_name)
+	except (ValueError, KeyError, TypeError, IndexError) as e:
+		sys.stderr.write('\nSkipped {}: {}\n'.format(f_name, e))
+		return digest, None
+
+	shard = '{}.npy'.format(digest[:16])
+	tmp_name = os.path.join(out_dir, shard + '.tmp')
+	with open(tmp_name, 'wb') as f:
+		np.save(f, samples)
+	os.replace(tmp_name, os.path.join(out_dir, shard))
+	return digest, {'shard': shard, 'replay': os.path.abspath(f_name), 'samples': len(samples)}
+
+# returns the manifest of a dataset folder, empty if there is none
+def read_manifest(out_dir):
+	try:
+		with open(os.path.join(out_dir, MANIFEST)) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {'planes': list(PLANES), 'shards': {}}
+
+def write_manifest(out_dir, manifest):
+	tmp_name = os.path.join(out_dir, MANIFEST + '.tmp')
+	with open(tmp_name, 'w') as f:
+		json.dump(manifest, f, indent=1)
+	os.replace(tmp_name, os.path.join(out_dir, MANIFEST))
+
+# returns every shard of a dataset folder, memory mapped so nothing is read until it is used
+def load_dataset(out_dir):
+	manifest = read_manifest(out_dir)
+	return [np.load(os.path.join(out_dir, entry['shard']), mmap_mode='r') for entry in manifest['shards'].values()]
+
+# converts every replay in f_names that is not in the dataset yet, returns the number converted
+def export(f_names, out_dir, workers=1):
+	os.makedirs(out_dir, exist_ok=True)
+	manifest = read_manifest(out_dir)
+	known = {digest for digest, entry in manifest['shards'].items() if os.path.exists(os.path.join(out_dir, entry['shard']))}
+
+	jobs = {}
+	for f_name in f_names:
+		digest = results_db.file_hash(f_name)
+		if digest not in known:
+			jobs[digest] = (f_name, digest, out_dir)		# the same replay under two names is only converted once
+
+	if len(jobs) > 0:
+		done = 0
+		with mp.Pool(min(workers, len(jobs))) as pool:
+			for digest, entry in pool.imap_unordered(convert_replay, jobs.values()):
+				done += 1
+				if entry is not None:
+					manifest['shards'][digest] = entry
+				sys.stderr.write('\rConverting replays: {}/{}'.format(done, len(jobs)))
+		sys.stderr.write('\n')
+	write_manifest(out_dir, manifest)
+	return len(jobs)
+
+def main(args):
+	f_names = args['file']
+	if args['all']:
+		replay_dir = '{}/../../replays/'.format(os.path.dirname(os.path.realpath(__file__)))
+		f_names = f_names + glob.glob('{}*.replay'.format(replay_dir))
+
+	num = export(f_names, args['out'], args['jobs'])
+	manifest = read_manifest(args['out'])
+	sys.stderr.write('Converted {} replays, {} has {} shards and {} samples\n'.format(
+		num, args['out'], len(manifest['shards']), sum(entry['samples'] for entry in manifest['shards'].values())))
+
+
+if __name__ == '__main__':
+	args = parse_args() # get command line arguments
+	main(args)			# run program
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Short Description:
+This is a helper for watch_replay.py that indexes where every frame of a replay file starts,
+so any frame can be read without loading the rest of the replay.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the contributions/scripts directory
+
+Every frame of a .replay file is one line. The index records the byte offset and length of the
+line for each (turn, frame), along with both players' health (for the health plot). Building it
+is one pass over the file that only looks for turnInfo and the stats, without decoding the frames.
+
+Reading a frame is then a slice of the memory mapped file and a single json.loads, so opening a
+replay takes about as long as reading it from disk, and scrubbing to any frame is instant.
+
+The index is saved next to the replay ([REPLAY_FILE].replay.index) once the game is over, and is
+ignored and rebuilt if the replay changes size or modification time.
+
+While the engine is still writing a replay, follow indexes only the lines added since the last call,
+so watching a game as it runs costs the same for every new frame however long the game gets.
+
+You can also build indexes ahead of time:
+>py scripts/contributions/replay_index.py [REPLAY_FILE].replay [REPLAY_FILE].replay
+'''
+
+import os
+import re
+import sys
+import json
+import mmap
+import struct
+from array import array
+
+MAGIC = b'TRI1'
+EXTENSION = '.index'
+
+# turnInfo and the first stat (health) of each player, found without decoding the whole line
+TURN_INFO = re.compile(rb'"turnInfo"\s*:\s*\[\s*(-?\d+)\s*,\s*(-?\d+)\s*,\s*(-?\d+)')
+HEALTH = {player: re.compile(rb'"p' + str(player).encode() + rb'Stats"\s*:\s*\[\s*(-?[\d.eE+-]+)') for player in (1, 2)}
+
+# the columns of the index, and the array typecode of each
+COLUMNS = (('turn', 'i'), ('frame', 'i'), ('offset', 'Q'), ('length', 'I'), ('p1_health', 'd'), ('p2_health', 'd'))
+
+
+# returns the path of the index for a replay
+def index_name(fname):
+	return fname + EXTENSION
+
+# returns the (size, mtime) an index is keyed by
+def source_key(fname):
+	stat = os.stat(fname)
+	return stat.st_size, stat.st_mtime_ns
+
+# True if a line is a whole json value, not one the engine is still writing
+def is_complete(line):
+	try:
+		json.loads(line.decode('utf-8'))
+	except ValueError:
+		return False
+	return True
+
+
+# the position of every frame in a replay file, and random access to them
+class ReplayIndex:
+	def __init__(self, fname):
+		self.fname = fname
+		self.columns = {name: array(typecode) for name, typecode in COLUMNS}
+		self.config_pos = None				# (offset, length) of the config line
+		self.end = 0						# the byte after the last complete line indexed
+		self.lookup = {}					# (turn, frame) -> index of the last frame with that key
+		self.frames_in_turn = {}			# number of frames in each turn
+		self.healths = ([], [])				# the health of player1 and player2 in every frame
+		self._file = None
+		self._map = None
+		self._tail = None					# the file kept open by follow
+		self._last_frame = (None, None)		# (index, frame dict) of the last frame read
+
+	def __len__(self):
+		return len(self.columns['turn'])
+
+	# all (turn, frame) pairs in the order they first appear
+	def keys(self):
+		return list(self.lookup.keys())
+
+	# indexes every line from self.end onwards, returns the number of new frames
+	# a last line without a newline is indexed if it is a whole frame, since the replay may just not end with one
+	def scan(self):
+		with open(self.fname, 'rb') as f:
+			return self._scan(f, final=True)
+
+	# same as scan, but keeps the file open between calls, for replays the engine is still writing
+	def follow(self):
+		if self._tail is None:
+			self._tail = open(self.fname, 'rb')
+		return self._scan(self._tail)
+
+	def _scan(self, f, final=False):
+		start = len(self)
+		f.seek(self.end)
+		offset = self.end
+		for line in f:
+			if not line.endswith(b'\n'):
+				if not final or not is_complete(line):
+					break						# the engine is still writing this line
+			self.add_line(line, offset)
+			offset += len(line)
+		self.end = offset
+		return len(self) - start
+
+	def add_line(self, line, offset):
+		if line.strip() == b'':
+			return
+		turn_info = TURN_INFO.search(line)
+		if turn_info is None:
+			data = json.loads(line.decode('utf-8'))
+			if 'debug' in data:
+				self.config_pos = (offset, len(line))
+				return
+			turn_info = data['turnInfo']
+			healths = data['p1Stats'][0], data['p2Stats'][0]
+		else:
+			turn_info = [0] + [int(value) for value in turn_info.groups()[1:]]
+			healths = []
+			for player in (1, 2):
+				health = HEALTH[player].search(line)
+				healths.append(float(health.group(1)) if health else json.loads(line.decode('utf-8'))['p{}Stats'.format(player)][0])
+		self.add_frame(turn_info[1], turn_info[2], offset, len(line), healths[0], healths[1])
+
+	def add_frame(self, turn, frame, offset, length, p1_health, p2_health):
+		i = len(self)
+		for name, value in zip(('turn', 'frame', 'offset', 'length', 'p1_health', 'p2_health'), (turn, frame, offset, length, p1_health, p2_health)):
+			self.columns[name].append(value)
+		self.lookup[(turn, frame)] = i
+		self.frames_in_turn[turn] = self.frames_in_turn.get(turn, 0) + 1
+		self.healths[0].append(p1_health)
+		self.healths[1].append(p2_health)
+
+	# reads the line at (offset, length) from the memory mapped replay
+	def read(self, offset, length):
+		if self._map is None or offset + length > len(self._map):
+			self._unmap()						# the replay has grown since it was mapped
+			self._file = open(self.fname, 'rb')
+			self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		return json.loads(self._map[offset:offset + length].decode('utf-8'))
+
+	# the frame dict of the i-th frame (the last one read is remembered, do not change it)
+	def frame(self, i):
+		if self._last_frame[0] != i:
+			self._last_frame = (i, self.read(self.columns['offset'][i], self.columns['length'][i]))
+		return self._last_frame[1]
+
+	# the frame dict for a (turn, frame) pair
+	def get(self, turn, frame):
+		return self.frame(self.lookup[(turn, frame)])
+
+	def config(self):
+		return self.read(*self.config_pos) if self.config_pos is not None else None
+
+	def _unmap(self):
+		if self._map is not None:
+			self._map.close()
+			self._file.close()
+		self._map = None
+		self._file = None
+
+	def close(self):
+		self._unmap()
+		if self._tail is not None:
+			self._tail.close()
+			self._tail = None
+
+	def save(self):
+		header = json.dumps({
+			'source_size':	self.end,
+			'source_mtime':	source_key(self.fname)[1],
+			'config_pos':	self.config_pos,
+			'frames':		len(self),
+			'byteorder':	sys.byteorder,
+		}).encode('utf-8')
+
+		tmp_name = index_name(self.fname) + '.tmp'
+		with open(tmp_name, 'wb') as f:
+			f.write(MAGIC)
+			f.write(struct.pack('<I', len(header)))
+			f.write(header)
+			for name, typecode in COLUMNS:
+				f.write(self.columns[name].tobytes())
+		os.replace(tmp_name, index_name(self.fname))
+
+	# fills the index from a saved one, returns False if there is none or it is out of date
+	def load(self):
+		try:
+			with open(index_name(self.fname), 'rb') as f:
+				raw = f.read()
+			if raw[:4] != MAGIC:
+				return False
+			header_len, = struct.unpack('<I', raw[4:8])
+			header = json.loads(raw[8:8 + header_len].decode('utf-8'))
+			if (header['source_size'], header['source_mtime']) != source_key(self.fname):
+				return False
+		except (OSError, ValueError, KeyError, struct.error):
+			return False
+
+		pos = 8 + header_len
+		columns = {}
+		for name, typecode in COLUMNS:
+			values = array(typecode)
+			length = values.itemsize * header['frames']
+			values.frombytes(raw[pos:pos + length])
+			if header['byteorder'] != sys.byteorder:
+				values.byteswap()
+			columns[name] = values
+			pos += length
+
+		for i in range(header['frames']):
+			self.add_frame(*(columns[name][i] for name, typecode in COLUMNS))
+		self.config_pos = tuple(header['config_pos']) if header['config_pos'] else None
+		self.end = header['source_size']
+		return True
+
+	# True if the last frame indexed has endStats, so the replay will not change again
+	def finished(self):
+		return len(self) > 0 and b'"endStats"' in self.read_raw(len(self) - 1)
+
+	def read_raw(self, i):
+		with open(self.fname, 'rb') as f:
+			f.seek(self.columns['offset'][i])
+			return f.read(self.columns['length'][i])
+
+
+# returns the index of a replay, from the saved index if it is up to date
+def open_index(fname, save=True):
+	index = ReplayIndex(fname)
+	if not index.load():
+		index.scan()
+		if save and index.finished():
+			try:
+				index.save()
+			except OSError:
+				pass
+	return index
+
+
+if __name__ == '__main__':
+	for f_name in sys.argv[1:]:
+		open_index(f_name)
+		sys.stderr.write('Indexed: {}\n'.format(f_name))
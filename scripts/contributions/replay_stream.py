@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Short Description:
+This is a helper for get_results.py and watch_replay.py that reads replay files one frame at a
+time, so memory use does not grow with the length of a game.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the contributions/scripts directory
+
+read_frames is a generator that yields (turn, frame, data) for every frame of a replay, in order.
+Only one frame is decoded at a time, and nothing is kept once you move on to the next one.
+
+If you only need part of each frame, pass the fields you want. Nested fields are separated with
+'.', and list items are numbers. For example, to add up the breaches in a game:
+
+	breaches = {1: 0, 2: 0}
+	for turn, frame, data in read_frames('replays/my.replay', ['events.breach']):
+		for breach in data['events.breach']:
+			breaches[breach[4]] += breach[1]
+
+read_last_frame reads only the end of the file, which is all you need for endStats.
+'''
+
+import os
+import json
+
+
+# returns the value at a path such as 'events.breach' or 'p1Stats.0' in a frame, None if it is missing
+def get_field(data, field):
+	for key in field.split('.'):
+		try:
+			data = data[int(key)] if type(data) == list else data[key]
+		except (KeyError, IndexError, ValueError, TypeError):
+			return None
+	return data
+
+# yields (turn, frame, data) for every frame, where data is the frame dict or {field: value} for each of fields
+def read_frames(fname, fields=None):
+	with open(fname) as f:
+		for line in f:
+			line = line.replace("\n", "").replace("\t", "")
+			if line == '':
+				continue
+
+			data = json.loads(line)
+			if 'debug' in data:
+				continue					# the config line at the top of the replay
+
+			turn, frame = data['turnInfo'][1], data['turnInfo'][2]
+			if fields is not None:
+				data = {field: get_field(data, field) for field in fields}
+			yield turn, frame, data
+
+# returns the config at the top of a replay, None if there is none
+def read_config(fname):
+	with open(fname) as f:
+		for line in f:
+			line = line.replace("\n", "").replace("\t", "")
+			if line != '':
+				data = json.loads(line)
+				return data if 'debug' in data else None
+	return None
+
+# returns the last complete frame of a replay by reading backwards from the end, None if there are no frames
+def read_last_frame(fname, block_size=1 << 16):
+	with open(fname, 'rb') as f:
+		f.seek(0, os.SEEK_END)
+		pos = f.tell()
+		tail = b''
+
+		while pos > 0:
+			step = min(block_size, pos)
+			pos -= step
+			f.seek(pos)
+			tail = f.read(step) + tail
+
+			# the first line may have been cut in half unless we reached the start of the file
+			lines = tail.split(b'\n')
+			complete = lines if pos == 0 else lines[1:]
+			for line in reversed(complete):
+				line = line.replace(b'\t', b'').strip()
+				if line == b'':
+					continue
+				try:
+					data = json.loads(line.decode('utf-8'))
+				except ValueError:
+					continue				# the engine is still writing this line
+				return None if 'debug' in data else data
+	return None
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Short Description:
+This is a helper for get_results.py that keeps the results of every replay it has read in a
+SQLite database, so each replay is only read once.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the contributions/scripts directory
+
+When get_results.py is run with -db, every replay it is asked about is looked up in the database
+(replays/results.db by default) first. Only replays that are not in it yet are read, and what
+get_results.py keeps for them is added. Everything else is read from the database, so summaries
+over thousands of matches do not read a single replay file.
+
+Replays are keyed by a hash of their contents, so renaming or moving a replay does not add it
+twice. A replay whose path, size and modification time are already known is not even hashed.
+
+The database has three tables:
+	matches:	one row per replay (hash, path, both algos, the winner and the number of turns)
+				or why it could not be read, so it is not read again until it changes
+	players:	one row per player per match (algo, won, final health and every endStats field)
+	turns:		one row per player per turn (health, cores, bits, cores_on_board, cores_spent, bits_spent, time)
+
+Any SQLite client can query it. For example, the average final health of every algo:
+>sqlite3 replays/results.db "SELECT algo, AVG(final_health) FROM players GROUP BY algo"
+
+Running this file prints the wins of every algo over every match in the database:
+>py scripts/contributions/results_db.py [DATABASE]
+'''
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+
+DEFAULT_PATH = '{}/../../replays/results.db'.format(os.path.dirname(os.path.realpath(__file__)))
+
+# the per turn values get_results.py keeps for each algo (see Algo.add_data)
+TURN_FIELDS = ('health', 'cores', 'bits', 'cores_on_board', 'cores_spent', 'bits_spent', 'time')
+
+# the endStats of each player that get their own column
+END_STATS = ('points_scored', 'stationary_resource_spent', 'dynamic_resource_spent', 'dynamic_resource_destroyed',
+			 'dynamic_resource_spoiled', 'stationary_resource_left_on_board', 'crashed', 'total_computation_time')
+
+# values are stored without a column type, so ints stay ints and floats stay floats
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS matches (
+	id			INTEGER PRIMARY KEY,
+	hash		TEXT NOT NULL UNIQUE,
+	path		TEXT NOT NULL,
+	size		INTEGER,
+	mtime		INTEGER,
+	p1_algo		TEXT,
+	p2_algo		TEXT,
+	winner		INTEGER,
+	turns		INTEGER,
+	ingested	REAL,
+	error		TEXT
+);
+CREATE INDEX IF NOT EXISTS matches_path ON matches (path);
+
+CREATE TABLE IF NOT EXISTS players (
+	match_id	INTEGER NOT NULL REFERENCES matches (id) ON DELETE CASCADE,
+	player		INTEGER NOT NULL,
+	algo		TEXT NOT NULL,
+	won			INTEGER,
+	final_health,
+	{end_stats},
+	end_stats	TEXT,
+	PRIMARY KEY (match_id, player)
+);
+CREATE INDEX IF NOT EXISTS players_algo ON players (algo);
+
+CREATE TABLE IF NOT EXISTS turns (
+	match_id	INTEGER NOT NULL REFERENCES matches (id) ON DELETE CASCADE,
+	player		INTEGER NOT NULL,
+	turn		INTEGER NOT NULL,
+	{turn_fields},
+	PRIMARY KEY (match_id, player, turn)
+);
+'''.format(end_stats=',\n\t'.join(END_STATS), turn_fields=',\n\t'.join(TURN_FIELDS))
+
+
+# returns the sha1 of a file's contents
+def file_hash(fname, block_size=1 << 20):
+	digest = hashlib.sha1()
+	with open(fname, 'rb') as f:
+		for block in iter(lambda: f.read(block_size), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+
+# the results of every replay read so far
+class ResultsDB:
+	def __init__(self, path=DEFAULT_PATH):
+		self.path = path
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+		self.conn = sqlite3.connect(path)
+		self.conn.execute('PRAGMA foreign_keys = ON')
+		self.conn.executescript(SCHEMA)
+
+	def close(self):
+		self.conn.close()
+
+	# returns the id of the match stored for a replay file, None if it has not been added
+	# the file is only hashed if its path, size and modification time do not match a stored match
+	def find(self, fname):
+		path = os.path.abspath(fname)
+		stat = os.stat(fname)
+		row = self.conn.execute('SELECT id FROM matches WHERE path = ? AND size = ? AND mtime = ?', (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+		if row is not None:
+			return row[0]
+
+		row = self.conn.execute('SELECT id FROM matches WHERE hash = ?', (file_hash(fname),)).fetchone()
+		if row is None:
+			return None
+
+		# the same replay under a new name, or touched since it was added
+		with self.conn:
+			self.conn.execute('UPDATE matches SET path = ?, size = ?, mtime = ? WHERE id = ?', (path, stat.st_size, stat.st_mtime_ns, row[0]))
+		return row[0]
+
+	# stores what get_results.py keeps for a replay, a list of (algo name, {turn: {field: value}, 'endStats': {...}}) for player1 and player2
+	# returns the id of the new match
+	def add(self, fname, summary):
+		digest = file_hash(fname)
+		row = self.conn.execute('SELECT id FROM matches WHERE hash = ?', (digest,)).fetchone()
+		if row is not None:
+			return row[0]				# the same replay was given twice under different names
+
+		(p1_algo, p1_data), (p2_algo, p2_data) = summary
+		turns = [[turn for turn in data if turn != 'endStats'] for data in (p1_data, p2_data)]
+		healths = [data[player_turns[-1]]['health'] if player_turns else None for data, player_turns in zip((p1_data, p2_data), turns)]
+		winner = 0 if healths[0] == healths[1] else (1 if healths[0] > healths[1] else 2)
+		stat = os.stat(fname)
+
+		with self.conn:
+			cursor = self.conn.execute(
+				'INSERT INTO matches (hash, path, size, mtime, p1_algo, p2_algo, winner, turns, ingested) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+				(digest, os.path.abspath(fname), stat.st_size, stat.st_mtime_ns, p1_algo, p2_algo, winner, len(turns[0]), time.time()))
+			match_id = cursor.lastrowid
+
+			for player, (algo, data) in enumerate(summary, 1):
+				end_stats = data.get('endStats', {})
+				self.conn.execute(
+					'INSERT INTO players (match_id, player, algo, won, final_health, {}, end_stats) VALUES (?, ?, ?, ?, ?, {}, ?)'.format(', '.join(END_STATS), ', '.join('?' * len(END_STATS))),
+					[match_id, player, algo, int(winner == player), healths[player - 1]] + [end_stats.get(stat_name) for stat_name in END_STATS] + [json.dumps(end_stats)])
+				self.conn.executemany(
+					'INSERT INTO turns (match_id, player, turn, {}) VALUES (?, ?, ?, {})'.format(', '.join(TURN_FIELDS), ', '.join('?' * len(TURN_FIELDS))),
+					([match_id, player, turn] + [data[turn].get(field) for field in TURN_FIELDS] for turn in turns[player - 1]))
+		return match_id
+
+	# records a replay that could not be read, returns the id of the new match
+	def add_error(self, fname, error):
+		digest = file_hash(fname)
+		row = self.conn.execute('SELECT id FROM matches WHERE hash = ?', (digest,)).fetchone()
+		if row is not None:
+			return row[0]
+
+		stat = os.stat(fname)
+		with self.conn:
+			cursor = self.conn.execute(
+				'INSERT INTO matches (hash, path, size, mtime, ingested, error) VALUES (?, ?, ?, ?, ?, ?)',
+				(digest, os.path.abspath(fname), stat.st_size, stat.st_mtime_ns, time.time(), str(error)))
+		return cursor.lastrowid
+
+	# returns why a match could not be read, None if it was read
+	def error(self, match_id):
+		return self.conn.execute('SELECT error FROM matches WHERE id = ?', (match_id,)).fetchone()[0]
+
+	# rebuilds the summary add was given for a match, with only the last turn if keep_turns is False
+	def summary(self, match_id, keep_turns=True):
+		summary = []
+		players = self.conn.execute('SELECT player, algo, end_stats FROM players WHERE match_id = ? ORDER BY player', (match_id,)).fetchall()
+		for player, algo, end_stats in players:
+			query = 'SELECT turn, {} FROM turns WHERE match_id = ? AND player = ? ORDER BY turn'.format(', '.join(TURN_FIELDS))
+			if not keep_turns:
+				query += ' DESC LIMIT 1'
+			data = {}
+			for row in self.conn.execute(query, (match_id, player)):
+				data[row[0]] = {field: value for field, value in zip(TURN_FIELDS, row[1:]) if value is not None}
+			data['endStats'] = json.loads(end_stats)
+			summary.append((algo, data))
+		return summary
+
+	# returns (algo, wins, matches) for every algo, most wins first, over match_ids or every match if None
+	def wins(self, match_ids=None):
+		where, params = match_filter('match_id', match_ids)
+		return self.conn.execute('SELECT algo, SUM(won), COUNT(*) FROM players{} GROUP BY algo ORDER BY SUM(won) DESC, algo'.format(where), params).fetchall()
+
+	# returns the average of a per turn field for an algo over every turn it played in match_ids (or every match if None)
+	# None if it has no turns with that field
+	def average(self, algo, field, match_ids=None):
+		if field not in TURN_FIELDS:
+			raise KeyError(field)
+		where, params = match_filter('t.match_id', match_ids)
+		where = (where + ' AND' if where else ' WHERE') + ' p.algo = ?'
+		query = 'SELECT AVG(t.{}) FROM turns t JOIN players p ON p.match_id = t.match_id AND p.player = t.player{}'.format(field, where)
+		return self.conn.execute(query, params + [algo]).fetchone()[0]
+
+	# returns a per turn field of one player in a match, in turn order (the data get_results.py graphs)
+	def series(self, match_id, player, field):
+		if field not in TURN_FIELDS:
+			raise KeyError(field)
+		return [row[0] for row in self.conn.execute('SELECT {} FROM turns WHERE match_id = ? AND player = ? ORDER BY turn'.format(field), (match_id, player))]
+
+
+# returns the WHERE clause and parameters that keep only match_ids in column, nothing if match_ids is None
+def match_filter(column, match_ids):
+	if match_ids is None:
+		return '', []
+	match_ids = sorted(set(match_ids))
+	return ' WHERE {} IN ({})'.format(column, ', '.join('?' * len(match_ids))), match_ids
+
+
+def main(path):
+	if not os.path.exists(path):
+		sys.stderr.write('No results database at {}, run get_results.py with -db first\n'.format(path))
+		return
+
+	db = ResultsDB(path)
+	rows = db.wins()
+	num_matches = db.conn.execute('SELECT COUNT(*) FROM matches WHERE error IS NULL').fetchone()[0]
+	db.close()
+
+	sys.stderr.write('Wins by algo over {} matches:\n|\n'.format(num_matches))
+	fill_len = max([len(algo) for algo, wins, played in rows] + [0]) + 9
+	for algo, wins, played in rows:
+		sys.stderr.write('|{: >{fill}} : {} / {}\n'.format(algo, wins, played, fill=fill_len))
+
+
+if __name__ == '__main__':
+	main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH)
@@ -61,8 +61,10 @@ This would run every single game like before, but 6 games at a time.
 DO NOT RUN WITH A LARGE BATCH SIZE (like >15, depending on your computer) or else it will take forever and crash.
 
 
-At the end I also run the get_results.py script that outputs some data. I recommend having
-matplotlib installed for graphs, etc.
+At the end I also run the get_results.py script that outputs some data for the matches that were
+just played. I recommend having matplotlib installed for graphs, etc.
+Their results are also added to replays/results.db (see results_db.py), so you can look at every
+match you have ever run without reading the replays again.
 
 You can do much more with the get_results.py script that is not shown here and I plan
 on expanding its capabilities.
@@ -73,6 +75,7 @@ If you have questions just ask me on the forums - @Isaac
 import sys
 try:
 	import os
+	import glob
 	import subprocess
 	import argparse
 	import itertools
@@ -239,19 +242,28 @@ if __name__ == '__main__':
 		print ('No arguments - no action taken')
 		sys.exit()
 
-	tmp = copy.deepcopy(matches)
+	replay_dir = '{}/../../replays/'.format(os.path.dirname(os.path.realpath(__file__)))
+	old_replays = set(glob.glob('{}*.replay'.format(replay_dir)))
+
 	run_matches(matches, args['batch'])		# run all matches
 
+	# the replays the matches above created
+	new_replays = sorted(set(glob.glob('{}*.replay'.format(replay_dir))) - old_replays, key=os.path.getctime, reverse=True)
+
 	# if get_results is avalible, run a summary of the matches played
 	try:
+		from get_results import main
+		import results_db
 		args = {	'all':		False, 				\
 					'verbose':	False, 				\
 					'averages':	[], 				\
-					'file':		[],					\
-					'graph':	['wins'],	\
-					'num':		len(list(tmp))		\
+					'file':		new_replays,		\
+					'graph':	['wins'],			\
+					'num':		len(new_replays),	\
+					'jobs':		os.cpu_count() or 1,	\
+					'no_cache':	False,				\
+					'database':	results_db.DEFAULT_PATH	\
 				}
-		from get_results import main
 		main(args)
 	except Exception as e:
 		print (e)
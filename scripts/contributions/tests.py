@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import replay_cache
+import replay_index
+import replay_stream
+import results_db
+
+
+EVENT_KINDS = ('selfDestruct', 'breach', 'damage', 'shield', 'move', 'spawn', 'death', 'attack', 'melee')
+
+
+# the events of a frame the way the engine writes them, every kind listed even when empty
+def frame_events(turn, frame):
+	events = {kind: [] for kind in EVENT_KINDS}
+	if frame == 1:
+		events['spawn'].append([[13, 0], 3, str(turn * 10), 1])
+		events['move'].append([[13, 0], [13, 1], [-1, -1], 3, str(turn * 10), 1])
+		events['breach'].append([[14, 27], 1.0, 3, str(turn * 10), 1])
+		events['death'].append([[14, 27], 3, str(turn * 10), 1, False])
+		events['selfDestruct'].append([[3, 10], [[2, 10], [4, 11]], 5.0, 4, '7', 2])
+	return events
+
+# writes a small finished replay (a config line, then frames for a few turns) and returns its path
+def write_replay(folder, turns=3, frames=4, final_newline=True):
+	lines = [json.dumps({'debug': {}, 'unitInformation': [], 'resources': {}})]
+	for turn in range(turns):
+		for frame in range(-1, frames):
+			lines.append(json.dumps({
+				'turnInfo': [0 if frame == -1 else 1, turn, frame, frame * 3],
+				'p1Stats': [30.0 - turn, 10.0, 5.0, 120],
+				'p2Stats': [30.0, 10.0, 5.0, 95],
+				'p1Units': [[[13, 2, 60.0, '1'], [14, 2, 12.5, '2']]] + [[] for i in range(7)],
+				'p2Units': [[]] * 2 + [[[13, 25, 75.0, '3']]] + [[] for i in range(5)],
+				'events': frame_events(turn, frame)}))
+	lines.append(json.dumps({
+		'turnInfo': [2, turns, 0, 0],
+		'p1Stats': [30.0 - turns, 0, 0, 0],
+		'p2Stats': [30.0, 0, 0, 0],
+		'p1Units': [[] for i in range(8)],
+		'p2Units': [[] for i in range(8)],
+		'events': frame_events(turns, -1),
+		'endStats': {'winner': 2}}))
+
+	fname = os.path.join(folder, 'test.replay')
+	with open(fname, 'w') as f:
+		f.write('\n'.join(lines) + ('\n' if final_newline else ''))
+	return fname
+
+
+class ReplayIndexTests(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.folder, ignore_errors=True)
+
+	def test_scan_indexes_every_frame(self):
+		fname = write_replay(self.folder)
+		index = replay_index.open_index(fname)
+		self.assertEqual(len(index), sum(1 for frame in replay_stream.read_frames(fname)))
+		self.assertTrue(index.finished())
+		self.assertTrue(os.path.exists(replay_index.index_name(fname)))
+		index.close()
+
+	def test_scan_without_final_newline(self):
+		fname = write_replay(self.folder, final_newline=False)
+		index = replay_index.open_index(fname)
+		self.assertEqual(len(index), sum(1 for frame in replay_stream.read_frames(fname)))
+		self.assertTrue(index.finished())
+		self.assertIn('endStats', index.frame(len(index) - 1))
+		self.assertTrue(os.path.exists(replay_index.index_name(fname)))
+		index.close()
+
+		saved = replay_index.ReplayIndex(fname)
+		self.assertTrue(saved.load())
+		self.assertEqual(len(saved), len(index))
+
+	def test_follow_waits_for_partial_line(self):
+		fname = write_replay(self.folder)
+		with open(fname, 'rb') as f:
+			raw = f.read()
+		partial = os.path.join(self.folder, 'partial.replay')
+		with open(partial, 'wb') as f:
+			f.write(raw[:-20])
+
+		index = replay_index.ReplayIndex(partial)
+		before = index.follow()
+		self.assertFalse(index.finished())
+		with open(partial, 'ab') as f:
+			f.write(raw[-20:])
+		self.assertEqual(index.follow(), 1)
+		self.assertEqual(before + 1, sum(1 for frame in replay_stream.read_frames(fname)))
+		self.assertTrue(index.finished())
+		index.close()
+
+
+class ReplayCacheTests(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.folder, ignore_errors=True)
+
+	def test_round_trip(self):
+		fname = write_replay(self.folder)
+		self.assertIsNotNone(replay_cache.convert(fname))
+		self.assertTrue(os.path.exists(replay_cache.cache_name(fname)))
+
+		columns = replay_cache.load(fname)
+		self.assertIsNotNone(columns, 'The saved cache should be up to date')
+		frames = [data for turn, frame, data in replay_stream.read_frames(fname)]
+		self.assertEqual(len(frames), len(columns))
+		for i, data in enumerate(frames):
+			self.assertEqual(data, columns.frame(i))
+		self.assertEqual(replay_stream.read_config(fname), columns.config)
+
+	def test_standard_frames_have_no_extra(self):
+		fname = write_replay(self.folder)
+		replay_cache.convert(fname)
+		columns = replay_cache.load(fname)
+		self.assertEqual({}, columns.extra(1), 'Empty melee lists should not be stored as JSON')
+		self.assertIn('endStats', columns.extra(len(columns) - 1))
+		self.assertEqual([], columns.frame(1)['events']['melee'])
+
+
+# a summary the way get_results.py gives it to ResultsDB.add, player1 ends on p1_health and player2 on 20
+def make_summary(p1='a', p2='b', p1_health=30.0, turns=3):
+	p1_data = {turn: {'health': p1_health if turn == turns - 1 else 30.0, 'bits': float(turn), 'time': 100 + turn} for turn in range(turns)}
+	p2_data = {turn: {'health': 20.0, 'bits': 2.0, 'time': 50} for turn in range(turns)}
+	p1_data['endStats'] = {'points_scored': 10}
+	p2_data['endStats'] = {'points_scored': 0}
+	return [(p1, p1_data), (p2, p2_data)]
+
+
+class ResultsDBTests(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.db = results_db.ResultsDB(os.path.join(self.folder, 'results.db'))
+
+	def tearDown(self):
+		self.db.close()
+		shutil.rmtree(self.folder, ignore_errors=True)
+
+	# writes a file to stand in for a replay, only its contents matter to the database
+	def write_file(self, name, contents):
+		fname = os.path.join(self.folder, name)
+		with open(fname, 'w') as f:
+			f.write(contents)
+		return fname
+
+	def test_replay_added_once_by_hash(self):
+		first = self.write_file('first.replay', 'match one')
+		self.assertIsNone(self.db.find(first))
+		match_id = self.db.add(first, make_summary())
+		self.assertEqual(match_id, self.db.find(first))
+
+		copy = self.write_file('copy.replay', 'match one')
+		self.assertEqual(match_id, self.db.find(copy), 'A renamed replay should be found by its contents')
+		self.assertEqual(match_id, self.db.add(copy, make_summary()))
+		self.assertEqual(1, self.db.conn.execute('SELECT COUNT(*) FROM matches').fetchone()[0])
+
+		other = self.write_file('other.replay', 'match two')
+		self.assertIsNone(self.db.find(other))
+		self.assertNotEqual(match_id, self.db.add(other, make_summary()))
+
+	def test_errors_are_recorded(self):
+		bad = self.write_file('bad.replay', 'not a replay')
+		match_id = self.db.add_error(bad, ValueError('truncated'))
+		self.assertEqual(match_id, self.db.find(bad))
+		self.assertEqual('truncated', self.db.error(match_id))
+
+		good = self.write_file('good.replay', 'match one')
+		self.assertIsNone(self.db.error(self.db.add(good, make_summary())))
+		self.assertEqual([], self.db.wins([match_id]))
+
+	def test_wins(self):
+		ids = [self.db.add(self.write_file('{}.replay'.format(i), str(i)), make_summary(p2=p2, p1_health=health))
+			   for i, (p2, health) in enumerate([('b', 25.0), ('b', 15.0), ('c', 5.0)])]
+		self.assertEqual([('a', 1, 3), ('b', 1, 2), ('c', 1, 1)], self.db.wins())
+		self.assertEqual([('a', 1, 2), ('b', 1, 2)], self.db.wins(ids[:2]))
+		self.assertEqual([('c', 1, 1), ('a', 0, 1)], self.db.wins(ids[2:] * 2))
+
+	def test_average_and_series(self):
+		first = self.db.add(self.write_file('1.replay', '1'), make_summary(p1_health=24.0))
+		second = self.db.add(self.write_file('2.replay', '2'), make_summary(p1='b', p2='a', p1_health=6.0))
+		self.assertEqual([30.0, 30.0, 24.0], self.db.series(first, 1, 'health'))
+		self.assertEqual([100, 101, 102], self.db.series(first, 1, 'time'))
+		self.assertEqual([2.0, 2.0, 2.0], self.db.series(second, 2, 'bits'))
+
+		self.assertAlmostEqual(28.0, self.db.average('a', 'health', [first]))
+		self.assertAlmostEqual((30.0 + 30.0 + 24.0 + 20.0 * 3) / 6, self.db.average('a', 'health'))
+		self.assertAlmostEqual(1.0, self.db.average('b', 'bits', [second]))
+		self.assertIsNone(self.db.average('c', 'health'))
+		with self.assertRaises(KeyError):
+			self.db.average('a', 'not_a_field')
+
+
+if __name__ == '__main__':
+	unittest.main()
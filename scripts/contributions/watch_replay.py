@@ -45,6 +45,17 @@ Blitting will improve the performance of the graphing, but comes at the cost of
 - You may notice small graphical glitches with text updating (will not show if you do not use the keyboard inputs)
 - If you run the program in real-time the player names will not update (the winner name will be displayed correctly).
 
+----------------------------------------------------------------------------------------
+-c: Collections
+
+You can specify whether to draw units with collections with this flag:
+>py scripts/contributions/watch_replay.py -c
+
+Normally every unit is made of its own shapes, which are all updated one by one each frame. This gets
+slow late in a game, when there are hundreds of units on the board.
+With -c, all units of a type are drawn as a single shape collection that is rebuilt each frame, so
+dense boards play back at full speed. It looks the same, and it works with blitting (-b) and saving (-s).
+
 ----------------------------------------------------------------------------------------
 -run: Real-time watching
 
@@ -101,7 +112,7 @@ If you want the individual frames, use this option.
 This option also does not have any dependencies (as far as I know).
 
 
-There are two arguments specific to -s that you can use to specify more with the save option
+There are four arguments specific to -s that you can use to specify more with the save option
 
 -------------
 -w: Writers
@@ -170,6 +181,25 @@ If you want to change the order just:
 1. Ctrl-Find in this script:	this is the default order of priority for running a save
 2. Change the order of the list to be the priority you want
 
+-------------
+-j: Jobs
+
+Saving with ffmpeg (.mp4) or pillow (.gif) does not play the replay. Every frame is drawn to an image by
+a pool of processes without opening a window, and the images are then joined into the video.
+By default one process is used for each CPU. You can change it with:
+>py scripts/contributions/watch_replay.py -s awesome_video.mp4 -j 2
+
+Progress is shown as the frames are drawn. The .html writer still plays the replay in a single process.
+
+-------------
+-st: Stride
+
+Long games have a lot of frames in every turn. To make a shorter video you can only save every few frames:
+>py scripts/contributions/watch_replay.py -s awesome_video.gif -st 4
+
+This saves the first frame of each turn and every 4th frame after it (and the last frame of the game).
+Like -j, this only applies to ffmpeg and pillow.
+
 ----------------------------------------------------------------------------------------
 
 I cannot stress enough that this program is slow and unoptimized. Expect slowness :).
@@ -193,6 +223,8 @@ try:
 	import json
 	import glob
 	import random
+	import shutil
+	import tempfile
 	import warnings
 	import argparse
 	import subprocess
@@ -201,12 +233,16 @@ except ImportError as e:
 	sys.stderr.write("WARNING: Module not found, full error:\n\n")
 	sys.stderr.write(e)
 
+import replay_cache		# in the same folder as this file, converts replays to a faster format (see replay_cache.py)
+import replay_index		# in the same folder as this file, finds each frame in a replay without reading it (see replay_index.py)
+
 try:
 	import matplotlib.pyplot as plt
 	import matplotlib.animation as animation
 	from matplotlib.patches import Circle, Wedge, Polygon
-	from matplotlib.collections import PatchCollection
+	from matplotlib.collections import PatchCollection, PolyCollection
 	from matplotlib.widgets import Slider
+	import numpy as np				# always installed with matplotlib
 except ImportError:
 	usr_in = input('Matplotlib not found.\nWould you like this program to try and install matplotlib? (y/n) ')
 	if usr_in.lower() == 'y' or usr_in.lower() == 'yes':
@@ -216,8 +252,9 @@ except ImportError:
 			import matplotlib.pyplot as plt
 			import matplotlib.animation as animation
 			from matplotlib.patches import Circle, Wedge, Polygon
-			from matplotlib.collections import PatchCollection
+			from matplotlib.collections import PatchCollection, PolyCollection
 			from matplotlib.widgets import Slider
+			import numpy as np
 
 			sys.stderr.write('\n\n')
 		except ImportError as e:
@@ -226,7 +263,7 @@ except ImportError:
 			sys.exit()
 
 
-global FILTER, ENCRYPTOR, DESTRUCTOR, PING, EMP, SCRAMBLER, MAX_HP, GET_VERTS, SPEED, BLIT
+global FILTER, ENCRYPTOR, DESTRUCTOR, PING, EMP, SCRAMBLER, MAX_HP, GET_VERTS, SPEED, BLIT, COLLECTIONS
 FILTER = 0
 ENCRYPTOR = 1
 DESTRUCTOR = 2
@@ -266,6 +303,7 @@ def scrambler_verts(x,y):
 	return [(a+x, b+y) for (a,b) in verts]
 
 GET_VERTS = {PING:ping_verts, EMP:emp_verts, SCRAMBLER:scrambler_verts}
+POLYGON_VERTS = {t: GET_VERTS[t](0, 0) for t in GET_VERTS}		# the vertices of each mobile unit around (0,0)
 
 
 # handles all the arguments
@@ -281,6 +319,10 @@ def parse_args():
 		'-b', '--blit',
 		action='store_true',
 		help="will tell the program to use blit - will improve performance, but you will not be able to see or use the slider and there will be minor text glitches when fast forwarding, etc (you can still use all the keyboard commands)\n\n")
+	ap.add_argument(
+		'-c', '--collections',
+		action='store_true',
+		help="will tell the program to draw all units of a type as a single collection - much faster on boards with lots of units, and works with blit\n\n")
 	ap.add_argument(
 		'-run', '--run_match',
 		nargs='+',
@@ -299,6 +341,16 @@ def parse_args():
 		'-kt', '--keep_trying',
 		action='store_true',
 		help="forces the save file to keep trying different writers until one works - flag only works if you are saving a replay\n\n")
+	ap.add_argument(
+		'-j', '--jobs',
+		type=int,
+		default=os.cpu_count() or 1,
+		help="the number of processes that render frames when saving with ffmpeg or pillow (default is the number of CPUs)\n\n")
+	ap.add_argument(
+		'-st', '--stride',
+		type=int,
+		default=1,
+		help="only save every STRIDE-th frame of each turn when saving with ffmpeg or pillow (the first frame of each turn is always saved)\n\n")
 	return vars(ap.parse_args())
 
 # stores all information for a single unit on the graph
@@ -359,7 +411,7 @@ class Unit:
 			 self.unit_type == EMP or \
 			 self.unit_type == SCRAMBLER:
 				verts = GET_VERTS[self.unit_type](self.x, self.y)
-				polygon = Polygon(verts, True)
+				polygon = Polygon(verts, closed=True)
 
 				self.polygons.append(polygon)
 				self.patches.append(ax.add_patch(polygon))
@@ -529,6 +581,120 @@ class PatchWrapper:
 		return [patch for unit in self.units.values() for patch in unit.patches]
 
 
+ARC_STEPS = 32		# points along each edge of a wedge drawn by CollectionWrapper, so every wedge has the same number
+WEDGE_VERTS = {}	# wedges already built by wedge_verts
+
+# returns the vertices of a wedge around (0,0)
+def wedge_verts(r, width, theta1, theta2):
+	key = (r, width, theta1, theta2)
+	if key not in WEDGE_VERTS:
+		angles = np.radians(np.linspace(theta1, min(theta2, theta1 + 360), ARC_STEPS))
+		outer = np.column_stack((np.cos(angles), np.sin(angles))) * r
+		WEDGE_VERTS[key] = np.concatenate((outer, outer[::-1] * ((r - width) / r)))
+	return WEDGE_VERTS[key]
+
+# the parts every unit type is drawn with: (layer, radius, width) for wedges or (layer, None, None) for the unit's polygon
+UNIT_PARTS = {
+	FILTER:		[('filter', .2, .07)],
+	ENCRYPTOR:	[('encryptor', .12, .03), ('encryptor_outer', .37, .15)],
+	DESTRUCTOR:	[('destructor', .2, .07), ('destructor_outer', .45, .01)],
+	PING:		[('ping', None, None)],
+	EMP:		[('emp', None, None)],
+	SCRAMBLER:	[('scrambler', None, None)],
+}
+
+# the layers units are drawn in, in order: (layer, filled, alpha, linewidth)
+LAYERS = [
+	('filter', True, 1, 1), ('encryptor', True, 1, 1), ('encryptor_outer', True, 0.3, 1), ('destructor', True, 1, 1), ('destructor_outer', True, 1, 1),
+	('upgraded', False, 0.5, 1), ('ping', True, 1, 1), ('emp', False, 1, 1), ('scrambler', False, 1, 1), ('shield', False, 0.5, 4),
+]
+
+# draws the same thing as PatchWrapper, but with a single PolyCollection for each layer instead of patches for every unit
+# the vertices and colors of each layer are rebuilt from arrays every frame, so a frame is a few draw calls however many units there are
+class CollectionWrapper:
+	def __init__(self):
+		self.layers = {}	# stores the PolyCollection for each layer (created when the first frame is drawn)
+		self.filled = {}	# stores whether each layer is filled
+		self.loc = {}		# stores the number of units at a location with each location tuple (x,y) as the key
+		self.lbls = []		# stores the text labels for locations with more than 1 unit (hidden when not used)
+		self.num_lbls = 0	# the number of labels used this frame
+		self.color = {1:'C0', 2:'r'}
+
+	def create_layers(self, ax):
+		for layer, filled, alpha, linewidth in LAYERS:
+			self.layers[layer] = ax.add_collection(PolyCollection([], alpha=alpha, linewidths=linewidth, antialiased=True))
+			self.filled[layer] = filled
+
+	# rebuilds every layer from the units given by the engine
+	def update_units(self, units, ax):
+		if not self.layers:
+			self.create_layers(ax)
+
+		shapes = {layer: [] for layer in self.layers}		# the vertices around (0,0) of every shape in each layer
+		centers = {layer: [] for layer in self.layers}		# where each shape is on the board
+		colors = {layer: [] for layer in self.layers}		# the color of each shape
+
+		for unit_type, (x, y), stability, p_index, ID in units:
+
+			# update the board locations count of units
+			try:
+				self.loc[(x,y)] += 1
+			except KeyError:
+				self.loc[(x,y)] = 1
+
+			# (layer, vertices) for every shape this unit is drawn with
+			parts = []
+			if unit_type in GET_VERTS:
+				parts.append((UNIT_PARTS[unit_type][0][0], POLYGON_VERTS[unit_type]))
+				r = round(min((stability - MAX_HP[unit_type])/50, .5), 2)
+				if r > 0 and self.loc[(x,y)] == 1:
+					parts.append(('shield', wedge_verts(r, 0, 0, 360)))
+			else:
+				angle = int(rotate(360 * (stability / MAX_HP[unit_type])))
+				for i, (layer, r, width) in enumerate(UNIT_PARTS[unit_type]):
+					if i == 1 and stability > MAX_HP[unit_type]:
+						layer = 'upgraded'
+					parts.append((layer, wedge_verts(r, width, rotate(0), angle)))
+
+			for layer, verts in parts:
+				shapes[layer].append(verts)
+				centers[layer].append((x, y))
+				colors[layer].append(self.color[p_index])
+
+		for layer, collection in self.layers.items():
+			if shapes[layer]:
+				collection.set_verts(np.array(shapes[layer]) + np.array(centers[layer], dtype=float)[:, None, :])
+			else:
+				collection.set_verts([])
+			collection.set_edgecolor(colors[layer])
+			collection.set_facecolor(colors[layer] if self.filled[layer] else 'none')
+
+	# shows the count labels at locations with more than one unit (reusing the ones already made), then resets self.loc
+	def update_lbls(self, ax):
+		self.num_lbls = 0
+		for pos, val in self.loc.items():
+			if val > 1:
+				self.plot_text(val, pos, ax)
+		for lbl in self.lbls[self.num_lbls:]:
+			lbl.set_visible(False)
+		self.loc = {}
+
+	# adds the count lable to a position on the board
+	def plot_text(self, txt, pos, ax):
+		x,y = pos
+		if self.num_lbls == len(self.lbls):
+			self.lbls.append(ax.text(x+.4, y-.4, str(txt), fontsize=10))
+		else:
+			self.lbls[self.num_lbls].set_position((x+.4, y-.4))
+			self.lbls[self.num_lbls].set_text(str(txt))
+			self.lbls[self.num_lbls].set_visible(True)
+		self.num_lbls += 1
+
+	# return all the collections that need to be updated every animation
+	def values(self):
+		return list(self.layers.values())
+
+
 # this class is for the right side (information side) except for the plot (see Plot class)
 class Info:
 	def __init__(self, endStats, ax, slider_exists=False):
@@ -676,7 +842,7 @@ class Plot:
 
 # this class contains all information regarding the entire window
 class Graph:
-	def __init__(self, data, frames_in_turn, healths, writers, keep_trying, save='', fh=None):
+	def __init__(self, data, frames_in_turn, healths, writers, keep_trying, save='', fh=None, f_name=None, jobs=1, stride=1, headless=False):
 
 		# pretty clear, if no data, raise an Error
 		if len(data) < 1:
@@ -684,6 +850,10 @@ class Graph:
 
 		self.fh = fh 																# reference to file handler
 		self.real_time = False if self.fh == None else True 						# tracks whether real-time
+		self.replay = self.fh.get_last_replay() if self.real_time else None			# the replay being written, followed while real-time
+		self.f_name = f_name 														# the replay file, so other processes can render frames when saving
+		self.jobs = jobs 															# the number of processes that render frames when saving
+		self.stride = stride 														# only every stride-th frame of each turn is saved
 
 		plt.style.use('dark_background')											# sets black background
 
@@ -700,7 +870,7 @@ class Graph:
 		self.single_advance = False													# true when user is scrubbing, but still want to move forward one frame
 		self.stop_slider_evt = False												# stop the slider event from triggereing when the code changes it
 
-		self.patches = PatchWrapper()												# creates the PatchWrapper object
+		self.patches = CollectionWrapper() if COLLECTIONS else PatchWrapper()		# creates the object that draws the units
 
 		self.stream = self.data_stream()											# gets a data_reference - this passes all data to the animation
 
@@ -709,7 +879,11 @@ class Graph:
 		self.fig.canvas.mpl_connect('key_press_event', self.keyboard_input)			# connect keyboard events to the keyboard_input function
 
 		# if in real-time, use a generator function to update number of frames, otherwise frames is static
-		if not self.real_time:
+		# headless graphs only render the frames they are given (see render_chunk), so they have no animation
+		if headless:
+			self.anim = None
+			return
+		elif not self.real_time:
 			self.anim = animation.FuncAnimation(self.fig, self.update, init_func=self.init, frames=self.num_frames, interval=100, blit=BLIT, repeat=False)
 		else:
 			self.frame_generator = self.gen_frames()
@@ -726,6 +900,7 @@ class Graph:
 	# saves all animations passed from the command line
 	def save_animation(self, save_name, writers, keep_trying):
 		print ('This may take a little while and seem to hang')
+		self.rendered = None		# (folder, number of frames) once the frames are rendered for ffmpeg or pillow
 
 		# reference dictionaries to converte values based on input
 		ex_to_writer = {'gif':'pillow', 'mp4':'ffmpeg', 'html':'html'}
@@ -743,34 +918,102 @@ class Graph:
 		attempts = attempts + [w for w in default if w not in attempts] if keep_trying else attempts
 
 		# loop through and save all attempts until input is complete
-		complete = 0
-		for i, writer in enumerate(attempts):
-			try:
-				# if we can create that type of writer, make it
-				print ()
-				if check_writer[writer]():
-					self.create_animation(writer, name, given_ext)
-					complete += 1
-
-				# check and make sure we haven't finished (based on whether we keep trying or not)
-				if len(writers) <= complete: keep_trying = False
-				else: keep_trying = True
-
-				if not keep_trying: break
-			except KeyError:
-				print ('{} is not a valid writer. Options are:\n\t- ffmpeg  (for .mp4 videos)\n\t- pillow  (for gifs)\n\t- html    (for browser view and individual frames)'.format(writer))
+		try:
+			complete = 0
+			for i, writer in enumerate(attempts):
+				try:
+					# if we can create that type of writer, make it
+					print ()
+					if check_writer[writer]():
+						self.create_animation(writer, name, given_ext)
+						complete += 1
+
+					# check and make sure we haven't finished (based on whether we keep trying or not)
+					if len(writers) <= complete: keep_trying = False
+					else: keep_trying = True
+
+					if not keep_trying: break
+				except KeyError:
+					print ('{} is not a valid writer. Options are:\n\t- ffmpeg  (for .mp4 videos)\n\t- pillow  (for gifs)\n\t- html    (for browser view and individual frames)'.format(writer))
+		finally:
+			if self.rendered is not None:
+				shutil.rmtree(self.rendered[0], ignore_errors=True)
+				self.rendered = None
 
 	# creates an animation of a writer type
 	def create_animation(self, writer, name, given_ext):
 		extension = self.get_extension(writer, given_ext)
 		print ('Saving file {}.{}'.format(name, extension))
 		try:
-			self.anim.save('{}.{}'.format(name, extension), writer=writer)
+			if writer in ('ffmpeg', 'pillow') and self.f_name is not None:
+				self.export_animation(writer, '{}.{}'.format(name, extension))
+			else:
+				self.anim.save('{}.{}'.format(name, extension), writer=writer)
 			print ('Done saving file: {}.{}'.format(name, extension))
 		except Exception as e:
 			print ('Unknown error. Full Output:')
 			print (str(e))
 
+	# returns every (turn, frame) pair in the order they are played, keeping the first frame of each turn,
+	# every stride-th frame after it and the last frame of the game
+	def frame_sequence(self, stride=1):
+		heads = []
+		head = (0, -1)
+		while True:
+			if head[1] == -1 or (head[1] + 1) % stride == 0:
+				heads.append(head)
+
+			if (head[0], head[1]+1) in self.data:
+				head = head[0], head[1]+1
+			elif (head[0]+1, -1) in self.data:
+				head = head[0]+1, -1
+			else:
+				break
+
+		if heads[-1] != head:
+			heads.append(head)
+		return heads
+
+	# renders every frame that will be saved to a png, split between self.jobs processes
+	# returns the folder they are in and the number of frames (frames are only rendered once for all writers)
+	def render_frames(self):
+		if self.rendered is not None:
+			return self.rendered
+
+		heads = self.frame_sequence(self.stride)
+		frame_dir = tempfile.mkdtemp(prefix='watch_replay_frames_')
+		chunk_size = max(1, len(heads) // (self.jobs * 4))									# a few chunks per process, so the progress moves smoothly
+		chunks = [(i, heads[i:i+chunk_size], frame_dir) for i in range(0, len(heads), chunk_size)]
+
+		done = 0
+		try:
+			with mp.Pool(self.jobs, initializer=init_renderer, initargs=(self.f_name, BLIT, COLLECTIONS)) as pool:
+				for num in pool.imap_unordered(render_chunk, chunks):
+					done += num
+					sys.stderr.write('\rRendering frames: {}/{}'.format(done, len(heads)))
+		except BaseException:
+			shutil.rmtree(frame_dir, ignore_errors=True)		# save_animation only cleans up frames that were all rendered
+			raise
+		sys.stderr.write('\n')
+
+		self.rendered = (frame_dir, len(heads))
+		return self.rendered
+
+	# saves an animation by rendering its frames in parallel, then joining them with ffmpeg or pillow
+	def export_animation(self, writer, file_name):
+		frame_dir, num_frames = self.render_frames()
+		fps = SPEED[self.speed] * 10
+		frame_names = [os.path.join(frame_dir, FRAME_NAME.format(i)) for i in range(num_frames)]
+
+		if writer == 'ffmpeg':
+			subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-framerate', str(fps), '-i', os.path.join(frame_dir, FRAME_NAME.replace('{:06d}', '%06d')),
+							'-vcodec', 'h264', '-pix_fmt', 'yuv420p', file_name], check=True)
+		else:
+			from PIL import Image
+			first = Image.open(frame_names[0])
+			rest = (Image.open(frame_name) for frame_name in frame_names[1:])			# opened one at a time, so all frames are never in memory
+			first.save(file_name, save_all=True, append_images=rest, duration=int(1000 / fps), loop=0)
+
 	# returns the extension that must be used for the appropriate writer
 	def get_extension(self, writer, given_ext):
 		extensions = {'pillow':'gif', 'ffmpeg':'mp4', 'html':'html'}
@@ -999,18 +1242,19 @@ class Graph:
 	def data_stream(self):
 		while True:
 
-			# everything in this block (real-time) is extrememly inefficient, becuase it has to constantly load new data
+			# in real-time, only the frames the engine has added since the last call are read
 			if self.real_time:
-				self.info_ax.clear()															# clear the inforation side
-
-				self.fh.load_files(1,False,args['file']) 										# load latest replay (again)
-				replay = self.fh.get_last_replay()												# get latest replay (again)
+				new_frames = self.replay.follow()												# self.data, self.frames_in_turn and self.healths grow with it
 
 				# user paused game, don't advance
 				if not self.is_manual:
 					self.advance()
 
-				self.general_init(replay.frames, replay.frames_in_turn, replay.healths)			# call general initialization
+				if new_frames > 0:
+					self.num_frames = len(self.data)
+					if self.replay.finished():
+						self.info_ax.clear()													# clear the inforation side
+						self.general_init(self.data, self.frames_in_turn, self.healths)			# creates the slider and end of game information
 
 				# this is for the first call - cannot send before yield is reached (function called)
 				try:
@@ -1127,12 +1371,44 @@ class Graph:
 		return grid
 
 
+FRAME_NAME = 'frame_{:06d}.png'	# the name of each frame rendered when saving with ffmpeg or pillow
+RENDERER = None					# the headless Graph each rendering process draws its frames with (see Graph.render_frames)
+
+# runs once in each rendering process, loads the replay and creates the Graph that draws its frames
+def init_renderer(f_name, blit, collections):
+	global RENDERER, BLIT, COLLECTIONS
+	BLIT = blit
+	COLLECTIONS = collections
+	plt.switch_backend('Agg')		# frames are only saved, so never open a window
+
+	replay = Replay(f_name)
+	RENDERER = Graph(replay.frames, replay.frames_in_turn, replay.healths, ['empty'], False, headless=True)
+
+# renders each (turn, frame) in heads to a png in frame_dir, numbered from start, returns the number rendered
+def render_chunk(job):
+	start, heads, frame_dir = job
+	for i, head in enumerate(heads):
+		RENDERER.head = head
+		next(RENDERER.stream)
+		RENDERER.fig.savefig(os.path.join(frame_dir, FRAME_NAME.format(start + i)), dpi=RENDERER.fig.dpi)
+	return len(heads)
+
+
 # a simple data storage class to hold the data for a single frame
 class Frame:
-	def __init__(self, t, f, data):
+	def __init__(self, t, f, data=None, source=None, index=None):
 		self.turn = t 					# the turn for this frame
 		self.frame = f 					# the local frame for this frame
-		self.data = data 				# the data for this frame
+		self._data = data 				# the data for this frame, or None if it is read from source when used
+		self.source = source 			# the ReplayColumns or ReplayIndex this frame is read from (see replay_cache.py and replay_index.py)
+		self.index = index 				# the index of this frame in source
+
+	# frames read from a source are not kept, so memory does not grow while watching (source remembers the last one)
+	@property
+	def data(self):
+		if self._data is None:
+			return self.source.frame(self.index)
+		return self._data
 
 	def __repr__(self):
 		return ('({}, {})'.format(self.turn, self.frame))
@@ -1149,6 +1425,7 @@ class Replay:
 		self.frames = {}				# dict containing all data, keys are turn, frame tuple with Frame objects as values
 		self.frames_in_turn = {}		# number of frames in each turn
 		self.healths = ([], [])			# contains the healths for player1 and player2
+		self.index = None				# the ReplayIndex frames are read from (see replay_index.py), None if they come from a .cache file
 
 		self.load_data()				# handles loading all the data from file into python variables
 
@@ -1161,32 +1438,64 @@ class Replay:
 	def __repr__(self):
 		return self.__string()
 
-	# loads all data from a replay into the python variables
+	# loads the position of every frame in a replay, frames are only read from the file when they are shown
 	def load_data(self):
-		with open(self.fname) as f:
-			i = 0
-			for line in f:
-				line = line.replace("\n", "")
-				line = line.replace("\t", "")
-
-				if (line != ''):
-					data = json.loads(line)
-
-					try:
-						data['debug']
-						self.ref = data
-					except:
-						turn_num = data['turnInfo'][1]
-						frame_num = data['turnInfo'][2]
-						self.frames[(turn_num, frame_num)] = Frame(turn_num, frame_num, data)
-
-						self.healths[0].append(data['p1Stats'][0])
-						self.healths[1].append(data['p2Stats'][0])
-
-						try:
-							self.frames_in_turn[turn_num] += 1
-						except KeyError:
-							self.frames_in_turn[turn_num] = 1
+		columns = replay_cache.load(self.fname)				# uses the .cache file when it is up to date
+		if columns is not None:
+			self.load_columns(columns)
+			return
+
+		self.index = replay_index.open_index(self.fname)	# uses the .index file when it is up to date
+		self.ref = self.index.config()
+		self.add_frames(0)
+
+	# adds a Frame for every frame in the index from start onwards
+	def add_frames(self, start):
+		for i in range(start, len(self.index)):
+			turn_num = self.index.columns['turn'][i]
+			frame_num = self.index.columns['frame'][i]
+			self.frames[(turn_num, frame_num)] = Frame(turn_num, frame_num, source=self.index, index=i)
+
+			try:
+				self.frames_in_turn[turn_num] += 1
+			except KeyError:
+				self.frames_in_turn[turn_num] = 1
+
+			self.healths[0].append(self.index.healths[0][i])
+			self.healths[1].append(self.index.healths[1][i])
+
+	# adds the frames the engine has written since the last call, returns the number of new frames
+	def follow(self):
+		if self.index is None:
+			return 0						# loaded from a .cache file, so the game is already over
+		start = len(self.index)
+		new_frames = self.index.follow()
+		if self.ref is None:
+			self.ref = self.index.config()
+		self.add_frames(start)
+		return new_frames
+
+	# true once the last frame (with endStats) has been written
+	def finished(self):
+		return self.index is None or self.index.finished()
+
+	# same as load_data, but frames are only built from the columns when they are shown
+	def load_columns(self, columns):
+		self.ref = columns.config
+		width = columns.layout['turn_info']
+		turn_info = columns.columns['turn_info']
+		for i in range(len(columns)):
+			turn_num = turn_info[i * width + 1]
+			frame_num = turn_info[i * width + 2]
+			self.frames[(turn_num, frame_num)] = Frame(turn_num, frame_num, source=columns, index=i)
+
+			try:
+				self.frames_in_turn[turn_num] += 1
+			except KeyError:
+				self.frames_in_turn[turn_num] = 1
+
+		self.healths[0].extend(columns.stat_column(1, 0))
+		self.healths[1].extend(columns.stat_column(2, 0))
 
 # handles opening multiple games (replays)
 class FileHandler:
@@ -1285,8 +1594,9 @@ def run_match(a1='', a2=''):
 	match.start()
 
 def main(args):
-	global BLIT
+	global BLIT, COLLECTIONS
 	BLIT = args['blit']				# get whether blit is enabled
+	COLLECTIONS = args['collections']	# get whether to draw units with collections
 	save = args['save']				# get whether  save is enabled
 	writers = args['writers']		# get save modes
 	keep_trying = args['keep_trying']		# get whether to keep trying writer types
@@ -1314,15 +1624,16 @@ def main(args):
 			fh.load_files()
 			time.sleep(.5)
 
-		# keep trying to load the replay file until it is capable of getting data from it - then start the visualizer
+		# keep reading new lines from the replay file until it is capable of getting data from it - then start the visualizer
+		fh.load_files(1,False,args['file'])
+		replay = fh.get_last_replay()
 		while True:
 			try:
-				fh.load_files(1,False,args['file'])
-				replay = fh.get_last_replay()
 				animatedReplay = Graph(replay.frames, replay.frames_in_turn, replay.healths, writers, keep_trying, fh=fh)		# create our Graph object
 				break
 			except RuntimeError:																		# we raised this error when data was nothing in Graph init()
 				time.sleep(.5)
+				replay.follow()
 	else:
 		# here we know the replay file is already created an finished
 
@@ -1336,7 +1647,7 @@ def main(args):
 		fh.load_files(1,False,args['file'])															# load latest replay
 		replay = fh.get_last_replay()																# get latest replay
 
-		animatedReplay = Graph(replay.frames, replay.frames_in_turn, replay.healths, writers, keep_trying, save=save)		# create our Graph object
+		animatedReplay = Graph(replay.frames, replay.frames_in_turn, replay.healths, writers, keep_trying, save=save, f_name=replay.fname, jobs=args['jobs'], stride=args['stride'])		# create our Graph object
 
 
 if __name__ == '__main__':